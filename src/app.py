@@ -93,6 +93,7 @@ else:
         # Salva o arquivo enviado e limpa o cache para forçar o reload dos dados.
         with open(config.PATH_TABELA_ALIM, "wb") as f: f.write(up1.read())
         utils.carregar_tabela_alimentacao.clear()
+        utils.invalidar_aliases_alimentos()
         st.toast("Tabela de alimentação atualizada!")
         
     up2 = st.sidebar.file_uploader("Recomendação diária (.csv ; latin1)", type=["csv"], key="rec")
@@ -102,6 +103,8 @@ else:
         st.toast("Tabela de recomendação atualizada!")
     
     st.sidebar.write(":open_file_folder: Pasta de dados:", config.ASSETS_DIR.resolve())
+    if config.MOSTRAR_DIAGNOSTICO:
+        ui.render_painel_diagnostico()
     
     # --- Carregamento de Dados Globais ---
     TABELA_ALIM = utils.carregar_tabela_alimentacao(config.PATH_TABELA_ALIM)
@@ -111,27 +114,10 @@ else:
     if RECOMEND.empty: st.info("Carregue a tabela de recomendação diária na barra lateral para metas de macros.")
 
     # --- Carregamento Centralizado de Dados do Usuário ---
+    # Os arquivos são lidos sob demanda: cada aba carrega apenas as tabelas que usa.
     user_data = {}
     if st.session_state.current_user:
-        username = st.session_state.current_user
-        
-        df_dados_pessoais = utils.carregar_df(utils.get_user_data_path(username, config.FILE_DADOS_PESSOAIS))
-        dados_pessoais = df_dados_pessoais.iloc[0].to_dict() if not df_dados_pessoais.empty else {}
-        
-        user_data = {
-            "dados_pessoais": dados_pessoais,
-            "df_objetivo": utils.carregar_df(utils.get_user_data_path(username, config.FILE_OBJETIVO)),
-            "df_evolucao": utils.carregar_df(utils.get_user_data_path(username, config.FILE_EVOLUCAO)),
-            "df_log_treinos": utils.carregar_df(utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES)),
-            "df_log_exercicios": utils.carregar_df(utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS)),
-            "df_refeicoes": utils.carregar_df(utils.get_user_data_path(username, config.FILE_REFEICOES)),
-            "df_planos_alimentares": utils.carregar_df(utils.get_user_data_path(username, config.FILE_PLANOS_ALIMENTARES)),
-            "df_planos_treino": utils.carregar_df(utils.get_user_data_path(username, config.FILE_PLANOS_TREINO)),
-            "df_exercicios": utils.carregar_df(utils.get_user_data_path(username, config.FILE_PLANOS_EXERCICIOS)),
-            "df_macrociclos": utils.carregar_df(utils.get_user_data_path(username, config.FILE_MACROCICLOS)),
-            "df_mesociclos": utils.carregar_df(utils.get_user_data_path(username, config.FILE_MESOCICLOS)),
-            "df_plano_semanal": utils.carregar_df(utils.get_user_data_path(username, config.FILE_PLANO_SEMANAL))
-        }
+        user_data = utils.DadosUsuario(st.session_state.current_user)
 
     # --- Renderização das Abas (usando streamlit-option-menu) ---
     
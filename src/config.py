@@ -22,6 +22,8 @@ SRC_DIR = Path(__file__).resolve().parent
 APP_DIR = SRC_DIR.parent
 DATA_DIR = APP_DIR / "data"
 ASSETS_DIR = APP_DIR / "assets"
+# Pasta servida pelo Streamlit em "app/static/" (ver MODO_ASSETS).
+STATIC_DIR = SRC_DIR / "static"
 
 # --- Nomes dos Arquivos de Dados ---
 # Manter os nomes dos arquivos como constantes evita erros de digitação.
@@ -31,6 +33,9 @@ FILE_TABELA_ALIM = "tabela_alimentacao.csv"
 FILE_RECOMEND = "recomendacao_diaria.csv"
 FILE_USERS = "users.csv"
 FILE_SESSION_INFO = "session_info.csv"
+FILE_ALIASES_ALIM = "aliases_alimentos.json"
+FILE_JOURNAL = "journal_pendentes.jsonl"  # Anexos em andamento (ver storage.py)
+FILE_LOCK = ".lock"  # Lock de gravação compartilhado entre processos (ver utils.py)
 
 # Arquivos Específicos do Usuário (dentro de data/username/)
 FILE_DADOS_PESSOAIS = "dados_pessoais.csv"
@@ -45,6 +50,51 @@ FILE_LOG_EXERCICIOS = "log_exercicios.csv"
 FILE_MACROCICLOS = "macrociclos.csv"
 FILE_MESOCICLOS = "mesociclos.csv"
 FILE_PLANO_SEMANAL = "plano_semanal.csv"
+FILE_ESTATISTICAS_TREINOS = "estatisticas_treinos.json"  # Agregados do log de treinos (ver logic.EstatisticasTreinos)
+
+# Lista de todos os arquivos específicos do usuário (usada pela camada de armazenamento).
+ARQUIVOS_USUARIO = [
+    FILE_DADOS_PESSOAIS, FILE_OBJETIVO, FILE_REFEICOES, FILE_PLANOS_ALIMENTARES,
+    FILE_EVOLUCAO, FILE_LOG_TREINOS_SIMPLES, FILE_PLANOS_TREINO, FILE_PLANOS_EXERCICIOS,
+    FILE_LOG_EXERCICIOS, FILE_MACROCICLOS, FILE_MESOCICLOS, FILE_PLANO_SEMANAL
+]
+
+# --- Armazenamento dos Dados do Usuário ---
+# Formato em que os arquivos do usuário são gravados: "csv", "parquet", "feather"
+# ou "sqlite".
+# Parquet e Feather são formatos binários colunares (leitura bem mais rápida e
+# tipos preservados) e exigem o pacote opcional `pyarrow`; sem ele, o CSV é usado.
+# Os arquivos existentes são convertidos automaticamente no primeiro acesso e os
+# originais ficam renomeados como cópia de segurança (ex: treinos.csv.bak). Para
+# voltar do SQLite aos arquivos, exporte as tabelas antes com `utils.exportar_csv`
+# (gravadas em data/<usuario>/PASTA_EXPORTACAO/) e mova-as para a pasta do usuário.
+# Com "sqlite", todos os usuários ficam em um único banco (PATH_BANCO_SQLITE);
+# para importar a pasta data/ inteira de uma vez: python src/manutencao.py migrar-sqlite
+STORAGE_BACKEND = "csv"
+PASTA_EXPORTACAO = "exportacao"
+
+# Limite de memória (em MB) do cache de tabelas mantido entre as interações.
+# As tabelas menos usadas recentemente são descartadas quando o limite é atingido.
+CACHE_TABELAS_MAX_MB = 256
+
+# Limite de memória (em MB) do cache de imagens e SVGs já codificados em base64
+# (animações dos exercícios e camadas do diagrama muscular).
+CACHE_ASSETS_MAX_MB = 64
+
+# Como as imagens dos exercícios e os SVGs dos músculos chegam ao navegador:
+#   "base64": embutidas no HTML de cada rerun (funciona sem configuração extra).
+#   "static": referenciadas por URL e guardadas no cache do navegador. As cópias
+#             servidas ficam em STATIC_DIR; exige server.enableStaticServing = true
+#             no .streamlit/config.toml (sem isso, volta para "base64").
+MODO_ASSETS = "base64"
+URL_STATIC = "app/static"
+
+# Tempo máximo (em segundos) de espera pelo lock dos arquivos de um usuário
+# quando outra sessão (ou outro processo) está gravando os mesmos dados.
+LOCK_TIMEOUT_S = 10
+
+# Exibe na barra lateral o painel de diagnóstico (métricas dos locks e caches).
+MOSTRAR_DIAGNOSTICO = True
 
 # --- Caminhos Completos para os Arquivos Globais ---
 # >>>>>>>> CORREÇÃO AQUI <<<<<<<<<<
@@ -52,6 +102,8 @@ FILE_PLANO_SEMANAL = "plano_semanal.csv"
 # A lógica de criação de pastas agora é tratada pelas funções de salvamento em utils.py.
 PATH_TABELA_ALIM = ASSETS_DIR / "utils" / FILE_TABELA_ALIM
 PATH_RECOMEND = ASSETS_DIR / "utils" / FILE_RECOMEND
+PATH_ALIASES_ALIM = DATA_DIR / FILE_ALIASES_ALIM
+PATH_BANCO_SQLITE = DATA_DIR / "planofit.sqlite"
 
 # --- Nomes de Colunas - Tabela de Alimentos (para evitar erros de digitação) ---
 COL_ALIMENTO = "Alimento"
@@ -64,6 +116,9 @@ COL_ENERGIA = "Energia(kcal)"
 COL_PESO = "peso"
 COL_DATA = "Data"
 
+# Formato em que as datas são gravadas nos arquivos (ver ESQUEMAS abaixo).
+FORMATO_DATA = "%d/%m/%Y"
+
 # --- [CORREÇÃO] Nomes de Colunas para o Arquivo de Recomendação ---
 # Constantes específicas para os nomes de coluna do arquivo 'recomendacao_diaria.csv'
 # com base na imagem fornecida.
@@ -87,12 +142,103 @@ OPCOES_GRUPOS_MUSCULARES = [
     "Peito", "Costas", "Ombros", "Bíceps", "Tríceps", "Pernas (Quadríceps)",
     "Pernas (Posterior)", "Glúteos", "Panturrilhas", "Abdômen"
 ]
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+OPCOES_TIPO_EXERCICIO = ["Musculação", "Cardio"]
+
+# --- Esquema dos Arquivos do Usuário ---
+# Colunas de cada arquivo, no formato {coluna: (tipo, valor padrão)}.
+# `utils.carregar_df` cria as colunas ausentes com o valor padrão, preenche
+# os valores vazios (quando há padrão) e converte cada coluna para o tipo:
+#   - "int32", "float32", "float64"...: tipos numéricos do numpy (compactos);
+#   - "Int32": inteiro que aceita valores vazios;
+#   - "str": texto;  "category": texto com poucos valores distintos;
+#   - uma lista: categoria ordenada com essas opções (valores fora da lista
+#     encontrados no arquivo são mantidos, ao final);
+#   - "data": data gravada como texto em FORMATO_DATA, lida como datetime64.
+# Se os valores do arquivo não couberem no tipo declarado, a coluna fica como foi lida.
+# As tabelas de uma linha só (dados pessoais e objetivo) usam tipos de 64 bits,
+# pois seus valores vão direto para os widgets do Streamlit. Medidas digitadas
+# pelo usuário (peso, circunferências, cargas, calorias) também ficam em float64:
+# em float32, 80.3 vira 80.30000305 ao ser combinado com valores novos e gravado.
+ESQUEMAS = {
+    FILE_DADOS_PESSOAIS: {
+        "nome": ("str", None), "nascimento": ("str", None), "altura": ("float64", None),
+        "sexo": ("str", None), "peso": ("float64", None), "idade": ("int64", None),
+        "gordura_corporal": ("float64", 0.0), "gordura_visceral": ("float64", 0.0), "massa_muscular": ("float64", 0.0),
+    },
+    FILE_OBJETIVO: {
+        "DataInicio": ("str", None), "Atividade": ("str", None), "Ambiente": ("str", None),
+        "ObjetivoPeso": ("str", None), "PesoAlvo": ("float64", 0.0), "FatorDieta": ("float64", 1.0),
+    },
+    FILE_REFEICOES: {
+        "Refeicao": (OPCOES_REFEICOES, None), "Alimento": ("str", None), "Quantidade": ("float64", 0.0),
+    },
+    FILE_PLANOS_ALIMENTARES: {
+        "nome_plano": ("str", None), "Refeicao": (OPCOES_REFEICOES, None),
+        "Alimento": ("str", None), "Quantidade": ("float64", 0.0),
+    },
+    FILE_EVOLUCAO: {
+        "semana": ("int32", None), "data": ("data", None), "peso": ("float64", None), "var": ("float64", 0.0),
+        "gordura_corporal": ("float64", 0.0), "gordura_visceral": ("float64", 0.0),
+        "musculos_esqueleticos": ("float64", 0.0), "cintura": ("float64", 0.0),
+        "peito": ("float64", 0.0), "braco": ("float64", 0.0), "coxa": ("float64", 0.0),
+    },
+    FILE_LOG_TREINOS_SIMPLES: {
+        COL_DATA: ("data", None), "Plano Executado": ("str", None), "Tipo de Treino": ("category", None),
+        "Tempo (min)": ("int32", 0), "Calorias Gastas": ("float64", 0.0),
+    },
+    FILE_PLANOS_TREINO: {
+        "id_plano": ("int32", None), "nome_plano": ("str", None),
+    },
+    FILE_PLANOS_EXERCICIOS: {
+        "id_plano": ("int32", None), "nome_exercicio": ("str", None),
+        "tipo_exercicio": (OPCOES_TIPO_EXERCICIO, "Musculação"), "series_planejadas": ("int32", 1),
+        "repeticoes_planejadas": ("str", None), "ordem": ("Int32", None),
+    },
+    FILE_LOG_EXERCICIOS: {
+        COL_DATA: ("data", None), "nome_exercicio": ("str", None), "set": ("int32", 1),
+        "minutos_realizados": ("int32", 0), "kg_realizado": ("float64", 0.0), "reps_realizadas": ("int32", 0),
+    },
+    FILE_MACROCICLOS: {
+        "id_macrociclo": ("int32", None), "nome": ("str", None), "objetivo_principal": ("str", None),
+        "data_inicio": ("str", None), "data_fim": ("str", None),
+    },
+    FILE_MESOCICLOS: {
+        "id_mesociclo": ("int32", None), "id_macrociclo": ("int32", None), "nome": ("str", None),
+        "ordem": ("Int32", None), "semana_inicio": ("Int32", None), "semana_fim": ("Int32", None),
+        "foco_principal": ("str", None),
+    },
+    FILE_PLANO_SEMANAL: {
+        "dia_da_semana": (DIAS_SEMANA, None), "plano_treino": ("str", "Descanso"),
+        "id_macrociclo": ("Int32", None), "id_mesociclo": ("int32", None), "semana_numero": ("int32", None),
+    },
+}
+
+# Colunas de data de cada arquivo, derivadas dos esquemas.
+COLUNAS_DATA = {
+    arquivo: [coluna for coluna, (tipo, _) in esquema.items() if tipo == "data"]
+    for arquivo, esquema in ESQUEMAS.items()
+}
 
 # --- Gráfico de músculos ---
 PATH_GRAFICO_MUSCULOS_BACK = ASSETS_DIR / "muscle_diagram" / "muscular_system_back.svg"
 PATH_GRAFICO_MUSCULOS_FRONT = ASSETS_DIR / "muscle_diagram" / 'muscular_system_front.svg'
 PATH_GRAFICO_MUSCULOS_MAIN = ASSETS_DIR / "muscle_diagram" / "main"
 PATH_GRAFICO_MUSCULOS_SECONDARY = ASSETS_DIR / "muscle_diagram" / "secondary"
+# SVGs já compostos (base + músculos destacados), gerados sob demanda ou com
+# python src/manutencao.py compor-diagramas
+PATH_DIAGRAMAS_COMPOSTOS = ASSETS_DIR / "muscle_diagram" / "composites"
+# Quantos diagramas compostos cada processo guarda em memória; os menos usados
+# são esquecidos (os arquivos continuam em disco e são reaproveitados).
+MAX_DIAGRAMAS_COMPOSTOS = 512
+
+# --- Imagens dos exercícios em tamanho reduzido ---
+# Versões WebP nas larguras (px) em que as imagens são exibidas, geradas com
+# python src/manutencao.py gerar-derivados (só refaz as imagens alteradas).
+PATH_DERIVADOS = ASSETS_DIR / "derivados"
+PATH_MANIFESTO_DERIVADOS = PATH_DERIVADOS / "manifesto.json"
+LARGURAS_DERIVADOS = (300, 500)
+QUALIDADE_DERIVADOS = 80
 
 # --- Mapeamento de Músculos para Arquivos SVG ---
 # ATENÇÃO: As chaves (ex: 'abdômen') devem corresponder aos dados do arquivo
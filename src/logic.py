@@ -5,8 +5,11 @@
 # realizam cálculos, análises e transformações de dados.
 # ==============================================================================
 
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, List
+import numpy as np
 import pandas as pd
 import config
 from utils import normalizar_texto
@@ -196,6 +199,7 @@ def calcular_gasto_treino(cardio: bool, intensidade: str, duracao: int, carga: f
 def analisar_historico_treinos(dft: pd.DataFrame) -> Dict[str, Any]:
     """
     Calcula estatísticas agregadas a partir do histórico de treinos.
+    O DataFrame recebido não é modificado.
 
     Args:
         dft (pd.DataFrame): DataFrame com o log de treinos.
@@ -204,42 +208,7 @@ def analisar_historico_treinos(dft: pd.DataFrame) -> Dict[str, Any]:
         Dict[str, Any]: Dicionário com métricas como total de treinos,
                         média por semana, etc. Retorna zerado se o input for vazio.
     """
-    if dft.empty:
-        return {
-            "total_treinos": 0,
-            "total_calorias": 0,
-            "media_treinos_semana": 0.0,
-            "treinos_semana_atual": 0,
-            "media_semanal_kcal": 0.0,
-            "media_diaria_kcal": 0.0,
-            "calorias_ultimo_treino": 0
-        }
-        
-    dft[config.COL_DATA] = pd.to_datetime(dft[config.COL_DATA], format="%d/%m/%Y")
-    total_treinos = len(dft)
-    total_calorias = dft["Calorias Gastas"].sum()
-    # Usa `isocalendar().week` para uma definição consistente de semana.
-    dft["semana_do_ano"] = dft[config.COL_DATA].dt.isocalendar().week.astype(int)
-    semanas_unicas = dft["semana_do_ano"].nunique()
-
-    media_treinos_semana = total_treinos / semanas_unicas if semanas_unicas > 0 else 0
-    media_semanal_kcal = total_calorias / semanas_unicas if semanas_unicas > 0 else 0
-    dias_unicos_treinados = dft[config.COL_DATA].nunique()
-    media_diaria_kcal = total_calorias / dias_unicos_treinados if dias_unicos_treinados > 0 else 0
-
-    semana_atual = date.today().isocalendar()[1]
-    treinos_semana_atual = dft[dft["semana_do_ano"] == semana_atual].shape[0]
-    calorias_ultimo_treino = dft["Calorias Gastas"].iloc[0] if not dft.empty else 0
-
-    return {
-        "total_treinos": total_treinos,
-        "total_calorias": total_calorias,
-        "media_treinos_semana": media_treinos_semana,
-        "treinos_semana_atual": treinos_semana_atual,
-        "media_semanal_kcal": media_semanal_kcal,
-        "media_diaria_kcal": media_diaria_kcal,
-        "calorias_ultimo_treino": calorias_ultimo_treino
-    }
+    return EstatisticasTreinos.do_log(dft).resumo()
 
 def analisar_progresso_objetivo(df_evolucao: pd.DataFrame, peso_alvo: float) -> Dict[str, Any]:
     """
@@ -272,50 +241,141 @@ def analisar_progresso_objetivo(df_evolucao: pd.DataFrame, peso_alvo: float) ->
         "progresso_percent": progresso_percent
     }
 
-def analisar_distribuicao_refeicoes(df_refeicoes: pd.DataFrame, tabela_alim: pd.DataFrame) -> pd.DataFrame:
+COLUNAS_MACROS_REFEICAO = [config.COL_ENERGIA, config.COL_PROTEINA, config.COL_CARBOIDRATO, config.COL_LIPIDEOS, config.COL_SODIO]
+
+def _ids_tabela_alimentos(tabela_alim: pd.DataFrame) -> pd.Series:
     """
-    Agrega os macronutrientes totais por tipo de refeição (café da manhã, almoço, etc.).
+    Retorna o identificador de cada linha da tabela de alimentos: a coluna 'ID'
+    quando existir, ou o próprio índice do DataFrame.
+    """
+    if "ID" in tabela_alim.columns:
+        return tabela_alim["ID"]
+    return tabela_alim.index.to_series(index=tabela_alim.index)
+
+def resolver_alimentos(nomes: pd.Series, tabela_alim: pd.DataFrame, aliases: Dict[str, Any] = None) -> pd.Series:
+    """
+    Mapeia cada nome de alimento para o ID correspondente na tabela de alimentos.
+
+    Os nomes são normalizados uma única vez por valor distinto e consultados
+    primeiro em `aliases` (nome normalizado -> ID). Os restantes são resolvidos
+    com um join pelo nome normalizado e, apenas se não houver correspondência
+    exata (ex: nomes digitados manualmente), com uma busca por substring.
 
     Args:
-        df_refeicoes (pd.DataFrame): DataFrame com os alimentos e quantidades do dia.
+        nomes (pd.Series): Nomes dos alimentos registrados.
         tabela_alim (pd.DataFrame): Tabela de composição dos alimentos.
+        aliases (Dict[str, Any], optional): Cache de resoluções anteriores. É
+            atualizado no próprio dicionário com as novas correspondências.
 
     Returns:
-        pd.DataFrame: Um DataFrame com os totais de macros agrupados por refeição.
+        pd.Series: IDs alinhados ao índice de `nomes` (NaN quando não encontrado).
+    """
+    if nomes.empty or tabela_alim.empty or config.COL_ALIMENTO_PROC not in tabela_alim.columns:
+        return pd.Series(pd.NA, index=nomes.index, dtype="object")
+    if aliases is None:
+        aliases = {}
+
+    nomes_validos = nomes.dropna().astype(str)
+    unicos = pd.Series(nomes_validos.unique())
+    unicos_proc = unicos.map(normalizar_texto)
+    ids_unicos = unicos_proc.map(aliases).astype("object")
+
+    pendentes = ids_unicos[ids_unicos.isna()].index
+    if len(pendentes) > 0:
+        procs_tabela = tabela_alim[config.COL_ALIMENTO_PROC].fillna("")
+        ids_tabela = _ids_tabela_alimentos(tabela_alim)
+        # Dicionário montado na ordem inversa para que a primeira ocorrência de cada nome prevaleça.
+        mapa_exato = dict(zip(procs_tabela.tolist()[::-1], ids_tabela.tolist()[::-1]))
+
+        for i in pendentes:
+            proc = unicos_proc[i]
+            if not proc: continue
+            ids_unicos[i] = mapa_exato.get(proc)
+            if ids_unicos[i] is None:
+                encontrados = procs_tabela.str.contains(proc, regex=False)
+                if not encontrados.any(): continue
+                ids_unicos[i] = ids_tabela[encontrados].iloc[0]
+            aliases[proc] = ids_unicos[i]
+
+    mapa_nomes = pd.Series(ids_unicos.to_numpy(), index=unicos.to_numpy())
+    return nomes_validos.map(mapa_nomes).reindex(nomes.index)
+
+def calcular_macros_itens(df_itens: pd.DataFrame, tabela_alim: pd.DataFrame, aliases: Dict[str, Any] = None) -> pd.DataFrame:
     """
-    if df_refeicoes.empty or tabela_alim.empty: return pd.DataFrame()
+    Resolve os alimentos de uma lista de itens (refeições do dia ou plano) e
+    calcula os macronutrientes de cada item proporcionalmente à quantidade.
 
-    dados_detalhados = []
-    # Itera sobre cada alimento registrado pelo usuário.
-    for _, row in df_refeicoes.iterrows():
-        alimento = row.get("Alimento", "")
-        qtd = float(row.get("Quantidade", 0.0) or 0.0)
-        refeicao = row.get("Refeicao")
+    Returns:
+        pd.DataFrame: Os itens com quantidade positiva, com as colunas
+                      'id_alimento' e os macros já multiplicados pelo fator
+                      (NaN para alimentos não encontrados).
+    """
+    if df_itens.empty or tabela_alim.empty or "Alimento" not in df_itens.columns:
+        return pd.DataFrame()
+
+    itens = df_itens.copy()
+    itens["Quantidade"] = pd.to_numeric(itens.get("Quantidade", 0.0), errors="coerce").fillna(0.0)
+    itens["Alimento"] = itens["Alimento"].where(itens["Alimento"].notna(), "").astype(str)
+    itens = itens[(itens["Alimento"] != "") & (itens["Quantidade"] > 0)]
+    if itens.empty:
+        return pd.DataFrame()
+
+    itens["id_alimento"] = resolver_alimentos(itens["Alimento"], tabela_alim, aliases)
+
+    colunas = [col for col in COLUNAS_MACROS_REFEICAO if col in tabela_alim.columns]
+    macros = tabela_alim[colunas].apply(pd.to_numeric, errors="coerce")
+    macros.index = _ids_tabela_alimentos(tabela_alim).to_numpy()
+    macros = macros[~macros.index.duplicated(keep="first")]
+
+    # Busca das linhas pelo ID (equivalente a um left join) e multiplicação vetorizada pelo fator.
+    detalhado = itens.reset_index(drop=True)
+    fator = detalhado["Quantidade"].to_numpy() / 100.0 # A tabela TACO é baseada em 100g.
+    valores = macros.reindex(detalhado["id_alimento"].to_numpy()).to_numpy()
+    detalhado[colunas] = valores * fator[:, None]
+    return detalhado
+
+def analisar_refeicoes(df_refeicoes: pd.DataFrame, tabela_alim: pd.DataFrame, aliases: Dict[str, Any] = None) -> tuple:
+    """
+    Calcula, com uma única resolução dos alimentos, os totais diários de macros,
+    a lista de alimentos não encontrados e a distribuição por refeição.
+    `aliases` é repassado para `resolver_alimentos`.
 
-        if not all([alimento, qtd > 0, refeicao]): continue
+    Returns:
+        tuple: (totais, alimentos_nao_encontrados, df_distribuicao).
+    """
+    total = {col: 0.0 for col in COLUNAS_MACROS_REFEICAO}
+    detalhado = calcular_macros_itens(df_refeicoes, tabela_alim, aliases)
+    if detalhado.empty:
+        return total, [], pd.DataFrame()
 
-        # Normaliza o nome do alimento para fazer uma busca flexível na tabela.
-        proc = normalizar_texto(alimento)
-        linha_alim = tabela_alim[tabela_alim[config.COL_ALIMENTO_PROC].str.contains(proc, na=False)]
+    encontrados = detalhado[detalhado["id_alimento"].notna()]
+    alimentos_nao_encontrados = detalhado.loc[detalhado["id_alimento"].isna(), "Alimento"].tolist()
 
-        # Se o alimento for encontrado, calcula seus macros proporcionalmente à quantidade.
-        if not linha_alim.empty:
-            fator = qtd / 100.0 # A tabela TACO é baseada em 100g.
-            info_nutricional = {
-                "Refeicao": refeicao,
-                "Quantidade": qtd,
-                config.COL_ENERGIA: float(linha_alim.iloc[0].get(config.COL_ENERGIA, 0)) * fator,
-                config.COL_PROTEINA: float(linha_alim.iloc[0].get(config.COL_PROTEINA, 0)) * fator,
-                config.COL_CARBOIDRATO: float(linha_alim.iloc[0].get(config.COL_CARBOIDRATO, 0)) * fator,
-                config.COL_LIPIDEOS: float(linha_alim.iloc[0].get(config.COL_LIPIDEOS, 0)) * fator
-            }
-            dados_detalhados.append(info_nutricional)
+    for col in total:
+        if col in encontrados.columns:
+            total[col] = float(encontrados[col].fillna(0.0).sum())
 
-    if not dados_detalhados: return pd.DataFrame()
+    df_distribuicao = pd.DataFrame()
+    if "Refeicao" in encontrados.columns:
+        colunas_dist = ["Quantidade"] + [col for col in COLUNAS_MACROS_REFEICAO[:4] if col in encontrados.columns]
+        por_refeicao = encontrados[encontrados["Refeicao"].notna()]
+        if not por_refeicao.empty:
+            df_distribuicao = por_refeicao.assign(Refeicao=por_refeicao["Refeicao"].astype(str)).groupby("Refeicao")[colunas_dist].sum()
 
-    df_detalhado = pd.DataFrame(dados_detalhados)
-    # Agrupa por refeição e soma os valores para obter os totais.
-    return df_detalhado.groupby("Refeicao").sum()
+    return total, alimentos_nao_encontrados, df_distribuicao
+
+def analisar_distribuicao_refeicoes(df_refeicoes: pd.DataFrame, tabela_alim: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega os macronutrientes totais por tipo de refeição (café da manhã, almoço, etc.).
+
+    Args:
+        df_refeicoes (pd.DataFrame): DataFrame com os alimentos e quantidades do dia.
+        tabela_alim (pd.DataFrame): Tabela de composição dos alimentos.
+
+    Returns:
+        pd.DataFrame: Um DataFrame com os totais de macros agrupados por refeição.
+    """
+    return analisar_refeicoes(df_refeicoes, tabela_alim)[2]
 
 
 def analisar_consistencia_habitos(dft_log: pd.DataFrame, df_plano_semanal_ativo: pd.DataFrame) -> Dict[str, Any]:
@@ -329,123 +389,383 @@ def analisar_consistencia_habitos(dft_log: pd.DataFrame, df_plano_semanal_ativo:
     Returns:
         Dict[str, Any]: Um dicionário contendo as métricas de consistência.
     """
-    # Retorna valores padrão se não houver histórico de treinos.
-    if dft_log.empty:
+    return EstatisticasTreinos.do_log(dft_log).consistencia(df_plano_semanal_ativo)
+
+class EstatisticasTreinos:
+    """
+    Agregados do log de treinos (treinos.csv) mantidos de forma incremental:
+    totais, treinos e calorias por semana ISO, as calorias de cada dia treinado
+    e a sequência de dias consecutivos que termina no último treino.
+
+    Anexar ou editar treinos só ajusta as chaves dos dias afetados (`aplicar`),
+    e as métricas do painel são lidas desses totais sem percorrer o histórico.
+    O conteúdo é serializável em JSON (`para_dict` / `de_dict`) para ser
+    guardado junto dos dados do usuário.
+    """
+    def __init__(self):
+        self.total_treinos = 0
+        self.total_calorias = 0.0
+        self.semanas = {}  # "AAAA-Www" (semana ISO) -> [treinos, calorias]
+        self.dias = {}  # "AAAA-MM-DD" -> calorias de cada treino do dia, na ordem registrada
+        self.ultimo_dia = None
+        self.sequencia = 0  # Dias consecutivos com treino terminando em `ultimo_dia`.
+
+    @classmethod
+    def do_log(cls, dft: pd.DataFrame) -> "EstatisticasTreinos":
+        """Constrói os agregados a partir do log de treinos completo."""
+        estatisticas = cls()
+        estatisticas.aplicar(dft)
+        return estatisticas
+
+    @staticmethod
+    def linhas(dft: pd.DataFrame) -> List[tuple]:
+        """
+        Extrai (data, calorias) de cada treino do DataFrame. As datas podem vir
+        como datetime ou ainda como texto (linhas recém-registradas).
+        """
+        if dft is None or dft.empty or config.COL_DATA not in dft.columns:
+            return []
+        datas = pd.to_datetime(dft[config.COL_DATA], format=config.FORMATO_DATA, errors='coerce')
+        if 'Calorias Gastas' in dft.columns:
+            calorias = pd.to_numeric(dft['Calorias Gastas'], errors='coerce').fillna(0.0)
+        else:
+            calorias = pd.Series(0.0, index=dft.index)
+        return [(d.date(), round(float(k), 2)) for d, k in zip(datas, calorias) if pd.notna(d)]
+
+    @staticmethod
+    def _chave_semana(dia: date) -> str:
+        ano, semana, _ = dia.isocalendar()
+        return f"{ano}-W{semana:02d}"
+
+    def aplicar(self, dft: pd.DataFrame, sinal: int = 1):
+        """
+        Soma (`sinal=1`) ou subtrai (`sinal=-1`) os treinos do DataFrame dos
+        agregados. Subtrair um treino que não está nos agregados não faz nada.
+        """
+        self.aplicar_linhas(self.linhas(dft), sinal)
+
+    def atualizar(self, df_antes: pd.DataFrame, df_depois: pd.DataFrame):
+        """
+        Ajusta os agregados de uma versão do log para outra aplicando só a
+        diferença entre elas: os treinos que saíram são subtraídos e os que
+        entraram são somados. Para um anexo, `df_antes` pode ser None e
+        `df_depois` traz apenas as linhas novas.
+        """
+        antes, depois = Counter(self.linhas(df_antes)), Counter(self.linhas(df_depois))
+        self.aplicar_linhas(list((antes - depois).elements()), -1)
+        self.aplicar_linhas(list((depois - antes).elements()), 1)
+
+    def aplicar_linhas(self, linhas: List[tuple], sinal: int = 1):
+        """Versão de `aplicar` que recebe tuplas (data, calorias) já extraídas."""
+        if not linhas:
+            return
+        for dia, kcal in linhas:
+            chave_dia, chave_semana = dia.isoformat(), self._chave_semana(dia)
+            if sinal > 0:
+                self.dias.setdefault(chave_dia, []).append(kcal)
+                semana = self.semanas.setdefault(chave_semana, [0, 0.0])
+            else:
+                treinos_do_dia = self.dias.get(chave_dia)
+                if not treinos_do_dia or kcal not in treinos_do_dia:
+                    continue
+                treinos_do_dia.remove(kcal)
+                if not treinos_do_dia:
+                    del self.dias[chave_dia]
+                semana = self.semanas[chave_semana]
+            semana[0] += sinal
+            semana[1] = round(semana[1] + sinal * kcal, 2)
+            if semana[0] <= 0:
+                del self.semanas[chave_semana]
+            self.total_treinos += sinal
+            self.total_calorias = round(self.total_calorias + sinal * kcal, 2)
+
+        if sinal > 0 and self.ultimo_dia is not None:
+            self.ultimo_dia = max(self.ultimo_dia, max(dia for dia, _ in linhas))
+        else:
+            self.ultimo_dia = date.fromisoformat(max(self.dias)) if self.dias else None
+        self._atualizar_sequencia()
+
+    def _atualizar_sequencia(self):
+        # Percorre só os dias da sequência atual, a partir do último treino.
+        self.sequencia = 0
+        dia = self.ultimo_dia
+        while dia is not None and dia.isoformat() in self.dias:
+            self.sequencia += 1
+            dia -= timedelta(days=1)
+
+    def resumo(self, hoje: date = None) -> Dict[str, Any]:
+        """Métricas do histórico (mesmas chaves de `analisar_historico_treinos`)."""
+        hoje = hoje or date.today()
+        semanas_unicas = len(self.semanas)
+        dias_unicos_treinados = len(self.dias)
         return {
-            "streak_dias": 0, "dias_treinados_semana": 0,
-            "dias_planejados_semana": 0, "adesao_percentual": 0
+            "total_treinos": self.total_treinos,
+            "total_calorias": self.total_calorias,
+            "media_treinos_semana": self.total_treinos / semanas_unicas if semanas_unicas > 0 else 0.0,
+            "treinos_semana_atual": self.semanas.get(self._chave_semana(hoje), [0, 0.0])[0],
+            "media_semanal_kcal": self.total_calorias / semanas_unicas if semanas_unicas > 0 else 0.0,
+            "media_diaria_kcal": self.total_calorias / dias_unicos_treinados if dias_unicos_treinados > 0 else 0.0,
+            "calorias_ultimo_treino": self.dias[self.ultimo_dia.isoformat()][-1] if self.ultimo_dia else 0,
         }
 
-    # --- Cálculo da Sequência de Treinos (Streak) ---
-    # Pega as datas únicas de treino, converte para date e ordena da mais recente para a mais antiga.
-    workout_dates = pd.to_datetime(dft_log[config.COL_DATA], format="%d/%m/%Y").dt.date.unique()
-    workout_dates = sorted(list(workout_dates), reverse=True)
-    
-    streak_dias = 0
-    today = date.today()
-    
-    # Se o último treino não foi hoje nem ontem, a sequência é 0.
-    if not workout_dates or (today not in workout_dates and (today - timedelta(days=1)) not in workout_dates):
-        streak_dias = 0
-    else:
-        # Define o ponto de partida da contagem: hoje ou ontem.
-        current_day = workout_dates[0]
-        
-        # Percorre as datas de treino verificando se são consecutivas.
-        for d in workout_dates:
-            if d == current_day:
-                streak_dias += 1
-                current_day -= timedelta(days=1)
-            else:
-                # A sequência foi quebrada.
-                break
+    def consistencia(self, df_plano_semanal_ativo: pd.DataFrame, hoje: date = None) -> Dict[str, Any]:
+        """Streak e adesão semanal (mesmas chaves de `analisar_consistencia_habitos`)."""
+        hoje = hoje or date.today()
+
+        # A sequência só conta se o último treino foi hoje ou ontem.
+        streak_dias = self.sequencia if self.ultimo_dia in (hoje, hoje - timedelta(days=1)) else 0
 
-    # --- Cálculo da Adesão Semanal ---
-    dias_planejados_semana = 0
-    if not df_plano_semanal_ativo.empty:
         # Conta quantos dias na semana têm um plano que não seja "Descanso".
-        dias_planejados_semana = df_plano_semanal_ativo[df_plano_semanal_ativo['plano_treino'] != 'Descanso'].shape[0]
+        dias_planejados_semana = 0
+        if not df_plano_semanal_ativo.empty:
+            dias_planejados_semana = df_plano_semanal_ativo[df_plano_semanal_ativo['plano_treino'] != 'Descanso'].shape[0]
 
-    # Define o início (segunda-feira) e o fim (domingo) da semana atual.
-    start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-    
-    # Conta quantos treinos foram registrados dentro do intervalo desta semana.
-    dias_treinados_semana = dft_log[
-        pd.to_datetime(dft_log[config.COL_DATA], format="%d/%m/%Y").dt.date.between(start_of_week, end_of_week)
-    ][config.COL_DATA].nunique() # .nunique() para não contar dois treinos no mesmo dia como 2 dias.
+        # Dias distintos com treino entre a segunda-feira e o domingo desta semana.
+        inicio_semana = hoje - timedelta(days=hoje.weekday())
+        dias_treinados_semana = sum((inicio_semana + timedelta(days=i)).isoformat() in self.dias for i in range(7))
 
-    adesao_percentual = 0
-    if dias_planejados_semana > 0:
-        adesao_percentual = round((dias_treinados_semana / dias_planejados_semana) * 100)
+        adesao_percentual = 0
+        if dias_planejados_semana > 0:
+            adesao_percentual = round((dias_treinados_semana / dias_planejados_semana) * 100)
 
-    return {
-        "streak_dias": streak_dias,
-        "dias_treinados_semana": dias_treinados_semana,
-        "dias_planejados_semana": dias_planejados_semana,
-        "adesao_percentual": adesao_percentual
-    }
+        return {
+            "streak_dias": streak_dias,
+            "dias_treinados_semana": dias_treinados_semana,
+            "dias_planejados_semana": dias_planejados_semana,
+            "adesao_percentual": adesao_percentual
+        }
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Representação em JSON dos agregados."""
+        return {
+            "total_treinos": self.total_treinos,
+            "total_calorias": self.total_calorias,
+            "semanas": self.semanas,
+            "dias": self.dias,
+            "ultimo_dia": self.ultimo_dia.isoformat() if self.ultimo_dia else None,
+            "sequencia": self.sequencia,
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Dict[str, Any]) -> "EstatisticasTreinos":
+        """Reconstrói os agregados salvos por `para_dict`."""
+        estatisticas = cls()
+        estatisticas.total_treinos = int(dados["total_treinos"])
+        estatisticas.total_calorias = float(dados["total_calorias"])
+        estatisticas.semanas = {chave: list(valor) for chave, valor in dados["semanas"].items()}
+        estatisticas.dias = {chave: list(valor) for chave, valor in dados["dias"].items()}
+        estatisticas.ultimo_dia = date.fromisoformat(dados["ultimo_dia"]) if dados.get("ultimo_dia") else None
+        estatisticas.sequencia = int(dados["sequencia"])
+        return estatisticas
+
+class CalendarioPeriodizacao:
+    """
+    Calendário da periodização (macrociclo → mesociclo → semana → dia)
+    pré-calculado a partir das tabelas do usuário. É construído uma vez por
+    alteração dos dados e responde qual fase está ativa em uma data com buscas
+    binárias, sem reconverter datas nem percorrer os mesociclos a cada consulta.
 
-def get_workout_for_day(user_data: Dict[str, Any], target_date: date) -> Dict[str, Any] or None:
+    Se macrociclos se sobrepõem, vale o primeiro da tabela, como no filtro
+    original por data.
+    """
+    def __init__(self, df_macro: pd.DataFrame, df_meso: pd.DataFrame, df_plano_sem: pd.DataFrame, df_planos_treino: pd.DataFrame):
+        self.df_plano_sem = df_plano_sem
+
+        # --- Macrociclos: intervalos de datas (em ordinais) sem sobreposição ---
+        self._macros = []
+        if not df_macro.empty and {'data_inicio', 'data_fim'}.issubset(df_macro.columns):
+            inicios = pd.to_datetime(df_macro['data_inicio'], errors='coerce')
+            fins = pd.to_datetime(df_macro['data_fim'], errors='coerce')
+            for pos, (inicio, fim) in enumerate(zip(inicios, fins)):
+                if pd.notna(inicio) and pd.notna(fim) and inicio <= fim:
+                    self._macros.append((inicio.toordinal(), fim.toordinal(), pos, inicio.normalize()))
+        self._df_macro = df_macro
+        self._inicio_por_macro = {}
+        if 'id_macrociclo' in df_macro.columns:
+            for _, _, pos, inicio in self._macros:
+                self._inicio_por_macro.setdefault(df_macro['id_macrociclo'].iloc[pos], inicio)
+
+        # Cada trecho entre duas fronteiras consecutivas pertence a um único
+        # macrociclo (o primeiro da tabela que o cobre) ou a nenhum.
+        fronteiras = sorted({m[0] for m in self._macros} | {m[1] + 1 for m in self._macros})
+        self._inicios_trechos = fronteiras
+        self._macro_do_trecho = [
+            next((i for i, m in enumerate(self._macros) if m[0] <= inicio <= m[1]), None)
+            for inicio in fronteiras
+        ]
+
+        # --- Mesociclos de cada macrociclo, com o fim acumulado em semanas ---
+        self._fases = {}
+        if not df_meso.empty and {'id_macrociclo', 'ordem'}.issubset(df_meso.columns):
+            for id_macro, mesos in df_meso.groupby('id_macrociclo', sort=False):
+                mesos = mesos.sort_values('ordem', kind='stable')
+                duracoes = mesos['duracao_semanas'] if 'duracao_semanas' in mesos.columns else pd.Series(4, index=mesos.index)
+                duracoes = [max(int(d), 0) if pd.notna(d) else 4 for d in duracoes]
+                fins_semana, acumulado = [], 0
+                for duracao in duracoes:
+                    acumulado += duracao
+                    fins_semana.append(acumulado)
+                self._fases[id_macro] = ([meso for _, meso in mesos.iterrows()], duracoes, fins_semana)
+
+        # --- Plano semanal: linhas por (mesociclo, semana) e treino por dia ---
+        self._linhas_semana = {}
+        self._treino_do_dia = {}
+        if not df_plano_sem.empty and {'id_mesociclo', 'semana_numero'}.issubset(df_plano_sem.columns):
+            self._linhas_semana = df_plano_sem.groupby(['id_mesociclo', 'semana_numero'], sort=False, observed=True).indices
+            if {'dia_da_semana', 'plano_treino'}.issubset(df_plano_sem.columns):
+                for chave in zip(df_plano_sem['id_mesociclo'], df_plano_sem['semana_numero'], df_plano_sem['dia_da_semana'], df_plano_sem['plano_treino']):
+                    self._treino_do_dia.setdefault(chave[:3], chave[3])
+
+        self._id_do_plano = {}
+        if not df_planos_treino.empty and {'nome_plano', 'id_plano'}.issubset(df_planos_treino.columns):
+            for nome, id_plano in zip(df_planos_treino['nome_plano'], df_planos_treino['id_plano']):
+                self._id_do_plano.setdefault(nome, id_plano)
+
+    @classmethod
+    def de_usuario(cls, user_data: Dict[str, Any]) -> "CalendarioPeriodizacao":
+        """Constrói o calendário a partir do dicionário de dados do usuário."""
+        return cls(
+            user_data.get("df_macrociclos", pd.DataFrame()),
+            user_data.get("df_mesociclos", pd.DataFrame()),
+            user_data.get("df_plano_semanal", pd.DataFrame()),
+            user_data.get("df_planos_treino", pd.DataFrame()),
+        )
+
+    def _indice_macro(self, data: date):
+        i = bisect_right(self._inicios_trechos, data.toordinal()) - 1
+        return self._macro_do_trecho[i] if i >= 0 else None
+
+    def macro_em(self, data: date) -> pd.Series or None:
+        """Retorna a linha do macrociclo ativo na data, ou None."""
+        i = self._indice_macro(data)
+        return None if i is None else self._df_macro.iloc[self._macros[i][2]]
+
+    def fases(self, id_macro) -> List[tuple]:
+        """
+        Lista os mesociclos do macrociclo em ordem, como tuplas
+        (mesociclo, data de início, data de fim).
+        """
+        inicio = self._inicio_por_macro.get(id_macro)
+        if inicio is None or id_macro not in self._fases:
+            return []
+        mesos, duracoes, fins_semana = self._fases[id_macro]
+        return [
+            (meso, inicio + pd.Timedelta(weeks=fim - duracao), inicio + pd.Timedelta(weeks=fim))
+            for meso, duracao, fim in zip(mesos, duracoes, fins_semana)
+        ]
+
+    def resolver(self, data: date) -> Dict[str, Any] or None:
+        """
+        Resolve a periodização ativa na data: macrociclo, mesociclo, semana
+        dentro do macro e do meso, e o dia da semana. None se não houver
+        macrociclo ativo; "mesociclo" é None se a data passa dos mesociclos.
+        """
+        i = self._indice_macro(data)
+        if i is None:
+            return None
+        inicio_ord, _, pos, _ = self._macros[i]
+        macro = self._df_macro.iloc[pos]
+        semana_no_macro = (data.toordinal() - inicio_ord) // 7 + 1
+        resultado = {
+            "macrociclo": macro, "mesociclo": None, "semana_no_macro": semana_no_macro,
+            "semana_no_meso": 0, "dia_da_semana": config.DIAS_SEMANA[data.weekday()],
+        }
+        fases = self._fases.get(macro['id_macrociclo'])
+        if fases:
+            mesos, _, fins_semana = fases
+            j = bisect_left(fins_semana, semana_no_macro)
+            if j < len(mesos):
+                resultado["mesociclo"] = mesos[j]
+                resultado["semana_no_meso"] = semana_no_macro - (fins_semana[j - 1] if j else 0)
+        return resultado
+
+    def plano_da_semana(self, id_meso, semana_numero: int) -> pd.DataFrame:
+        """Linhas do plano semanal salvas para a semana do mesociclo."""
+        posicoes = self._linhas_semana.get((id_meso, semana_numero))
+        if posicoes is None:
+            return self.df_plano_sem.iloc[0:0]
+        return self.df_plano_sem.iloc[posicoes]
+
+    def treino_em(self, data: date) -> tuple or None:
+        """
+        Retorna (nome do plano de treino, id do plano) agendado para a data,
+        ou None em dias de descanso, sem plano ou fora da periodização.
+        """
+        periodo = self.resolver(data)
+        if periodo is None or periodo["mesociclo"] is None:
+            return None
+        chave = (periodo["mesociclo"]['id_mesociclo'], periodo["semana_no_meso"], periodo["dia_da_semana"])
+        nome_plano = self._treino_do_dia.get(chave)
+        if nome_plano is None or nome_plano == "Descanso" or nome_plano not in self._id_do_plano:
+            return None
+        return nome_plano, self._id_do_plano[nome_plano]
+
+    def agenda(self, inicio: date, fim: date) -> pd.DataFrame:
+        """
+        Resolve de uma vez a periodização de todos os dias entre `inicio` e
+        `fim` (inclusive). Retorna uma linha por dia com o macrociclo, o
+        mesociclo, as semanas, o treino agendado e o id do plano; as colunas
+        ficam vazias (NA) nos dias fora da periodização ou sem plano.
+        """
+        ordinais = np.arange(inicio.toordinal(), fim.toordinal() + 1)
+        n = len(ordinais)
+        # O -1 extra garante um índice válido mesmo sem macrociclos.
+        macro_do_trecho = np.array([-1 if m is None else m for m in self._macro_do_trecho] + [-1], dtype=np.int64)
+        trecho = np.searchsorted(np.asarray(self._inicios_trechos, dtype=np.int64), ordinais, side='right') - 1
+        idx_macro = np.where(trecho >= 0, macro_do_trecho[trecho.clip(0)], -1)
+
+        id_macro = np.full(n, None, dtype=object)
+        id_meso = np.full(n, None, dtype=object)
+        semana_no_macro = np.zeros(n, dtype=np.int64)
+        semana_no_meso = np.zeros(n, dtype=np.int64)
+        for i in np.unique(idx_macro[idx_macro >= 0]):
+            inicio_ord, _, pos, _ = self._macros[i]
+            nos_dias = idx_macro == i
+            macro = self._df_macro['id_macrociclo'].iloc[pos] if 'id_macrociclo' in self._df_macro.columns else None
+            id_macro[nos_dias] = macro
+            semanas = (ordinais[nos_dias] - inicio_ord) // 7 + 1
+            semana_no_macro[nos_dias] = semanas
+            fases = self._fases.get(macro)
+            if not fases:
+                continue
+            mesos, _, fins_semana = fases
+            fins = np.asarray(fins_semana, dtype=np.int64)
+            j = np.searchsorted(fins, semanas, side='left')
+            dentro = j < len(mesos)
+            ids_mesos = np.array([meso['id_mesociclo'] for meso in mesos] + [None], dtype=object)
+            fins_anteriores = np.concatenate(([0], fins))
+            dias = np.flatnonzero(nos_dias)
+            id_meso[dias] = ids_mesos[j]
+            semana_no_meso[dias[dentro]] = semanas[dentro] - fins_anteriores[j[dentro]]
+
+        dias_semana = [config.DIAS_SEMANA[d] for d in (ordinais - 1) % 7]
+        planos = [
+            None if meso is None else self._treino_do_dia.get((meso, semana, dia))
+            for meso, semana, dia in zip(id_meso, semana_no_meso, dias_semana)
+        ]
+        return pd.DataFrame({
+            config.COL_DATA: pd.date_range(inicio, periods=n, freq='D'),
+            "dia_da_semana": pd.Categorical(dias_semana, categories=config.DIAS_SEMANA),
+            "id_macrociclo": pd.array(id_macro, dtype="Int32"),
+            "id_mesociclo": pd.array(id_meso, dtype="Int32"),
+            "semana_no_macro": pd.array(semana_no_macro, dtype="Int32"),
+            "semana_no_meso": pd.array(semana_no_meso, dtype="Int32"),
+            "plano_treino": pd.array(planos, dtype="string"),
+            "id_plano": pd.array([self._id_do_plano.get(p) if p is not None else None for p in planos], dtype="Int32"),
+        })
+
+def get_workout_for_day(user_data: Dict[str, Any], target_date: date, calendario: CalendarioPeriodizacao = None) -> Dict[str, Any] or None:
     """
     Encontra o plano de treino e os exercícios associados para uma data específica.
+    Se `calendario` não for informado, ele é construído a partir de `user_data`.
     """
-    df_macro = user_data.get("df_macrociclos", pd.DataFrame())
-    df_meso = user_data.get("df_mesociclos", pd.DataFrame())
-    df_plano_sem = user_data.get("df_plano_semanal", pd.DataFrame())
-    df_planos_treino = user_data.get("df_planos_treino", pd.DataFrame())
-    df_exercicios = user_data.get("df_exercicios", pd.DataFrame())
-    
-    target_date_ts = pd.to_datetime(target_date)
-
-    if df_macro.empty or 'data_inicio' not in df_macro.columns: return None
-    macro_ativo = df_macro[
-        (pd.to_datetime(df_macro['data_inicio']) <= target_date_ts) & 
-        (pd.to_datetime(df_macro['data_fim']) >= target_date_ts)
-    ]
-    if macro_ativo.empty: return None
-
-    id_macro_ativo = macro_ativo['id_macrociclo'].iloc[0]
-    mesos_do_macro = df_meso[df_meso['id_macrociclo'] == id_macro_ativo] if 'id_macrociclo' in df_meso.columns else pd.DataFrame()
-    if mesos_do_macro.empty: return None
-
-    data_inicio_macro = pd.to_datetime(macro_ativo['data_inicio'].iloc[0])
-    dias_desde_inicio = (target_date_ts - data_inicio_macro).days
-    semana_no_macro = (dias_desde_inicio // 7) + 1
-    
-    meso_ativo_info = None
-    semana_no_mes = 0
-    semanas_acumuladas = 0
-    if semana_no_macro > 0 and 'ordem' in mesos_do_macro.columns:
-        for _, meso in mesos_do_macro.sort_values('ordem').iterrows():
-            duracao_meso = int(meso.get('duracao_semanas', 4))
-            if semana_no_macro <= semanas_acumuladas + duracao_meso:
-                meso_ativo_info = meso
-                semana_no_mes = semana_no_macro - semanas_acumuladas
-                break
-            semanas_acumuladas += duracao_meso
-    
-    if meso_ativo_info is None: return None
+    if calendario is None:
+        calendario = CalendarioPeriodizacao.de_usuario(user_data)
+    treino = calendario.treino_em(target_date)
+    if treino is None: return None
+    nome_plano_treino, id_plano = treino
 
-    id_meso_ativo = meso_ativo_info['id_mesociclo']
-    dia_da_semana_map = {0: 'Segunda', 1: 'Terça', 2: 'Quarta', 3: 'Quinta', 4: 'Sexta', 5: 'Sábado', 6: 'Domingo'}
-    dia_da_semana_hoje = dia_da_semana_map[target_date.weekday()]
-    
-    plano_semanal = df_plano_sem[
-        (df_plano_sem['id_mesociclo'] == id_meso_ativo) & 
-        (df_plano_sem['semana_numero'] == semana_no_mes) &
-        (df_plano_sem['dia_da_semana'] == dia_da_semana_hoje)
-    ] if 'id_mesociclo' in df_plano_sem.columns else pd.DataFrame()
-
-    if plano_semanal.empty: return None
-    
-    nome_plano_treino = plano_semanal['plano_treino'].iloc[0]
-    if nome_plano_treino == "Descanso": return None
-    
-    plano_info = df_planos_treino[df_planos_treino['nome_plano'] == nome_plano_treino] if 'nome_plano' in df_planos_treino.columns else pd.DataFrame()
-    if plano_info.empty: return None
-
-    id_plano = plano_info['id_plano'].iloc[0]
+    df_exercicios = user_data.get("df_exercicios", pd.DataFrame())
     exercicios_do_plano = df_exercicios[df_exercicios['id_plano'] == id_plano].copy() if 'id_plano' in df_exercicios.columns else pd.DataFrame()
 
     if exercicios_do_plano.empty: return None
@@ -458,35 +778,97 @@ def get_workout_for_day(user_data: Dict[str, Any], target_date: date) -> Dict[st
         "exercicios": exercicios_do_plano
     }
 
-def get_previous_performance(df_log_exercicios: pd.DataFrame, exercicio_nome: str) -> dict:
+def get_workouts_for_range(user_data: Dict[str, Any], start: date, end: date, calendario: CalendarioPeriodizacao = None) -> pd.DataFrame:
+    """
+    Versão em lote de `get_workout_for_day`: resolve os treinos agendados de
+    todos os dias entre `start` e `end` (inclusive) em uma única passada, para
+    calendários, Gantt e comparações entre planejado e realizado.
+
+    Returns:
+        pd.DataFrame: Uma linha por exercício planejado em cada dia, com as
+        colunas de `CalendarioPeriodizacao.agenda` seguidas das colunas do
+        plano de exercícios. Dias de descanso, sem plano ou fora da
+        periodização aparecem uma única vez, com as colunas de exercício vazias.
+    """
+    if calendario is None:
+        calendario = CalendarioPeriodizacao.de_usuario(user_data)
+    agenda = calendario.agenda(start, end)
+
+    df_exercicios = user_data.get("df_exercicios", pd.DataFrame())
+    if df_exercicios.empty or 'id_plano' not in df_exercicios.columns:
+        return agenda
+    if 'ordem' in df_exercicios.columns:
+        df_exercicios = df_exercicios.sort_values('ordem', kind='stable')
+    # Exercícios sem plano não podem casar com os dias sem plano (NA com NA).
+    exercicios = df_exercicios.dropna(subset=['id_plano']).astype({'id_plano': 'Int32'})
+    return agenda.merge(exercicios, on='id_plano', how='left', sort=False)
+
+def construir_indice_ultimo_desempenho(df_log_exercicios: pd.DataFrame) -> dict:
+    """
+    Pré-calcula o último desempenho de cada exercício do log, para que a tela
+    de registro não precise filtrar e ordenar o log inteiro a cada exercício.
+    O último desempenho é a primeira série registrada na data mais recente.
+
+    Args:
+        df_log_exercicios (pd.DataFrame): O log de exercícios (completo ou só as linhas novas).
+
+    Returns:
+        dict: {nome_exercicio: {'data': Timestamp, 'kg': float, 'reps': int, 'minutos': int}}.
+    """
+    if df_log_exercicios.empty or not {'nome_exercicio', 'Data'} <= set(df_log_exercicios.columns):
+        return {}
+
+    # As linhas recém-registradas ainda podem trazer a data como texto.
+    log = df_log_exercicios.assign(_data=pd.to_datetime(df_log_exercicios['Data'], format=config.FORMATO_DATA, errors='coerce'))
+    log = log.dropna(subset=['_data'])
+    # Ordenação estável: entre as séries do mesmo dia, vale a primeira registrada.
+    ultimos = log.sort_values(by='_data', ascending=False, kind='stable').drop_duplicates('nome_exercicio', keep='first')
+
+    def coluna(nome, padrao):
+        return ultimos[nome] if nome in ultimos.columns else pd.Series(padrao, index=ultimos.index)
+
+    return {
+        nome: {'data': data, 'kg': kg, 'reps': reps, 'minutos': minutos}
+        for nome, data, kg, reps, minutos in zip(
+            ultimos['nome_exercicio'], ultimos['_data'], coluna('kg_realizado', 0.0),
+            coluna('reps_realizadas', 0), coluna('minutos_realizados', 0),
+        )
+    }
+
+
+def atualizar_indice_ultimo_desempenho(indice: dict, df_novos: pd.DataFrame):
+    """
+    Atualiza o índice de último desempenho com as séries recém-salvas, sem
+    reprocessar o log inteiro. Um registro só é substituído por outro de data
+    mais recente, mantendo o mesmo resultado de reconstruir o índice do zero.
+    Exercícios que ainda não estão no índice ficam de fora: o histórico deles
+    não foi lido, e a primeira consulta já encontrará as séries novas.
+    """
+    for nome, registro in construir_indice_ultimo_desempenho(df_novos).items():
+        if nome not in indice:
+            continue
+        atual = indice[nome]
+        if atual is None or registro['data'] > atual['data']:
+            indice[nome] = registro
+
+
+def get_previous_performance(indice_desempenho: dict, exercicio_nome: str) -> dict:
     """
     Encontra o último desempenho registrado para um exercício específico,
     retornando os dados brutos (kg, reps, minutos).
 
     Args:
-        df_log_exercicios (pd.DataFrame): O log completo de todos os exercícios.
+        indice_desempenho (dict): O índice criado por `construir_indice_ultimo_desempenho`.
         exercicio_nome (str): O nome do exercício a ser buscado.
 
     Returns:
         dict: Um dicionário contendo {'kg': float, 'reps': int, 'minutos': int}. 
               Retorna zeros se não houver registro anterior.
     """
-    if df_log_exercicios.empty or 'nome_exercicio' not in df_log_exercicios.columns:
+    registro = indice_desempenho.get(exercicio_nome)
+    if registro is None:
         return {'kg': 0.0, 'reps': 0, 'minutos': 0}
-
-    log_exercicio = df_log_exercicios[df_log_exercicios['nome_exercicio'] == exercicio_nome].copy()
-    
-    if log_exercicio.empty:
-        return {'kg': 0.0, 'reps': 0, 'minutos': 0}
-
-    log_exercicio['Data'] = pd.to_datetime(log_exercicio['Data'], format="%d/%m/%Y")
-    ultimo_treino = log_exercicio.sort_values(by='Data', ascending=False).iloc[0]
-    
-    kg = ultimo_treino.get('kg_realizado', 0.0)
-    reps = ultimo_treino.get('reps_realizadas', 0)
-    minutos = ultimo_treino.get('minutos_realizados', 0)
-
-    return {'kg': kg, 'reps': reps, 'minutos': minutos}    
+    return {'kg': registro['kg'], 'reps': registro['reps'], 'minutos': registro['minutos']}
 
 
 def get_latest_metrics(dados_pessoais: Dict[str, Any], df_evolucao: pd.DataFrame) -> Dict[str, Any]:
@@ -511,7 +893,7 @@ def get_latest_metrics(dados_pessoais: Dict[str, Any], df_evolucao: pd.DataFrame
     if col_data not in df_sorted.columns:
         return latest_metrics 
 
-    df_sorted['data_dt'] = pd.to_datetime(df_sorted[col_data], format="%d/%m/%Y", errors='coerce')
+    df_sorted['data_dt'] = df_sorted[col_data]
     df_sorted.dropna(subset=['data_dt'], inplace=True)
     
     # Ordena pela data (desc) e depois pelo índice original (desc) para que o último lançamento do dia fique no topo
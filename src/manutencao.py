@@ -0,0 +1,47 @@
+# ==============================================================================
+# PLANO FIT APP - TAREFAS DE MANUTENÇÃO
+# ==============================================================================
+# Comandos executados fora do aplicativo, a partir da raiz do projeto:
+#   python src/manutencao.py migrar-sqlite [pasta_de_dados]
+#   python src/manutencao.py compor-diagramas
+#   python src/manutencao.py gerar-derivados
+
+import sys
+from pathlib import Path
+
+import config
+import storage
+import utils
+
+
+def migrar_sqlite(argumentos: list):
+    """Importa a pasta de dados inteira para o banco SQLite."""
+    pasta = Path(argumentos[0]) if argumentos else None
+    for usuario, arquivos in storage.migrar_para_sqlite(pasta, bloquear=utils.LOCKS_USUARIO.bloquear).items():
+        print(f"{usuario}: " + ", ".join(f"{nome} ({linhas} linhas)" for nome, linhas in arquivos.items()))
+
+
+def compor_diagramas(argumentos: list):
+    """Gera os SVGs compostos de todos os exercícios da biblioteca."""
+    total = utils.compor_diagramas_da_biblioteca(config.ASSETS_DIR / "exercises" / "exercicios.json")
+    print(f"{total} diagramas em {config.PATH_DIAGRAMAS_COMPOSTOS}")
+
+
+def gerar_derivados(argumentos: list):
+    """Gera (ou atualiza) as imagens reduzidas dos exercícios."""
+    contagem = utils.gerar_derivados_imagens()
+    print(", ".join(f"{quantidade} {tipo}" for tipo, quantidade in contagem.items()))
+
+
+COMANDOS = {
+    "migrar-sqlite": migrar_sqlite,
+    "compor-diagramas": compor_diagramas,
+    "gerar-derivados": gerar_derivados,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMANDOS:
+        print("Uso: python src/manutencao.py " + " | ".join(COMANDOS) + "  (migrar-sqlite aceita [pasta_de_dados])")
+        sys.exit(1)
+    COMANDOS[sys.argv[1]](sys.argv[2:])
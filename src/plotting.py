@@ -8,9 +8,13 @@
 # se integram perfeitamente com o Streamlit.
 # ==============================================================================
 
+from datetime import date
 from typing import Tuple
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
+import config
 
 def plot_energy_composition(tmb: float, tdee: float, alvo: float):
     """
@@ -154,4 +158,94 @@ def plot_composition_range(title: str, current_value: float, normal_range: Tuple
         plot_bgcolor='rgba(0,0,0,0)',
     )
 
-    st.plotly_chart(fig, width='stretch')
\ No newline at end of file
+    st.plotly_chart(fig, width='stretch')
+
+# ==============================================================================
+# HEATMAP DE ATIVIDADE
+# ==============================================================================
+
+DIAS_HEATMAP = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+def assinatura_log_atividade(dft_log: pd.DataFrame) -> str:
+    """
+    Hash do conteúdo (data e calorias) do log de treinos. A soma dos hashes
+    das linhas não depende da ordem delas, assim como o heatmap.
+    """
+    if dft_log.empty:
+        return ""
+    hashes = pd.util.hash_pandas_object(dft_log[[config.COL_DATA, 'Calorias Gastas']], index=False)
+    return f"{len(hashes)}-{int(hashes.to_numpy().sum(dtype=np.uint64))}"
+
+def matriz_heatmap_atividade(datas: pd.Series, calorias: pd.Series, inicio: date, fim: date) -> Tuple[np.ndarray, np.ndarray, list, list]:
+    """
+    Monta a matriz 7×N (dias da semana × semanas) do heatmap entre `inicio` e
+    `fim`, somando as calorias de cada dia. As posições são calculadas por
+    aritmética de índices, sem percorrer os dias em Python.
+
+    Returns:
+        Tuple: (z, textos, posições dos meses no eixo x, nomes dos meses).
+    """
+    dias = pd.date_range(inicio, fim, freq='D')
+    n = len(dias)
+    inicio_d = np.datetime64(inicio, 'D')
+
+    # Soma das calorias por dia do intervalo.
+    desloc = (datas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]') - inicio_d).astype(np.int64)
+    no_intervalo = (desloc >= 0) & (desloc < n) & datas.notna().to_numpy()
+    pesos = np.nan_to_num(calorias.to_numpy(dtype=np.float64, na_value=np.nan)[no_intervalo])
+    atividade = np.bincount(desloc[no_intervalo], weights=pesos, minlength=n)
+
+    # Linha = dia da semana; coluna = semana contada a partir da 1ª segunda-feira anterior a `inicio`.
+    posicao = np.arange(n) + inicio.weekday()
+    linhas, colunas = posicao % 7, posicao // 7
+    total_semanas = int(colunas[-1]) + 1 if n else 0
+    z = np.full((7, total_semanas), np.nan)
+    z[linhas, colunas] = atividade
+    textos = np.full((7, total_semanas), '', dtype=object)
+    textos[linhas, colunas] = dias.strftime('%d/%m/%Y') + ': ' + pd.Index(np.round(atividade).astype(np.int64)).astype(str) + ' kcal'
+
+    # Marca cada mês na coluna do seu primeiro dia da semana inicial (dias 1 a 7),
+    # ignorando a primeira coluna.
+    candidatos = np.flatnonzero((dias.day < 8) & (colunas > 0))
+    _, primeiros_do_mes = np.unique(dias.year[candidatos] * 12 + dias.month[candidatos], return_index=True)
+    primeiros = candidatos[primeiros_do_mes]
+    varios_anos = inicio.year != fim.year
+    nomes = [
+        dias[i].strftime('%b %Y') if varios_anos and dias[i].month == 1 else dias[i].strftime('%b')
+        for i in primeiros
+    ]
+    return z, textos, colunas[primeiros].tolist(), nomes
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _construir_heatmap_atividade(_dft_log: pd.DataFrame, assinatura: str, inicio: date, fim: date, font_color: str) -> go.Figure:
+    """
+    Cria a figura do heatmap. O cache usa a assinatura do conteúdo do log,
+    então a figura só é refeita quando os treinos registrados mudam.
+    """
+    z, textos, posicoes_meses, nomes_meses = matriz_heatmap_atividade(_dft_log[config.COL_DATA], _dft_log['Calorias Gastas'], inicio, fim)
+    fig = go.Figure(data=go.Heatmap(z=z, text=textos, hoverinfo='text', colorscale='YlGnBu', showscale=False, xgap=3, ygap=3))
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+        yaxis=dict(showgrid=False, zeroline=False, autorange='reversed', tickmode='array', ticktext=DIAS_HEATMAP, tickvals=list(range(7))),
+        xaxis=dict(showgrid=False, zeroline=False, tickmode='array', ticktext=nomes_meses, tickvals=posicoes_meses),
+        font=dict(color=font_color), height=250, margin=dict(l=30, r=10, t=50, b=10)
+    )
+    return fig
+
+def plot_activity_heatmap(dft_log: pd.DataFrame, inicio: date = None, fim: date = None, key: str = None):
+    """
+    Exibe o heatmap de calorias gastas por dia, no estilo de calendário.
+    Por padrão mostra do dia 1º de janeiro do ano atual até hoje, mas aceita
+    intervalos de vários anos.
+
+    Args:
+        dft_log (pd.DataFrame): Log de treinos com as colunas de data e 'Calorias Gastas'.
+        inicio (date): Primeiro dia do heatmap.
+        fim (date): Último dia do heatmap.
+        key (str): Chave do gráfico no Streamlit.
+    """
+    fim = fim or date.today()
+    inicio = inicio or date(fim.year, 1, 1)
+    font_color = 'white' if st.get_option("theme.base") == "dark" else 'black'
+    fig = _construir_heatmap_atividade(dft_log, assinatura_log_atividade(dft_log), inicio, fim, font_color)
+    st.plotly_chart(fig, width="stretch", key=key)
@@ -0,0 +1,656 @@
+# ==============================================================================
+# PLANO FIT APP - ARMAZENAMENTO DOS DADOS DO USUÁRIO
+# ==============================================================================
+# Este módulo define os formatos de armazenamento ("backends") usados pelas
+# funções `carregar_df`, `salvar_df` e `adicionar_registro_df` de utils.py.
+# O restante da aplicação continua trabalhando com os caminhos .csv definidos
+# em config.py; é aqui que esses caminhos são traduzidos para o arquivo físico
+# do formato selecionado em `config.STORAGE_BACKEND`.
+# ==============================================================================
+
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import pandas as pd
+import config
+
+# Os formatos colunares (Parquet/Feather) dependem do pacote opcional `pyarrow`.
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+
+class BackendCSV:
+    """Armazena cada tabela como um arquivo CSV (formato original da aplicação)."""
+    nome = "csv"
+    extensao = ".csv"
+    banco = False
+    suporta_anexo = True
+
+    def ler(self, origem) -> pd.DataFrame:
+        try:
+            return pd.read_csv(origem, encoding='utf-8')
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def serializar(self, df: pd.DataFrame) -> bytes:
+        return df.to_csv(index=False).encode('utf-8')
+
+    def escrever(self, df: pd.DataFrame, path: Path):
+        gravar_bytes(self.serializar(df), path)
+
+    def colunas(self, path: Path) -> list:
+        """Lê apenas o cabeçalho do arquivo."""
+        return pd.read_csv(path, encoding='utf-8', nrows=0).columns.tolist()
+
+    def serializar_linhas(self, df: pd.DataFrame, colunas: list) -> bytes:
+        """Serializa as linhas sem cabeçalho, na ordem de colunas do arquivo existente."""
+        return df.reindex(columns=colunas).to_csv(index=False, header=False).encode('utf-8')
+
+
+class BackendParquet:
+    """Armazena cada tabela em Parquet, um formato binário colunar e tipado."""
+    nome = "parquet"
+    extensao = ".parquet"
+    banco = False
+    suporta_anexo = False  # o arquivo precisa ser regravado por inteiro
+
+    def ler(self, origem) -> pd.DataFrame:
+        return pd.read_parquet(origem)
+
+    def serializar(self, df: pd.DataFrame) -> bytes:
+        buffer = io.BytesIO()
+        _preparar_para_arrow(df).to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    def escrever(self, df: pd.DataFrame, path: Path):
+        gravar_bytes(self.serializar(df), path)
+
+
+class BackendFeather:
+    """Armazena cada tabela em Feather (Arrow IPC), otimizado para leitura rápida."""
+    nome = "feather"
+    extensao = ".feather"
+    banco = False
+    suporta_anexo = False  # o arquivo precisa ser regravado por inteiro
+
+    def ler(self, origem) -> pd.DataFrame:
+        return pd.read_feather(origem)
+
+    def serializar(self, df: pd.DataFrame) -> bytes:
+        buffer = io.BytesIO()
+        _preparar_para_arrow(df).to_feather(buffer)
+        return buffer.getvalue()
+
+    def escrever(self, df: pd.DataFrame, path: Path):
+        gravar_bytes(self.serializar(df), path)
+
+
+def _identificador_sql(nome: str) -> str:
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+def _valor_sql(valor):
+    """Converte um valor do pandas/numpy para um tipo aceito pelo sqlite3."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if hasattr(valor, "item"):  # tipos do numpy
+        valor = valor.item()
+    if isinstance(valor, (int, float, str, bytes)):
+        return valor
+    return str(valor)
+
+
+# O banco guarda as datas em ISO-8601 (AAAA-MM-DD), que ordena como texto e
+# permite consultas por intervalo usando o índice (username, Data).
+FORMATO_DATA_BANCO = "%Y-%m-%d"
+
+
+def data_iso(valor):
+    """
+    Converte uma data (date, datetime, Timestamp ou texto em `config.FORMATO_DATA`
+    ou ISO) para o texto ISO gravado no banco. Valores que não são datas
+    reconhecíveis voltam como vieram.
+    """
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, str):
+        for formato in (config.FORMATO_DATA, FORMATO_DATA_BANCO):
+            data = pd.to_datetime(valor, format=formato, errors='coerce')
+            if pd.notna(data):
+                return data.strftime(FORMATO_DATA_BANCO)
+        return valor
+    if hasattr(valor, "strftime"):
+        return valor.strftime(FORMATO_DATA_BANCO)
+    return valor
+
+
+def _datas_para_iso(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """Converte as colunas de data da tabela (datetime64 ou texto) para ISO."""
+    colunas = [col for col in config.COLUNAS_DATA.get(path.name, []) if col in df.columns]
+    if not colunas:
+        return df
+    df = df.copy()
+    for col in colunas:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(FORMATO_DATA_BANCO)
+            continue
+        # Colunas editadas no `st.data_editor` podem misturar textos e datas.
+        texto = df[col].map(lambda v: v.strftime(FORMATO_DATA_BANCO) if hasattr(v, "strftime") and pd.notna(v) else v)
+        iso = pd.to_datetime(texto, format=config.FORMATO_DATA, errors='coerce').dt.strftime(FORMATO_DATA_BANCO)
+        df[col] = iso.where(iso.notna(), texto)
+    return df
+
+
+def _datas_do_banco(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """Converte as colunas de data lidas do banco (texto ISO) para datetime64."""
+    for col in config.COLUNAS_DATA.get(path.name, []):
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format=FORMATO_DATA_BANCO, errors='coerce')
+    return df
+
+
+class BackendSQLite:
+    """
+    Armazena as tabelas de todos os usuários em um único banco SQLite
+    (`config.PATH_BANCO_SQLITE`): uma tabela por tipo de arquivo (ex:
+    `log_exercicios`), com a coluna `username` indicando o dono de cada linha.
+    A tabela `_tabelas` guarda, por usuário, a ordem das colunas (para que cada
+    um leia exatamente as colunas que gravou) e um número de versão que muda a
+    cada gravação. Cada gravação é uma única transação `BEGIN IMMEDIATE`: ela
+    reserva o banco para escrita antes de ler os metadados, então duas
+    gravações concorrentes (de sessões ou processos distintos) nunca se
+    intercalam nem registram o mesmo número de versão.
+    """
+    nome = "sqlite"
+    extensao = ".sqlite"
+    banco = True
+    suporta_anexo = True
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread, já que as sessões do Streamlit rodam em threads distintas."""
+        con = getattr(self._local, "conexao", None)
+        if con is None:
+            config.PATH_BANCO_SQLITE.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(config.PATH_BANCO_SQLITE, timeout=config.LOCK_TIMEOUT_S)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(
+                'CREATE TABLE IF NOT EXISTS "_tabelas" ('
+                'tabela TEXT NOT NULL, username TEXT NOT NULL, colunas TEXT NOT NULL, '
+                'versao INTEGER NOT NULL, PRIMARY KEY (tabela, username))'
+            )
+            self._local.conexao = con
+        return con
+
+    @contextmanager
+    def _transacao_escrita(self):
+        """Abre uma transação de escrita (`BEGIN IMMEDIATE`), confirmada ao final do bloco."""
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+
+    @staticmethod
+    def _identificar(path: Path) -> tuple:
+        """O nome do arquivo dá a tabela; a pasta, o usuário."""
+        return path.stem, path.parent.name
+
+    def chave(self, path: Path) -> str:
+        tabela, username = self._identificar(path)
+        return f"sqlite:{tabela}:{username}"
+
+    def _metadados(self, con, tabela: str, username: str):
+        linha = con.execute(
+            'SELECT colunas, versao FROM "_tabelas" WHERE tabela = ? AND username = ?', (tabela, username)
+        ).fetchone()
+        return (json.loads(linha[0]), linha[1]) if linha else (None, None)
+
+    def versao(self, path: Path):
+        """Versão atual da tabela do usuário, ou None se ela nunca foi gravada."""
+        return self._metadados(self._conexao(), *self._identificar(path))[1]
+
+    def _garantir_tabela(self, con, tabela: str, colunas: list):
+        """Cria a tabela, as colunas que faltarem e os índices de consulta."""
+        t = _identificador_sql(tabela)
+        con.execute(f'CREATE TABLE IF NOT EXISTS {t} ("username" TEXT NOT NULL)')
+        existentes = {linha[1] for linha in con.execute(f"PRAGMA table_info({t})")}
+        for coluna in colunas:
+            if coluna not in existentes:
+                con.execute(f"ALTER TABLE {t} ADD COLUMN {_identificador_sql(coluna)}")
+                existentes.add(coluna)
+        con.execute(f'CREATE INDEX IF NOT EXISTS {_identificador_sql("ix_" + tabela + "_username")} ON {t} ("username")')
+        for coluna in ("Data", "nome_exercicio"):
+            if coluna in existentes:
+                indice = _identificador_sql(f"ix_{tabela}_username_{coluna}")
+                con.execute(f'CREATE INDEX IF NOT EXISTS {indice} ON {t} ("username", {_identificador_sql(coluna)})')
+
+    def _inserir(self, con, tabela: str, username: str, df: pd.DataFrame):
+        if df.empty:
+            return
+        colunas = ["username"] + [str(c) for c in df.columns]
+        sql = (
+            f"INSERT INTO {_identificador_sql(tabela)} ({', '.join(map(_identificador_sql, colunas))}) "
+            f"VALUES ({', '.join('?' * len(colunas))})"
+        )
+        linhas = ([username] + [_valor_sql(v) for v in linha] for linha in df.itertuples(index=False, name=None))
+        con.executemany(sql, linhas)
+
+    def _registrar(self, con, tabela: str, username: str, colunas: list):
+        """Grava a ordem das colunas e incrementa a versão no próprio banco."""
+        con.execute(
+            'INSERT INTO "_tabelas" (tabela, username, colunas, versao) VALUES (?, ?, ?, 1) '
+            'ON CONFLICT (tabela, username) DO UPDATE SET colunas = excluded.colunas, versao = versao + 1',
+            (tabela, username, json.dumps(colunas, ensure_ascii=False)),
+        )
+
+    def ler(self, path: Path, filtros: dict = None) -> pd.DataFrame:
+        """
+        Lê a tabela do usuário, opcionalmente só as linhas que atendem a
+        `filtros` (um WHERE que usa os índices do banco). Cada filtro é um valor
+        exato ou uma tupla (início, fim) de intervalo inclusivo, com None para
+        deixar um lado aberto. As colunas de data voltam como datetime64.
+        """
+        con = self._conexao()
+        tabela, username = self._identificar(path)
+        colunas, _ = self._metadados(con, tabela, username)
+        if not colunas:
+            return pd.DataFrame(columns=colunas or [])
+        filtros = filtros or {}
+        if any(coluna not in colunas for coluna in filtros):
+            return pd.DataFrame(columns=colunas)
+        colunas_data = config.COLUNAS_DATA.get(path.name, [])
+        condicoes, params = ["username = ?"], [username]
+        for coluna, valor in filtros.items():
+            converter = data_iso if coluna in colunas_data else _valor_sql
+            if isinstance(valor, tuple):
+                for operador, limite in zip((">=", "<="), valor):
+                    if limite is not None:
+                        condicoes.append(f"{_identificador_sql(coluna)} {operador} ?")
+                        params.append(converter(limite))
+            else:
+                condicoes.append(f"{_identificador_sql(coluna)} = ?")
+                params.append(converter(valor))
+        sql = (
+            f"SELECT {', '.join(map(_identificador_sql, colunas))} FROM {_identificador_sql(tabela)} "
+            f"WHERE {' AND '.join(condicoes)} ORDER BY rowid"
+        )
+        df = pd.read_sql_query(sql, con, params=params)
+        # Deixa os valores ausentes e os tipos iguais aos de uma leitura do CSV
+        # (NaN em vez de None; colunas vazias como float).
+        for coluna in df.columns[df.isna().all()]:
+            if coluna not in colunas_data:
+                df[coluna] = df[coluna].astype(float)
+        return _datas_do_banco(df.fillna(value=float("nan")).infer_objects(), path)
+
+    def escrever(self, df: pd.DataFrame, path: Path):
+        """Substitui todas as linhas do usuário na tabela (apagar e inserir numa só transação)."""
+        tabela, username = self._identificar(path)
+        colunas = [str(c) for c in df.columns]
+        df = _datas_para_iso(df, path)
+        with self._transacao_escrita() as con:
+            self._garantir_tabela(con, tabela, colunas)
+            con.execute(f"DELETE FROM {_identificador_sql(tabela)} WHERE username = ?", (username,))
+            self._inserir(con, tabela, username, df)
+            self._registrar(con, tabela, username, colunas)
+
+    def adicionar(self, df_novo: pd.DataFrame, path: Path):
+        """Insere as linhas novas; colunas inéditas são acrescentadas à tabela."""
+        tabela, username = self._identificar(path)
+        df_novo = _datas_para_iso(df_novo, path)
+        with self._transacao_escrita() as con:
+            colunas, _ = self._metadados(con, tabela, username)
+            colunas = list(colunas or [])
+            colunas += [str(c) for c in df_novo.columns if str(c) not in colunas]
+            self._garantir_tabela(con, tabela, colunas)
+            self._inserir(con, tabela, username, df_novo)
+            self._registrar(con, tabela, username, colunas)
+
+
+BACKENDS = {
+    "csv": BackendCSV(),
+    "parquet": BackendParquet(),
+    "feather": BackendFeather(),
+    "sqlite": BackendSQLite(),
+}
+
+
+def _preparar_para_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajusta o DataFrame para os formatos Arrow: remove o índice e converte para
+    texto as colunas com tipos misturados (ex: números e textos vindos do
+    `st.data_editor`), que o Arrow não consegue representar.
+    """
+    df = df.reset_index(drop=True)
+    colunas_mistas = [
+        col for col in df.columns
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed")
+    ]
+    if colunas_mistas:
+        df = df.copy()
+        for col in colunas_mistas:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _fsync_diretorio(diretorio: Path):
+    """Garante que a renomeação/criação de arquivos no diretório chegue ao disco (POSIX)."""
+    if os.name != "posix":
+        return
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def gravar_bytes(conteudo: bytes, path: Path):
+    """
+    Grava o conteúdo já serializado de uma tabela de forma atômica: o conteúdo
+    vai para um arquivo temporário no mesmo diretório, que só substitui o
+    original (`os.replace`) depois de gravado no disco. Se o processo for
+    interrompido no meio, o arquivo antigo continua intacto.
+    """
+    fd, temporario = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, path)
+    except BaseException:
+        Path(temporario).unlink(missing_ok=True)
+        raise
+    _fsync_diretorio(path.parent)
+
+
+# --- Journal de anexos pendentes ---
+# Cada pasta de dados (uma por usuário) tem um pequeno journal com os anexos
+# em andamento. O anexo é registrado antes de tocar no arquivo e removido do
+# journal depois de gravado; se o processo morrer no meio, `recuperar_pendentes`
+# conclui (ou desfaz a parte incompleta e refaz) o anexo na próxima leitura.
+
+def caminho_journal(path: Path) -> Path:
+    return path.parent / config.FILE_JOURNAL
+
+
+def _ler_journal(journal: Path) -> list:
+    entradas = []
+    with open(journal, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                entradas.append(json.loads(linha))
+            except json.JSONDecodeError:
+                # Linha incompleta: o processo morreu enquanto registrava o anexo,
+                # então o arquivo de dados ainda não foi alterado.
+                continue
+    return entradas
+
+
+def _reescrever_journal(journal: Path, entradas: list):
+    if entradas:
+        conteudo = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entradas)
+        gravar_bytes(conteudo.encode("utf-8"), journal)
+    else:
+        journal.unlink(missing_ok=True)
+
+
+def _registrar_no_journal(journal: Path, entrada: dict):
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _remover_do_journal(journal: Path, entrada: dict):
+    if not journal.exists():
+        return
+    restantes = [e for e in _ler_journal(journal) if e != entrada]
+    _reescrever_journal(journal, restantes)
+
+
+def anexar_bytes(conteudo: bytes, path: Path):
+    """
+    Acrescenta linhas já serializadas ao final do arquivo, garantindo que elas
+    comecem em uma nova linha mesmo que o arquivo não termine com quebra de linha.
+    O anexo passa pelo journal da pasta, para poder ser concluído após uma queda.
+    """
+    with open(path, "r+b") as f:
+        f.seek(0, io.SEEK_END)
+        tamanho = f.tell()
+        if tamanho > 0:
+            f.seek(-1, io.SEEK_END)
+            if f.read(1) not in (b"\n", b"\r"):
+                conteudo = os.linesep.encode('utf-8') + conteudo
+
+        journal = caminho_journal(path)
+        entrada = {"arquivo": path.name, "tamanho": tamanho, "conteudo": conteudo.decode("utf-8")}
+        _registrar_no_journal(journal, entrada)
+
+        f.seek(tamanho)
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    _remover_do_journal(journal, entrada)
+
+
+def recuperar_pendentes(path: Path):
+    """
+    Conclui os anexos do journal que ficaram pendentes para o arquivo `path`.
+    Para cada anexo, compara o trecho gravado após o tamanho original com o
+    conteúdo registrado: se estiver completo, só limpa o journal; se estiver
+    ausente ou pela metade, trunca o arquivo no tamanho original e grava de novo.
+    """
+    journal = caminho_journal(path)
+    if not journal.exists():
+        return
+    entradas = _ler_journal(journal)
+    pendentes = [e for e in entradas if e.get("arquivo") == path.name]
+    if not pendentes:
+        return
+
+    if path.exists():
+        with open(path, "r+b") as f:
+            for entrada in pendentes:
+                conteudo = entrada["conteudo"].encode("utf-8")
+                tamanho = entrada["tamanho"]
+                f.seek(0, io.SEEK_END)
+                if f.tell() < tamanho:
+                    continue  # o arquivo foi regravado depois do anexo; nada a refazer
+                f.seek(tamanho)
+                gravado = f.read()
+                if gravado == conteudo or not conteudo.startswith(gravado):
+                    # Anexo completo, ou o arquivo já recebeu outros dados depois.
+                    continue
+                f.seek(tamanho)
+                f.truncate()
+                f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+
+    _reescrever_journal(journal, [e for e in entradas if e.get("arquivo") != path.name])
+
+
+def obter_backend(nome: str = None):
+    """
+    Retorna o backend configurado. Se o formato escolhido exigir `pyarrow` e o
+    pacote não estiver instalado, usa CSV para que a aplicação continue funcionando.
+    """
+    nome = (nome or config.STORAGE_BACKEND).lower()
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de armazenamento desconhecido: '{nome}'. Opções: {', '.join(BACKENDS)}.")
+    if nome in ("parquet", "feather") and not PYARROW_DISPONIVEL:
+        return BACKENDS["csv"]
+    return BACKENDS[nome]
+
+
+def arquivo_do_usuario(path: Path) -> bool:
+    """Indica se o caminho aponta para um dos arquivos de dados específicos do usuário."""
+    return path is not None and path.name in config.ARQUIVOS_USUARIO
+
+
+def backend_para(path: Path):
+    """
+    Seleciona o backend de um caminho: os arquivos do usuário seguem a
+    configuração; os arquivos globais (users.csv, session_info.csv) são sempre CSV.
+    """
+    return obter_backend() if arquivo_do_usuario(path) else BACKENDS["csv"]
+
+
+def caminho_fisico(path: Path, backend=None) -> Path:
+    """
+    Traduz o caminho lógico (.csv) para o arquivo efetivamente gravado pelo backend.
+    """
+    backend = backend or backend_para(path)
+    return path.with_suffix(backend.extensao)
+
+
+def _origem_mais_recente(path: Path, backend):
+    """Entre os arquivos já gravados da tabela em outros formatos, o mais recente."""
+    origens = [
+        (caminho_fisico(path, outro), outro) for outro in BACKENDS.values()
+        if outro is not backend and not outro.banco and (outro.nome == "csv" or PYARROW_DISPONIVEL)
+    ]
+    origens = [(origem, outro) for origem, outro in origens if origem.exists()]
+    if not origens:
+        return None, None
+    return max(origens, key=lambda item: item[0].stat().st_mtime_ns)
+
+
+def caminho_backup(origem: Path) -> Path:
+    """Nome dado a um arquivo de origem depois de migrado (ex: treinos.csv.bak)."""
+    return origem.with_name(origem.name + ".bak")
+
+
+def _arquivar_origens(path: Path, backend):
+    """
+    Renomeia para `.bak` os arquivos da tabela em outros formatos, já migrados
+    para `backend`. Assim eles continuam como cópia de segurança, mas não são
+    lidos de novo (com dados antigos) se a configuração voltar ao formato deles.
+    Quem chama deve manter o lock da pasta (`utils.LOCKS_USUARIO`).
+    """
+    for outro in BACKENDS.values():
+        if outro is backend or outro.banco:
+            continue
+        origem = caminho_fisico(path, outro)
+        try:
+            origem.replace(caminho_backup(origem))
+        except FileNotFoundError:
+            continue
+
+
+def migrar_se_necessario(path: Path, backend=None) -> Path:
+    """
+    Converte o arquivo existente para o formato do backend no primeiro acesso.
+    A origem é normalmente o CSV original, mas se a configuração já foi trocada
+    antes (ex: de Parquet para Feather) usa o arquivo gravado mais recentemente.
+    Depois da conversão, os arquivos de origem são renomeados para `.bak`
+    (ver `_arquivar_origens`). Para voltar do banco SQLite para arquivos,
+    exporte as tabelas antes com `exportar_csv`.
+
+    Returns:
+        Path: O caminho físico a ser lido/gravado.
+    """
+    backend = backend or backend_para(path)
+    if backend.banco:
+        if backend.versao(path) is None:
+            origem, backend_origem = _origem_mais_recente(path, backend)
+            if origem is not None:
+                backend.escrever(backend_origem.ler(origem), path)
+                _arquivar_origens(path, backend)
+        return path
+
+    fisico = caminho_fisico(path, backend)
+    if fisico.exists():
+        return fisico
+
+    origem, backend_origem = _origem_mais_recente(path, backend)
+    if origem is not None:
+        backend.escrever(backend_origem.ler(origem), fisico)
+        _arquivar_origens(path, backend)
+    return fisico
+
+
+def precisa_migrar(path: Path, backend=None) -> bool:
+    """Indica se `migrar_se_necessario` vai converter algum arquivo de `path`."""
+    backend = backend or backend_para(path)
+    if backend.banco:
+        return backend.versao(path) is None and _origem_mais_recente(path, backend)[0] is not None
+    return not caminho_fisico(path, backend).exists() and _origem_mais_recente(path, backend)[0] is not None
+
+
+def exportar_csv(path: Path, destino: Path = None) -> Path:
+    """
+    Exporta a tabela armazenada (em qualquer backend) para CSV.
+
+    Args:
+        path (Path): O caminho lógico (.csv) da tabela.
+        destino (Path, optional): Onde salvar o CSV. Por padrão, na subpasta
+                                  `config.PASTA_EXPORTACAO` da pasta do usuário,
+                                  e não no caminho lógico: um CSV ali seria lido
+                                  como dado atual se o backend voltasse ao CSV.
+
+    Returns:
+        Path: O caminho do CSV gerado.
+    """
+    backend = backend_para(path)
+    fisico = migrar_se_necessario(path, backend)
+    destino = destino or path.parent / config.PASTA_EXPORTACAO / path.name
+    if backend.banco:
+        df = backend.ler(path)
+        # O CSV guarda as datas no formato da aplicação, não no ISO do banco.
+        for col in config.COLUNAS_DATA.get(path.name, []):
+            if col in df.columns:
+                df[col] = df[col].dt.strftime(config.FORMATO_DATA)
+    else:
+        df = backend.ler(fisico) if fisico.exists() else pd.DataFrame()
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    BACKENDS["csv"].escrever(df, destino)
+    return destino
+
+
+def migrar_para_sqlite(data_dir: Path = None, bloquear=None) -> dict:
+    """
+    Importa para o banco SQLite todas as tabelas de usuário encontradas em
+    `data/<username>/`, lidas do arquivo mais recente de cada uma. Tabelas já
+    presentes no banco são substituídas pelo conteúdo dos arquivos, que depois
+    são renomeados para `.bak`.
+
+    Args:
+        data_dir (Path, optional): A pasta de dados (padrão: `config.DATA_DIR`).
+        bloquear (callable, optional): Recebe o caminho da tabela e retorna o
+                                       lock da pasta, mantido durante a importação
+                                       (ex: `utils.LOCKS_USUARIO.bloquear`).
+
+    Returns:
+        dict: Quantidade de linhas importadas, por usuário e arquivo.
+    """
+    data_dir = data_dir or config.DATA_DIR
+    banco = BACKENDS["sqlite"]
+    importados = {}
+    for pasta in sorted(p for p in data_dir.iterdir() if p.is_dir()):
+        for nome in config.ARQUIVOS_USUARIO:
+            path = pasta / nome
+            with bloquear(path) if bloquear else nullcontext():
+                origem, backend_origem = _origem_mais_recente(path, banco)
+                if origem is None:
+                    continue
+                df = backend_origem.ler(origem)
+                banco.escrever(df, path)
+                _arquivar_origens(path, banco)
+            importados.setdefault(pasta.name, {})[nome] = len(df)
+    return importados
@@ -31,31 +31,15 @@ import time
 def _get_cached_meal_analysis(df_refeicoes, _tabela_alim):
     """
     Executa os cálculos pesados para a aba de alimentação e armazena o resultado em cache.
+    Retorna também os aliases resolvidos nesta análise que ainda não estavam em
+    disco; quem chama é que os grava (ver `utils.registrar_aliases_alimentos`).
     """
-    # 1. Cálculo dos totais diários
-    total = {config.COL_ENERGIA: 0.0, config.COL_PROTEINA: 0.0, config.COL_CARBOIDRATO: 0.0, config.COL_LIPIDEOS: 0.0, config.COL_SODIO: 0.0}
-    alimentos_nao_encontrados = []
-    if not df_refeicoes.empty and not _tabela_alim.empty:
-        for _, row in df_refeicoes.iterrows():
-            alimento, qtd = str(row.get("Alimento", "")), float(row.get("Quantidade", 0.0) or 0.0)
-            if not alimento or qtd <= 0: continue
-            
-            proc = utils.normalizar_texto(alimento)
-            linha = _tabela_alim[_tabela_alim[config.COL_ALIMENTO_PROC].str.contains(proc, na=False)]
-            
-            if not linha.empty:
-                fator = qtd / 100.0
-                for col in total.keys():
-                    if col in linha.columns:
-                        valor = utils.limpar_valor_numerico(linha.iloc[0][col])
-                        total[col] += valor * fator
-            else:
-                alimentos_nao_encontrados.append(alimento)
-
-    # 2. Análise da distribuição por refeição
-    df_distribuicao = logic.analisar_distribuicao_refeicoes(df_refeicoes, _tabela_alim)
-
-    return total, alimentos_nao_encontrados, df_distribuicao
+    # Os alimentos já resolvidos anteriormente são consultados direto no cache em disco.
+    aliases = utils.carregar_aliases_alimentos()
+    conhecidos = set(aliases)
+    resultado = logic.analisar_refeicoes(df_refeicoes, _tabela_alim, aliases)
+    novos_aliases = {nome: id_alim for nome, id_alim in aliases.items() if nome not in conhecidos}
+    return resultado, novos_aliases
 
 @st.cache_data
 def _get_cached_evolution_charts(_dfe_final, _dados_pessoais, _objetivo_info):
@@ -73,7 +57,7 @@ def _get_cached_evolution_charts(_dfe_final, _dados_pessoais, _objetivo_info):
             dfe_plot[col] = dfe_plot[col].replace(0, np.nan)
     
     date_col = config.COL_DATA if config.COL_DATA in dfe_plot.columns else 'data'
-    dfe_plot['data_dt'] = pd.to_datetime(dfe_plot[date_col], format="%d/%m/%Y")
+    dfe_plot['data_dt'] = dfe_plot[date_col]
     dfe_plot = dfe_plot.sort_values('data_dt')
     
     fig1 = go.Figure()
@@ -260,7 +244,6 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
 
     df_obj = user_data.get("df_objetivo", pd.DataFrame())
     dfe_final = user_data.get("df_evolucao", pd.DataFrame())
-    dft_log = user_data.get("df_log_treinos", pd.DataFrame())
     objetivo_info = df_obj.iloc[0].to_dict() if not df_obj.empty else {}
 
     # --- MODIFICAÇÃO: Usa a nova função para obter os dados mais recentes e válidos ---
@@ -338,36 +321,20 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
     plano_semanal_ativo = pd.DataFrame()
     
     today = pd.to_datetime(date.today())
-    df_macro = user_data.get("df_macrociclos", pd.DataFrame())
-    df_meso = user_data.get("df_mesociclos", pd.DataFrame())
-    df_plano_sem = user_data.get("df_plano_semanal", pd.DataFrame())
-    macro_ativo = df_macro[(pd.to_datetime(df_macro['data_inicio']) <= today) & (pd.to_datetime(df_macro['data_fim']) >= today)] if 'data_inicio' in df_macro.columns else pd.DataFrame()
-
-    if not macro_ativo.empty:
-        id_macro_ativo = macro_ativo['id_macrociclo'].iloc[0]
-        mesos_do_macro = df_meso[df_meso['id_macrociclo'] == id_macro_ativo] if 'id_macrociclo' in df_meso.columns else pd.DataFrame()
-        if not mesos_do_macro.empty:
-            data_inicio_macro = pd.to_datetime(macro_ativo['data_inicio'].iloc[0])
-            dias_desde_inicio_macro = (today - data_inicio_macro).days
-            semana_no_macro = (dias_desde_inicio_macro // 7) + 1 if dias_desde_inicio_macro >= 0 else 0
-            semanas_acumuladas = 0
-            if semana_no_macro > 0 and 'ordem' in mesos_do_macro.columns:
-                for _, meso in mesos_do_macro.sort_values('ordem').iterrows():
-                    duracao_meso = int(meso.get('duracao_semanas', 4))
-                    if semana_no_macro <= semanas_acumuladas + duracao_meso:
-                        meso_ativo_info = meso
-                        semana_no_mes = semana_no_macro - semanas_acumuladas
-                        id_meso_ativo = meso['id_mesociclo']
-                        required_cols = ['id_mesociclo', 'semana_numero']
-                        if not df_plano_sem.empty and all(col in df_plano_sem.columns for col in required_cols):
-                            plano_semanal_ativo = df_plano_sem[(df_plano_sem['id_mesociclo'] == id_meso_ativo) & (df_plano_sem['semana_numero'] == semana_no_mes)]
-                        break
-                    semanas_acumuladas += duracao_meso
-
-    stats = logic.analisar_historico_treinos(dft_log)
+    calendario = _get_calendario_periodizacao(st.session_state.current_user, user_data)
+    periodo = calendario.resolver(date.today())
+    macro_ativo = periodo["macrociclo"] if periodo else None
+
+    if periodo and periodo["mesociclo"] is not None:
+        meso_ativo_info = periodo["mesociclo"]
+        semana_no_mes = periodo["semana_no_meso"]
+        plano_semanal_ativo = calendario.plano_da_semana(meso_ativo_info['id_mesociclo'], semana_no_mes)
+
+    estatisticas_treinos = _get_estatisticas_treinos(st.session_state.current_user, user_data)
+    stats = estatisticas_treinos.resumo()
     if stats:
         st.subheader("💪 Histórico e Consistência")
-        consistencia = logic.analisar_consistencia_habitos(dft_log, plano_semanal_ativo)
+        consistencia = estatisticas_treinos.consistencia(plano_semanal_ativo)
         c1, c2, c3, c4, c5, c6 = st.columns(6)
         c1.metric("Sequência de Treinos", f"{consistencia['streak_dias']} dias")
         c2.metric("Adesão Semanal", f"{consistencia['adesao_percentual']}%")
@@ -377,17 +344,12 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
         c6.metric("Último treino (kcal)", f"{stats['calorias_ultimo_treino']:.0f}")
     st.markdown("---")
 
-    st.subheader(f"📅 Periodização do Treino {macro_ativo['nome'].iloc[0] if not macro_ativo.empty else ''}")
-    if not macro_ativo.empty:
-        id_macro_ativo = macro_ativo['id_macrociclo'].iloc[0]
-        mesos_do_macro = df_meso[df_meso['id_macrociclo'] == id_macro_ativo] if 'id_macrociclo' in df_meso.columns else pd.DataFrame()
-        if not mesos_do_macro.empty and 'ordem' in mesos_do_macro.columns:
-            data_inicio_macro = pd.to_datetime(macro_ativo['data_inicio'].iloc[0])
+    st.subheader(f"📅 Periodização do Treino {macro_ativo['nome'] if macro_ativo is not None else ''}")
+    if macro_ativo is not None:
+        fases = calendario.fases(macro_ativo['id_macrociclo'])
+        if fases:
             gantt_data = []
-            start_date = data_inicio_macro
-            for _, meso in mesos_do_macro.sort_values('ordem').iterrows():
-                duracao_semanas = int(meso.get('duracao_semanas', 4))
-                end_date = start_date + pd.DateOffset(weeks=duracao_semanas)
+            for meso, start_date, end_date in fases:
                 foco_principal_text = str(meso.get('foco_principal', ''))
                 words = foco_principal_text.split(' ')
                 lines = []
@@ -405,7 +367,6 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
                 lines.append(current_line)
                 wrapped_text = "<br>".join(lines)
                 gantt_data.append(dict(Task=meso['nome'], Start=start_date.strftime('%Y-%m-%d'), Finish=end_date.strftime('%Y-%m-%d'), Resource=wrapped_text))
-                start_date = end_date
                 
             if gantt_data:
                 fig = ff.create_gantt(gantt_data, index_col='Resource', show_colorbar=True, group_tasks=True, title='Fases do Treino (Mesociclos)')
@@ -423,7 +384,7 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
         
     if not plano_semanal_ativo.empty:
         cols = st.columns(7)
-        dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+        dias_semana = config.DIAS_SEMANA
         dias_map_local = {0: 'Segunda', 1: 'Terça', 2: 'Quarta', 3: 'Quinta', 4: 'Sexta', 5: 'Sábado', 6: 'Domingo'}
         for i, dia in enumerate(dias_semana):
             treino_do_dia_series = plano_semanal_ativo[plano_semanal_ativo['dia_da_semana'] == dia]['plano_treino']
@@ -439,31 +400,12 @@ def render_visao_geral_tab(user_data: Dict[str, Any], RECOMEND: pd.DataFrame):
     st.markdown("---")
     
     st.subheader("🔥 Heatmap de Atividade")
-    if not dft_log.empty and 'Data' in dft_log.columns and 'Calorias Gastas' in dft_log.columns:
-        dft_heat = dft_log.copy()
-        dft_heat['date'] = pd.to_datetime(dft_heat[config.COL_DATA], format="%d/%m/%Y")
-        today_ts = pd.Timestamp.now().normalize()
-        start_date = pd.Timestamp(date(today_ts.year, 1, 1))
-        daily_activity = dft_heat.groupby(dft_heat['date'].dt.date)['Calorias Gastas'].sum()
-        all_days = pd.date_range(start=start_date, end=today_ts, freq='D')
-        activity_values = all_days.to_series(index=all_days, name='Calorias Gastas').dt.date.map(daily_activity).fillna(0)
-        first_day_of_year_weekday = start_date.weekday()
-        total_weeks = ((all_days.max() - all_days.min()).days + first_day_of_year_weekday) // 7 + 2
-        heatmap_z = np.full((7, total_weeks), np.nan)
-        heatmap_text = np.full((7, total_weeks), '', dtype=object)
-        month_labels = {}
-        for date_ts, activity in activity_values.items():
-            weekday = date_ts.weekday()
-            week_num = (date_ts.dayofyear - 1 + first_day_of_year_weekday) // 7
-            heatmap_z[weekday, week_num] = activity
-            heatmap_text[weekday, week_num] = f"{date_ts.strftime('%d/%m/%Y')}: {activity:.0f} kcal"
-            month_name = date_ts.strftime('%b')
-            if week_num > 0 and date_ts.day < 8 and month_name not in month_labels:
-                month_labels[month_name] = week_num
-        fig = go.Figure(data=go.Heatmap(z=heatmap_z, text=heatmap_text, hoverinfo='text', colorscale='YlGnBu', showscale=False, xgap=3, ygap=3))
-        font_color = 'white' if st.get_option("theme.base") == "dark" else 'black'
-        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', yaxis=dict(showgrid=False, zeroline=False, autorange='reversed', tickmode='array', ticktext=['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'], tickvals=list(range(7))), xaxis=dict(showgrid=False, zeroline=False, tickmode='array', ticktext=list(month_labels.keys()), tickvals=list(month_labels.values())), font=dict(color=font_color), height=250, margin=dict(l=30, r=10, t=50, b=10))
-        st.plotly_chart(fig, width="stretch", key="heatmap_geral")
+    if estatisticas_treinos.total_treinos > 0:
+        # O heatmap mostra só o ano atual: lê apenas essa janela do log.
+        hoje = date.today()
+        path_treinos = utils.get_user_data_path(st.session_state.current_user, config.FILE_LOG_TREINOS_SIMPLES)
+        dft_ano = utils.consultar_df(path_treinos, {config.COL_DATA: (date(hoje.year, 1, 1), hoje)})
+        plotting.plot_activity_heatmap(dft_ano, inicio=date(hoje.year, 1, 1), fim=hoje, key="heatmap_geral")
     else:
         st.info("Registre seu primeiro treino na aba 'Treino' para começar a visualizar seu heatmap de atividades.")
 
@@ -640,6 +582,164 @@ def render_alimentacao_tab(user_data: Dict[str, Any], TABELA_ALIM: pd.DataFrame,
         # A nova funcionalidade de edição da tabela de alimentos fica aqui
         render_cadastro_alimentos_sub_tab(TABELA_ALIM)
 
+@st.fragment
+def _render_editor_refeicoes_dia(df_refeicoes: pd.DataFrame, path_refeicoes: Path):
+    """
+    Editor das refeições do dia. É um fragmento: editar células reexecuta só
+    o editor; ao salvar, o app inteiro é reexecutado para atualizar os totais.
+    """
+    if not df_refeicoes.empty:
+        # 'Refeicao' já vem como categoria na ordem de config.OPCOES_REFEICOES.
+        if "Refeicao" in df_refeicoes.columns:
+            df_refeicoes = df_refeicoes.sort_values(by="Refeicao").reset_index(drop=True)
+
+        edited_df = st.data_editor(
+            df_refeicoes,
+            num_rows="dynamic",
+            width='stretch',
+            hide_index=True,
+            column_config={
+                "Refeicao": st.column_config.SelectboxColumn("Refeição", options=config.OPCOES_REFEICOES, required=True),
+                "Alimento": st.column_config.TextColumn("Alimento", required=True),
+                "Quantidade": st.column_config.NumberColumn("Quantidade (g)", min_value=0.0, step=1.0)
+            },
+            key="editor_refeicoes_dia"
+        )
+
+        if st.button("💾 Salvar Alterações Manuais", key="salvar_refeições"):
+            if 'sb_planos_alim' in st.session_state:
+                st.session_state._preserve_plan_selection_on_rerun = st.session_state.sb_planos_alim
+
+            st.session_state._preserve_assistant_state = {
+                "alvo": st.session_state.get("alvo_adicao_radio"),
+                "refeicao": st.session_state.get("refeicao_assistente_select"),
+                "busca": st.session_state.get("busca_alimento_input")
+            }
+
+            utils.salvar_df(edited_df, path_refeicoes)
+            st.toast("Alterações salvas!", icon="🍽️")
+            _get_cached_meal_analysis.clear()
+            st.rerun()
+    else:
+        st.info("Nenhuma refeição registrada para hoje. Use o 'Assistente de Adição' ao lado para começar.")
+
+
+@st.fragment
+def _render_gerenciar_planos_alimentares(user_data: Dict[str, Any], path_planos: Path, path_refeicoes: Path):
+    """
+    Seleção e edição dos planos alimentares salvos. Como fragmento, trocar de
+    plano ou editar a tabela não reexecuta a aba inteira; ações que gravam em
+    disco (criar, salvar, carregar, apagar) reexecutam o app completo.
+    """
+    planos_df = user_data.get("df_planos_alimentares", pd.DataFrame())
+
+    def handle_create_plan(new_plan_name, current_plans_list):
+        if new_plan_name and new_plan_name not in current_plans_list:
+            novo_plano_df = pd.DataFrame([{'nome_plano': new_plan_name, 'Refeicao': np.nan, 'Alimento': np.nan, 'Quantidade': np.nan}])
+            if not utils.adicionar_registro_df(novo_plano_df, path_planos):
+                return False
+            st.toast(f"Plano '{new_plan_name}' criado!", icon="📅")
+            return True
+        else:
+            st.session_state.form_error = "Nome de plano inválido ou já existente."
+            return False
+
+    def callback_create_and_select_plan():
+        new_plan_name = st.session_state.get("new_plan_name_input", "")
+        plan_list = planos_df['nome_plano'].unique().tolist() if 'nome_plano' in planos_df.columns else []
+
+        if handle_create_plan(new_plan_name, plan_list):
+            st.session_state.sb_planos_alim = new_plan_name
+            if "new_plan_name_input" in st.session_state:
+                del st.session_state["new_plan_name_input"]
+            # O callback roda antes do fragmento, mas o plano novo só entra em
+            # user_data quando o app inteiro é reexecutado.
+            st.session_state._plano_alimentar_criado = True
+
+    if st.session_state.pop("_plano_alimentar_criado", False):
+        st.rerun()
+
+    lista_planos = ["-- Criar Novo Plano --"] + sorted(planos_df['nome_plano'].unique().tolist()) if 'nome_plano' in planos_df.columns else ["-- Criar Novo Plano --"]
+
+    plano_selecionado = st.selectbox(
+        "Selecione um plano para editar ou crie um novo:", 
+        options=lista_planos, 
+        key="sb_planos_alim"
+    )
+
+    if plano_selecionado == "-- Criar Novo Plano --":
+        st.text_input("Nome do Novo Plano Alimentar (ex: Dia de Treino Intenso)", key="new_plan_name_input")
+        st.button("Criar Plano Alimentar", on_click=callback_create_and_select_plan)
+
+        if 'form_error' in st.session_state and st.session_state.form_error:
+            st.error(st.session_state.form_error)
+            del st.session_state.form_error
+
+    elif plano_selecionado != "-- Criar Novo Plano --":
+        st.markdown(f"**Editando o plano: {plano_selecionado}**")
+
+        itens_plano = planos_df[planos_df['nome_plano'] == plano_selecionado].copy()
+
+        itens_plano.dropna(subset=['Alimento'], inplace=True)
+
+        if 'Alimento' in itens_plano.columns:
+            itens_plano['Alimento'] = itens_plano['Alimento'].astype(object)
+        if 'Refeicao' in itens_plano.columns:
+            itens_plano['Refeicao'] = itens_plano['Refeicao'].astype(object)
+
+        if not itens_plano.empty and "Refeicao" in itens_plano.columns:
+            itens_plano = itens_plano.sort_values(by="Refeicao")
+
+        itens_plano.reset_index(drop=True, inplace=True)
+
+        itens_editados = st.data_editor(
+            itens_plano, 
+            num_rows="dynamic", 
+            width='stretch', 
+            key=f"editor_plano_{plano_selecionado}",
+            column_config={
+                "nome_plano": None,
+                "Refeicao": st.column_config.SelectboxColumn("Refeição", options=config.OPCOES_REFEICOES, required=True),
+                "Alimento": st.column_config.TextColumn("Alimento", required=True),
+                "Quantidade": st.column_config.NumberColumn("Quantidade (g)", min_value=0.0, step=1.0)
+            }
+        )
+        c1, c2, c3 = st.columns([1, 1, 1.2])
+        if c1.button("💾 Salvar Alterações no Plano", key=f"save_{plano_selecionado}"):
+            df_outros_planos = planos_df[planos_df['nome_plano'] != plano_selecionado]
+            df_final = pd.concat([df_outros_planos, itens_editados], ignore_index=True)
+            utils.salvar_df(df_final, path_planos)
+            st.toast(f"Plano '{plano_selecionado}' salvo!", icon="💾")
+            st.rerun()
+        if c2.button("🚀 Carregar para Hoje", key=f"load_{plano_selecionado}"):
+            itens_para_carregar = itens_editados.drop(columns=['nome_plano'], errors='ignore')
+            utils.salvar_df(itens_para_carregar, path_refeicoes)
+            st.toast(f"Plano '{plano_selecionado}' carregado para hoje.", icon="🚀")
+            _get_cached_meal_analysis.clear()
+            st.rerun()
+
+        delete_key = f"confirm_delete_plano_alim_{plano_selecionado}"
+
+        if c3.button(f"🗑️ Apagar Plano", type="secondary", key=f"delete_btn_{plano_selecionado}"):
+            st.session_state[delete_key] = True
+
+        if st.session_state.get(delete_key, False):
+            st.warning(f"Tem certeza que deseja apagar o plano '{plano_selecionado}'? Esta ação não pode ser desfeita.")
+            col_conf1, col_conf2, _ = st.columns([1, 1, 3])
+            with col_conf1:
+                if st.button("Sim, apagar", type="primary", key=f"confirm_delete_yes_{plano_selecionado}"):
+                    planos_df = planos_df[planos_df['nome_plano'] != plano_selecionado]
+                    utils.salvar_df(planos_df, path_planos)
+                    st.toast(f"Plano '{plano_selecionado}' apagado.", icon="🗑️")
+                    if 'sb_planos_alim' in st.session_state:
+                        del st.session_state.sb_planos_alim
+                    st.session_state[delete_key] = False
+                    st.rerun()
+            with col_conf2:
+                if st.button("Cancelar", key=f"confirm_delete_no_{plano_selecionado}"):
+                    st.session_state[delete_key] = False
+                    st.rerun()
+
 def render_planejamento_alimentar_sub_tab(user_data: Dict[str, Any], TABELA_ALIM: pd.DataFrame, RECOMEND: pd.DataFrame):
     """
     Renderiza a sub-aba de Planejamento Alimentar, com o registro diário e
@@ -670,7 +770,9 @@ def render_planejamento_alimentar_sub_tab(user_data: Dict[str, Any], TABELA_ALIM
     with col_refeicoes:
         st.subheader("🔢 Totais Calculados",help='Total de calorias com base no objetivo. Demais macronutrientes com base no banco de dados de recomendações.')
         
-        total, alimentos_nao_encontrados, df_distribuicao = _get_cached_meal_analysis(df_refeicoes, TABELA_ALIM)
+        (total, alimentos_nao_encontrados, df_distribuicao), novos_aliases = _get_cached_meal_analysis(df_refeicoes, TABELA_ALIM)
+        if novos_aliases:
+            utils.registrar_aliases_alimentos(novos_aliases)
         
         if alimentos_nao_encontrados:
             st.warning(f"Alimentos não encontrados na base: {', '.join(set(alimentos_nao_encontrados))}")
@@ -767,42 +869,7 @@ def render_planejamento_alimentar_sub_tab(user_data: Dict[str, Any], TABELA_ALIM
             st.info("Adicione refeições para visualizar a análise gráfica.")
 
         st.subheader("Refeições do Dia")
-        
-        if not df_refeicoes.empty:
-            sequencia_refeicao = config.OPCOES_REFEICOES
-            if "Refeicao" in df_refeicoes.columns:
-                df_refeicoes['Refeicao'] = pd.Categorical(df_refeicoes['Refeicao'], categories=sequencia_refeicao, ordered=True)
-                df_refeicoes = df_refeicoes.sort_values(by="Refeicao").reset_index(drop=True)
-
-            edited_df = st.data_editor(
-                df_refeicoes,
-                num_rows="dynamic",
-                width='stretch',
-                hide_index=True,
-                column_config={
-                    "Refeicao": st.column_config.SelectboxColumn("Refeição", options=config.OPCOES_REFEICOES, required=True),
-                    "Alimento": st.column_config.TextColumn("Alimento", required=True),
-                    "Quantidade": st.column_config.NumberColumn("Quantidade (g)", min_value=0.0, step=1.0)
-                },
-                key="editor_refeicoes_dia"
-            )
-
-            if st.button("💾 Salvar Alterações Manuais", key="salvar_refeições"):
-                if 'sb_planos_alim' in st.session_state:
-                    st.session_state._preserve_plan_selection_on_rerun = st.session_state.sb_planos_alim
-                
-                st.session_state._preserve_assistant_state = {
-                    "alvo": st.session_state.get("alvo_adicao_radio"),
-                    "refeicao": st.session_state.get("refeicao_assistente_select"),
-                    "busca": st.session_state.get("busca_alimento_input")
-                }
-
-                utils.salvar_df(edited_df, path_refeicoes)
-                st.toast("Alterações salvas!", icon="🍽️")
-                _get_cached_meal_analysis.clear()
-                st.rerun()
-        else:
-            st.info("Nenhuma refeição registrada para hoje. Use o 'Assistente de Adição' ao lado para começar.")
+        _render_editor_refeicoes_dia(df_refeicoes, path_refeicoes)
 
     with col_assistente:
         st.subheader("✨ Assistente de Adição", help = 'Refeições de acordo com a tabela TACO - Tabela Brasileira de Composição de Alimentos')
@@ -820,8 +887,7 @@ def render_planejamento_alimentar_sub_tab(user_data: Dict[str, Any], TABELA_ALIM
         termo_busca = st.text_input("Buscar Alimento:", key="busca_alimento_input")
         
         if termo_busca and not TABELA_ALIM.empty:
-            termo_proc = utils.normalizar_texto(termo_busca)
-            resultados_df = TABELA_ALIM[TABELA_ALIM[config.COL_ALIMENTO_PROC].str.contains(termo_proc, na=False)].head(25)
+            resultados_df = utils.buscar_alimentos(termo_busca, limite=25)
             
             if not resultados_df.empty:
                 def format_food_details(index):
@@ -843,118 +909,19 @@ def render_planejamento_alimentar_sub_tab(user_data: Dict[str, Any], TABELA_ALIM
                     
                     if alvo_adicao == "Refeições do Dia":
                         nova_refeicao = pd.DataFrame([{"Refeicao": refeicao_escolhida, "Alimento": alimento_selecionado, "Quantidade": quantidade}])
-                        utils.adicionar_registro_df(nova_refeicao, path_refeicoes)
-                        st.toast(f"'{alimento_selecionado}' adicionado!", icon="👍")
-                        _get_cached_meal_analysis.clear()
-                        st.rerun()
+                        if utils.adicionar_registro_df(nova_refeicao, path_refeicoes):
+                            st.toast(f"'{alimento_selecionado}' adicionado!", icon="👍")
+                            _get_cached_meal_analysis.clear()
+                            st.rerun()
                     elif alvo_adicao == "Plano Alimentar" and plano_alvo_nome:
                         novo_item_plano = pd.DataFrame([{'nome_plano': plano_alvo_nome, 'Refeicao': refeicao_escolhida, 'Alimento': alimento_selecionado, 'Quantidade': quantidade}])
-                        utils.adicionar_registro_df(novo_item_plano, path_planos)
-                        st.rerun()
+                        if utils.adicionar_registro_df(novo_item_plano, path_planos):
+                            st.rerun()
             elif termo_busca:
                 st.info("Nenhum alimento encontrado.")
 
-    def handle_create_plan(new_plan_name, current_plans_list):
-        if new_plan_name and new_plan_name not in current_plans_list:
-            novo_plano_df = pd.DataFrame([{'nome_plano': new_plan_name, 'Refeicao': np.nan, 'Alimento': np.nan, 'Quantidade': np.nan}])
-            utils.adicionar_registro_df(novo_plano_df, path_planos)
-            st.toast(f"Plano '{new_plan_name}' criado!", icon="📅")
-            return True
-        else:
-            st.session_state.form_error = "Nome de plano inválido ou já existente."
-            return False
-
-    def callback_create_and_select_plan():
-        new_plan_name = st.session_state.get("new_plan_name_input", "")
-        plan_list = df_planos_alimentares['nome_plano'].unique().tolist() if 'nome_plano' in df_planos_alimentares.columns else []
-        
-        if handle_create_plan(new_plan_name, plan_list):
-            st.session_state.sb_planos_alim = new_plan_name
-            if "new_plan_name_input" in st.session_state:
-                del st.session_state["new_plan_name_input"]
-
     with st.expander("Gerenciar Meus Planos Alimentares", expanded=True):
-        planos_df = user_data.get("df_planos_alimentares", pd.DataFrame())
-        lista_planos = ["-- Criar Novo Plano --"] + sorted(planos_df['nome_plano'].unique().tolist()) if 'nome_plano' in planos_df.columns else ["-- Criar Novo Plano --"]
-        
-        plano_selecionado = st.selectbox(
-            "Selecione um plano para editar ou crie um novo:", 
-            options=lista_planos, 
-            key="sb_planos_alim"
-        )
-        
-        if plano_selecionado == "-- Criar Novo Plano --":
-            st.text_input("Nome do Novo Plano Alimentar (ex: Dia de Treino Intenso)", key="new_plan_name_input")
-            st.button("Criar Plano Alimentar", on_click=callback_create_and_select_plan)
-
-            if 'form_error' in st.session_state and st.session_state.form_error:
-                st.error(st.session_state.form_error)
-                del st.session_state.form_error
-        
-        elif plano_selecionado != "-- Criar Novo Plano --":
-            st.markdown(f"**Editando o plano: {plano_selecionado}**")
-            
-            itens_plano = planos_df[planos_df['nome_plano'] == plano_selecionado].copy()
-            
-            itens_plano.dropna(subset=['Alimento'], inplace=True)
-
-            if 'Alimento' in itens_plano.columns:
-                itens_plano['Alimento'] = itens_plano['Alimento'].astype(object)
-            if 'Refeicao' in itens_plano.columns:
-                itens_plano['Refeicao'] = itens_plano['Refeicao'].astype(object)
-
-            if not itens_plano.empty and "Refeicao" in itens_plano.columns:
-                itens_plano = itens_plano.sort_values(by="Refeicao")
-
-            itens_plano.reset_index(drop=True, inplace=True)
-            
-            itens_editados = st.data_editor(
-                itens_plano, 
-                num_rows="dynamic", 
-                width='stretch', 
-                key=f"editor_plano_{plano_selecionado}",
-                column_config={
-                    "nome_plano": None,
-                    "Refeicao": st.column_config.SelectboxColumn("Refeição", options=config.OPCOES_REFEICOES, required=True),
-                    "Alimento": st.column_config.TextColumn("Alimento", required=True),
-                    "Quantidade": st.column_config.NumberColumn("Quantidade (g)", min_value=0.0, step=1.0)
-                }
-            )
-            c1, c2, c3 = st.columns([1, 1, 1.2])
-            if c1.button("💾 Salvar Alterações no Plano", key=f"save_{plano_selecionado}"):
-                df_outros_planos = planos_df[planos_df['nome_plano'] != plano_selecionado]
-                df_final = pd.concat([df_outros_planos, itens_editados], ignore_index=True)
-                utils.salvar_df(df_final, path_planos)
-                st.toast(f"Plano '{plano_selecionado}' salvo!", icon="💾")
-                st.rerun()
-            if c2.button("🚀 Carregar para Hoje", key=f"load_{plano_selecionado}"):
-                itens_para_carregar = itens_editados.drop(columns=['nome_plano'], errors='ignore')
-                utils.salvar_df(itens_para_carregar, path_refeicoes)
-                st.toast(f"Plano '{plano_selecionado}' carregado para hoje.", icon="🚀")
-                _get_cached_meal_analysis.clear()
-                st.rerun()
-
-            delete_key = f"confirm_delete_plano_alim_{plano_selecionado}"
-
-            if c3.button(f"🗑️ Apagar Plano", type="secondary", key=f"delete_btn_{plano_selecionado}"):
-                st.session_state[delete_key] = True
-
-            if st.session_state.get(delete_key, False):
-                st.warning(f"Tem certeza que deseja apagar o plano '{plano_selecionado}'? Esta ação não pode ser desfeita.")
-                col_conf1, col_conf2, _ = st.columns([1, 1, 3])
-                with col_conf1:
-                    if st.button("Sim, apagar", type="primary", key=f"confirm_delete_yes_{plano_selecionado}"):
-                        planos_df = planos_df[planos_df['nome_plano'] != plano_selecionado]
-                        utils.salvar_df(planos_df, path_planos)
-                        st.toast(f"Plano '{plano_selecionado}' apagado.", icon="🗑️")
-                        if 'sb_planos_alim' in st.session_state:
-                            del st.session_state.sb_planos_alim
-                        st.session_state[delete_key] = False
-                        st.rerun()
-                with col_conf2:
-                    if st.button("Cancelar", key=f"confirm_delete_no_{plano_selecionado}"):
-                        st.session_state[delete_key] = False
-                        st.rerun()
+        _render_gerenciar_planos_alimentares(user_data, path_planos, path_refeicoes)
 
 def render_cadastro_alimentos_sub_tab(TABELA_ALIM: pd.DataFrame):
     """
@@ -1012,11 +979,11 @@ def render_cadastro_alimentos_sub_tab(TABELA_ALIM: pd.DataFrame):
                     new_row_data['Sodio(mg)'] = sodio_mg
                     
                     novo_alimento_df = pd.DataFrame([new_row_data])
-                    utils.adicionar_registro_df(novo_alimento_df, config.PATH_TABELA_ALIM)
-                    
-                    utils.carregar_tabela_alimentacao.clear()
-                    st.toast(f"Alimento '{alimento_nome}' adicionado com sucesso!")
-                    st.rerun()
+                    if utils.adicionar_registro_df(novo_alimento_df, config.PATH_TABELA_ALIM):
+                        utils.carregar_tabela_alimentacao.clear()
+                        utils.invalidar_aliases_alimentos()
+                        st.toast(f"Alimento '{alimento_nome}' adicionado com sucesso!")
+                        st.rerun()
 
     st.subheader("Tabela Completa")
     
@@ -1070,12 +1037,11 @@ def render_cadastro_alimentos_sub_tab(TABELA_ALIM: pd.DataFrame):
             df_para_salvar[config.COL_ALIMENTO] = df_para_salvar[config.COL_ALIMENTO].apply(utils.limpar_texto_bruto)
             df_para_salvar[config.COL_ALIMENTO_PROC] = df_para_salvar[config.COL_ALIMENTO].apply(utils.normalizar_texto)
 
-        utils.salvar_df(df_para_salvar, config.PATH_TABELA_ALIM)
-        
-        utils.carregar_tabela_alimentacao.clear()
-        
-        st.toast("Tabela de alimentos atualizada com sucesso!", icon="✅")
-        st.rerun()
+        if utils.salvar_df(df_para_salvar, config.PATH_TABELA_ALIM):
+            utils.carregar_tabela_alimentacao.clear()
+            utils.invalidar_aliases_alimentos()
+            st.toast("Tabela de alimentos atualizada com sucesso!", icon="✅")
+            st.rerun()
 
 def render_treino_tab(user_data: Dict[str, Any]):
     """
@@ -1157,22 +1123,13 @@ def render_planejamento_sub_tab(username: str, user_data: Dict[str, Any]):
     df_meso = user_data.get("df_mesociclos", pd.DataFrame())
     df_plano_sem = user_data.get("df_plano_semanal", pd.DataFrame())
 
-    colunas_exercicios_necessarias = {
-        'id_plano': pd.Series(dtype='int'), 'nome_exercicio': pd.Series(dtype='str'),
-        'tipo_exercicio': pd.Series(dtype='str'), 'series_planejadas': pd.Series(dtype='int'),
-        'repeticoes_planejadas': pd.Series(dtype='str'), 'ordem': pd.Series(dtype='int')
-    }
-    for col, dtype_series in colunas_exercicios_necessarias.items():
-        if col not in df_exercicios_todos.columns:
-            df_exercicios_todos[col] = dtype_series
-
     path_planos_treino = utils.get_user_data_path(username, config.FILE_PLANOS_TREINO)
     path_exercicios = utils.get_user_data_path(username, config.FILE_PLANOS_EXERCICIOS)
     path_macro = utils.get_user_data_path(username, config.FILE_MACROCICLOS)
     path_meso = utils.get_user_data_path(username, config.FILE_MESOCICLOS)
     path_plano_sem = utils.get_user_data_path(username, config.FILE_PLANO_SEMANAL)
     path_exercicios_db = config.ASSETS_DIR / "exercises" / "exercicios.json"
-    exercisedb = utils.carregar_banco_exercicios(path_exercicios_db)
+    catalogo = utils.carregar_catalogo_exercicios(path_exercicios_db)
 
     with st.expander("Modelos de Treino", expanded=True):
         c1, c2 = st.columns([1, 2])
@@ -1223,60 +1180,66 @@ def render_planejamento_sub_tab(username: str, user_data: Dict[str, Any]):
                 st.markdown("---")
                 st.subheader("Assistente de Adição")
 
-                if exercisedb:
-                    all_muscles = set()
-                    all_equipment = set()
-                    for ex in exercisedb:
-                        if isinstance(ex, dict):
-                            for muscle in ex.get("primaryMuscles", []): all_muscles.add(muscle.title())
-                            equip = ex.get("equipment")
-                            if equip: all_equipment.add(equip.title())
-                    
-                    muscle_options = ["Todos"] + sorted(list(all_muscles))
-                    equipment_options = ["Todos"] + sorted(list(all_equipment))
-                    
-                    selected_muscle = st.selectbox("Filtrar por grupo muscular:", options=muscle_options, key="filtro_grupo_muscular")
-                    selected_equipment = st.selectbox("Filtrar por equipamento:", options=equipment_options, key="filtro_equipamento")
-                    
-                    search_term = st.text_input("Buscar exercício por nome:").lower()
+                if len(catalogo):
+                    # Facetas do assistente: (campo do catálogo, rótulo, chave do widget).
+                    # As contagens usam as seleções atuais das demais facetas e a busca.
+                    facetas_assistente = [
+                        ("primaryMuscles", "Filtrar por grupo muscular:", "filtro_grupo_muscular"),
+                        ("equipment", "Filtrar por equipamento:", "filtro_equipamento"),
+                        ("level", "Filtrar por nível:", "filtro_nivel_exercicio"),
+                    ]
+                    filtros = {
+                        campo: None if st.session_state.get(chave, "Todos") == "Todos" else st.session_state[chave]
+                        for campo, _, chave in facetas_assistente
+                    }
+                    termo_atual = st.session_state.get("filtro_busca_exercicio", "")
+
+                    selecoes = []
+                    for campo, rotulo, chave in facetas_assistente:
+                        contagem = catalogo.contagens(campo, filtros, termo_atual)
+                        selecoes.append(st.selectbox(
+                            rotulo, options=["Todos"] + sorted(catalogo.facetas[campo]), key=chave,
+                            format_func=lambda v, contagem=contagem: v if v == "Todos" else f"{v} ({contagem.get(v, 0)})"
+                        ))
+                    selected_muscle, selected_equipment, selected_level = selecoes
 
-                    current_filter_state = f"{selected_muscle}-{selected_equipment}-{search_term}"
+                    search_term = st.text_input("Buscar exercício por nome:", key="filtro_busca_exercicio")
+
+                    current_filter_state = f"{selected_muscle}-{selected_equipment}-{selected_level}-{search_term}"
                     if 'last_filter_state' not in st.session_state or st.session_state.last_filter_state != current_filter_state:
                         st.session_state.last_filter_state = current_filter_state
                         st.session_state.exercises_to_show = 5
                     if 'exercises_to_show' not in st.session_state:
                         st.session_state.exercises_to_show = 5
 
-                    if search_term or selected_muscle != "Todos" or selected_equipment != "Todos":
-                        filtered_exercises = []
-                        for ex in exercisedb:
-                            if not isinstance(ex, dict): continue
-                            muscle_match = (selected_muscle == "Todos" or any(m.title() == selected_muscle for m in ex.get("primaryMuscles", [])))
-                            equip_match = (selected_equipment == "Todos" or (ex.get("equipment") or "").title() == selected_equipment)
-                            name_match = search_term in ex.get("name", "").lower()
-                            if muscle_match and equip_match and name_match:
-                                filtered_exercises.append(ex)
+                    if search_term or any(v != "Todos" for v in selecoes):
+                        filtros = {
+                            campo: None if valor == "Todos" else valor
+                            for (campo, _, _), valor in zip(facetas_assistente, selecoes)
+                        }
+                        filtered_exercises = catalogo.posicoes(catalogo.filtrar(filtros, search_term))
 
                         if not filtered_exercises:
                             st.info("Nenhum exercício encontrado com os filtros selecionados.")
+                        else:
+                            st.caption(f"{len(filtered_exercises)} exercício(s) encontrado(s).")
                         
-                        base_image_path = config.ASSETS_DIR / "exercises"
                         exercises_to_display = filtered_exercises[:st.session_state.exercises_to_show]
-                        for i, ex in enumerate(exercises_to_display):
+                        for i, pos in enumerate(exercises_to_display):
+                            ex = catalogo.registro(pos)
                             ex_name = ex.get("name")
                             instruction = ex.get("instructions", [])
                             if not ex_name: continue
                             with st.container(border=True):
                                 st.markdown(f"**{ex_name}**")
-                                images = ex.get("images", [])
+                                images = catalogo.imagens_na_posicao(pos, largura=500)
                                 if len(images) == 2:
-                                    image_path1 = base_image_path / Path(images[0])
-                                    image_path2 = base_image_path / Path(images[1])
+                                    image_path1, image_path2 = images
                                     if image_path1.exists() and image_path2.exists():
                                         anim_html = utils.get_image_animation_html(image_path1, image_path2, width=500)
                                         st.markdown(anim_html, unsafe_allow_html=True)
                                 elif images:
-                                    image_path = base_image_path / Path(images[0])
+                                    image_path = images[0]
                                     if image_path.exists(): st.image(str(image_path), width='stretch')
 
                                 st.markdown("<br/>", unsafe_allow_html=True)
@@ -1333,7 +1296,6 @@ def render_planejamento_sub_tab(username: str, user_data: Dict[str, Any]):
                     if 'ordem' in df_exercicios_plano.columns: df_exercicios_plano = df_exercicios_plano.drop(columns=['ordem'])
                     df_exercicios_plano = df_exercicios_plano.reset_index(drop=True).reset_index().rename(columns={'index': 'ordem'})
                 df_exercicios_plano = df_exercicios_plano.sort_values('ordem')
-                df_exercicios_plano['repeticoes_planejadas'] = df_exercicios_plano['repeticoes_planejadas'].astype(str)
                 
                 exercicios_editados = st.data_editor(
                     df_exercicios_plano, num_rows="dynamic", width='stretch', key=f"editor_exercicios_tab", hide_index=True,
@@ -1506,7 +1468,7 @@ def render_planejamento_sub_tab(username: str, user_data: Dict[str, Any]):
                 id_meso_ativo = meso_selecionado_info['id_mesociclo'].iloc[0]
                 duracao_meso = meso_selecionado_info['duracao_semanas'].iloc[0]
                 semana_num = st.number_input(f"Selecione a Semana para planejar (1 a {int(duracao_meso)})", min_value=1, max_value=int(duracao_meso), step=1, key=f"semana_num_{id_meso_ativo}")
-                dias_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+                dias_semana = config.DIAS_SEMANA
                 planos_disponiveis = ["Descanso"] + (df_planos_treino['nome_plano'].tolist() if 'nome_plano' in df_planos_treino.columns else [])
                 plano_semanal_salvo = df_plano_sem[(df_plano_sem['id_mesociclo'] == id_meso_ativo) & (df_plano_sem['semana_numero'] == semana_num)] if 'id_mesociclo' in df_plano_sem.columns else pd.DataFrame()
                 
@@ -1540,247 +1502,161 @@ def render_planejamento_sub_tab(username: str, user_data: Dict[str, Any]):
         else:
             st.info("Crie e salve um mesociclo acima para poder planejar as semanas.")
 
-def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
+def _get_indice_ultimo_desempenho(username: str) -> dict:
     """
-    Renderiza a sub-aba para registrar treinos, com um painel de controle
-    customizado para corresponder fielmente ao layout do usuário.
+    Retorna o índice de último desempenho por exercício, guardado na sessão.
+    Ele começa vazio e é preenchido exercício a exercício por
+    `_ultimo_desempenho`; só é descartado quando o log de exercícios muda fora
+    desta sessão (os treinos salvos aqui o atualizam incrementalmente).
     """
-    if st.session_state.get("revert_plan_selection", False):
-        st.session_state.sb_plano_selecionado = st.session_state.current_plan_name
-        st.session_state.revert_plan_selection = False
+    path_log = utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS)
+    assinatura = utils.assinatura_tabela(path_log)
+    salvo = st.session_state.get("indice_ultimo_desempenho")
+    if salvo is None or salvo[:2] != (username, assinatura):
+        st.session_state.indice_ultimo_desempenho = (username, assinatura, {})
+    return st.session_state.indice_ultimo_desempenho[2]
+
+def _ultimo_desempenho(username: str, indice: dict, nome_exercicio: str) -> dict:
+    """
+    Retorna o último desempenho do exercício. Na primeira vez que o exercício
+    aparece, lê do log só as séries dele (consulta indexada no SQLite) e guarda
+    o resultado no índice, inclusive a ausência de histórico.
+    """
+    if nome_exercicio not in indice:
+        path_log = utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS)
+        df_exercicio = utils.consultar_df(path_log, {'nome_exercicio': nome_exercicio})
+        indice[nome_exercicio] = logic.construir_indice_ultimo_desempenho(df_exercicio).get(nome_exercicio)
+    return logic.get_previous_performance(indice, nome_exercicio)
 
-    # --- LÓGICA DE DADOS E TIMERS (INICIALIZAÇÃO) ---
-    scheduled_workout = logic.get_workout_for_day(user_data, date.today())
-    df_log_exercicios = user_data.get("df_log_exercicios", pd.DataFrame())
+def _get_estatisticas_treinos(username: str, user_data: Dict[str, Any]) -> logic.EstatisticasTreinos:
+    """
+    Retorna os agregados do log de treinos. Eles ficam na sessão e em disco
+    (`config.FILE_ESTATISTICAS_TREINOS`) e só são recalculados a partir do log
+    inteiro quando ele foi alterado por fora dos salvamentos desta aplicação.
+    """
+    assinatura = utils.assinatura_tabela(utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES))
+    salvo = st.session_state.get("estatisticas_treinos")
+    if salvo is None or salvo[:2] != (username, assinatura):
+        dados = utils.carregar_estatisticas_treinos(username, assinatura)
+        if dados:
+            estatisticas = logic.EstatisticasTreinos.de_dict(dados)
+        else:
+            estatisticas = logic.EstatisticasTreinos.do_log(user_data.get("df_log_treinos", pd.DataFrame()))
+            utils.salvar_estatisticas_treinos(username, estatisticas.para_dict())
+        st.session_state.estatisticas_treinos = (username, assinatura, estatisticas)
+    return st.session_state.estatisticas_treinos[2]
 
-    # --- Carrega o banco de dados de exercícios ---
-    path_exercicios_db = config.ASSETS_DIR / "exercises" / "exercicios.json"
-    exercisedb_data = utils.carregar_banco_exercicios(path_exercicios_db)
-    
-    exercisedb = []
-    if isinstance(exercisedb_data, list):
-        exercisedb = exercisedb_data
-    elif isinstance(exercisedb_data, dict) and "exercises" in exercisedb_data:
-        exercisedb = exercisedb_data["exercises"]
-    
-    # --- Cria mapas de consulta ---
-    exercise_image_map = {}
-    exercise_details_map = {}
-    exercise_name_list = []
-    base_image_path = config.ASSETS_DIR / "exercises"
-    if exercisedb:
-        for ex_data in exercisedb:
-            if isinstance(ex_data, dict) and ex_data.get("name"):
-                ex_name = ex_data["name"]
-                exercise_name_list.append(ex_name)
-                normalized_name = utils.normalizar_texto(ex_name)
-                exercise_details_map[normalized_name] = ex_data
-                if ex_data.get("images"):
-                    image_paths = [base_image_path / Path(img_path) for img_path in ex_data["images"]]
-                    exercise_image_map[normalized_name] = image_paths
+def _atualizar_estatisticas_treinos(username: str, assinatura_antes: str, df_antes: pd.DataFrame = None, df_depois: pd.DataFrame = None):
+    """
+    Atualiza os agregados do log de treinos depois de uma gravação em
+    `treinos.csv`, aplicando só as linhas que mudaram. Se os agregados não
+    correspondiam ao log de antes da gravação, ou se o log não mudou (a
+    gravação falhou), nada é feito: eles serão recalculados na próxima leitura.
+    """
+    assinatura = utils.assinatura_tabela(utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES))
+    if assinatura == assinatura_antes:
+        return
+    salvo = st.session_state.get("estatisticas_treinos")
+    if salvo is not None and salvo[:2] == (username, assinatura_antes):
+        estatisticas = salvo[2]
+    else:
+        dados = utils.carregar_estatisticas_treinos(username, assinatura_antes)
+        if not dados:
+            return
+        estatisticas = logic.EstatisticasTreinos.de_dict(dados)
+    estatisticas.atualizar(df_antes, df_depois)
+    utils.salvar_estatisticas_treinos(username, estatisticas.para_dict())
+    st.session_state.estatisticas_treinos = (username, assinatura, estatisticas)
+
+def _get_calendario_periodizacao(username: str, user_data: Dict[str, Any]) -> logic.CalendarioPeriodizacao:
+    """
+    Retorna o calendário de periodização do usuário, guardado na sessão e
+    reconstruído apenas quando alguma das tabelas de periodização é gravada.
+    """
+    arquivos = (config.FILE_MACROCICLOS, config.FILE_MESOCICLOS, config.FILE_PLANO_SEMANAL, config.FILE_PLANOS_TREINO)
+    assinatura = tuple(utils.assinatura_tabela(utils.get_user_data_path(username, arquivo)) for arquivo in arquivos)
+    salvo = st.session_state.get("calendario_periodizacao")
+    if salvo is None or salvo[:2] != (username, assinatura):
+        calendario = logic.CalendarioPeriodizacao.de_usuario(user_data)
+        st.session_state.calendario_periodizacao = (username, assinatura, calendario)
+    return st.session_state.calendario_periodizacao[2]
+
+def _relogio_no_navegador(segundos: float = 0.0, correndo: bool = False, regressivo: bool = False, estilo: str = "", rodape: str = "", altura: int = 60):
+    """
+    Mostra um relógio que avança no próprio navegador (JavaScript em um
+    iframe), sem rerun do app a cada segundo. O HTML recebe o tempo medido no
+    servidor (decorrido ou restante) e o navegador conta a partir do instante
+    em que o componente carregou, com o próprio relógio. Como nenhum horário
+    do servidor é comparado com o do navegador, uma diferença entre os dois
+    relógios não adianta nem atrasa o timer. A cada rerun o iframe é recriado
+    com o valor atualizado.
 
-    # --- GERENCIAMENTO DE ESTADO E SELEÇÃO DE PLANO ---
-    df_planos_treino = user_data.get("df_planos_treino", pd.DataFrame(columns=['nome_plano']))
-    all_plans = ["Nenhum (Avulso)"] + df_planos_treino['nome_plano'].unique().tolist()
-    
-    if 'current_plan_name' not in st.session_state:
-        st.session_state.current_plan_name = scheduled_workout['nome_plano'] if scheduled_workout else "Nenhum (Avulso)"
-    
-    try:
-        default_index = all_plans.index(st.session_state.current_plan_name)
-    except ValueError:
-        default_index = 0
-    
-    # --- PAINEL DE CONTROLE DO TREINO (COM SELECTBOX) ---
-    with st.container(border=True):
-        col1, col2, col3 = st.columns([2.5, 3, 3])
-        # Coluna 1: Timer
-        with col1:
-            if 'timer_started' not in st.session_state: st.session_state.timer_started = False
-            if 'start_time' not in st.session_state: st.session_state.start_time = None
-            if 'elapsed_minutes' not in st.session_state: st.session_state.elapsed_minutes = 0.0
+    Args:
+        segundos (float): Tempo decorrido (cronômetro) ou restante (regressivo) agora.
+        correndo (bool): Se o relógio deve avançar; parado, só mostra `segundos`.
+        regressivo (bool): Contagem regressiva (em vermelho nos últimos 10s).
+        estilo (str): CSS do número exibido.
+        rodape (str): HTML exibido abaixo do número.
+        altura (int): Altura do iframe, em pixels.
+    """
+    html = f"""
+    <div style="font-family: 'Source Sans Pro', sans-serif; color: rgb(250, 250, 250); text-align: {'center' if regressivo else 'left'};">
+        <p id="relogio" style="margin: 0; font-weight: bold; {estilo}"></p>
+        {rodape}
+    </div>
+    <script>
+        const base = {max(0.0, float(segundos))}, correndo = {'true' if correndo else 'false'}, regressivo = {'true' if regressivo else 'false'};
+        const carregado = performance.now();
+        const relogio = document.getElementById("relogio");
+        const doisDigitos = (n) => String(n).padStart(2, "0");
+        function atualizar() {{
+            const decorrido = correndo ? (performance.now() - carregado) / 1000 : 0;
+            const segundos = regressivo ? Math.max(0, base - decorrido) : base + decorrido;
+            const total = Math.floor(segundos);
+            const h = Math.floor(total / 3600), m = Math.floor((total % 3600) / 60), s = total % 60;
+            relogio.textContent = regressivo ? `${{doisDigitos(m + 60 * h)}}:${{doisDigitos(s)}}` : `${{doisDigitos(h)}}:${{doisDigitos(m)}}:${{doisDigitos(s)}}`;
+            if (regressivo) relogio.style.color = total < 11 ? "#FF4B4B" : "inherit";
+        }}
+        atualizar();
+        if (correndo) setInterval(atualizar, 250);
+    </script>
+    """
+    components.html(html, height=altura)
 
-            if st.session_state.timer_started and st.session_state.start_time:
-                accumulated_seconds = st.session_state.elapsed_minutes * 60
-                current_elapsed = datetime.now() - st.session_state.start_time
-                total_seconds = accumulated_seconds + current_elapsed.total_seconds()
-                hours, remainder = divmod(int(total_seconds), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                time_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-            else:
-                total_seconds = st.session_state.elapsed_minutes * 60
-                hours, remainder = divmod(int(total_seconds), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                time_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-            
-            st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Tempo Total</p>", unsafe_allow_html=True)
-            st.markdown(f"<p style='font-size: 2.5rem; font-weight: bold; margin-top: -10px;'>{time_str}</p>", unsafe_allow_html=True)
-            
-            btn_c1, btn_c2, btn_c3 = st.columns(3)
-            if btn_c1.button("▶️ Iniciar", width='stretch', disabled=st.session_state.timer_started):
-                st.session_state.timer_started = True
-                st.session_state.start_time = datetime.now()
-                st.session_state.last_check_time = time.time()
-                st.rerun()
-            if btn_c2.button("⏸️ Parar", width='stretch', disabled=not st.session_state.timer_started):
-                if st.session_state.start_time:
-                    elapsed_time = datetime.now() - st.session_state.start_time
-                    st.session_state.elapsed_minutes += elapsed_time.total_seconds() / 60
-                    st.session_state.start_time = None
-                st.session_state.timer_started = False
-                st.session_state.last_check_time = None
-                st.rerun()
-            if btn_c3.button("🔄 Zerar", width='stretch'):
-                st.session_state.timer_started = False
-                st.session_state.start_time = None
-                st.session_state.elapsed_minutes = 0.0
-                st.session_state.total_rest_seconds = 0
-                st.session_state.current_rest_duration = 0
-                st.session_state.last_check_time = None
-                st.session_state.set_durations = {}
-                st.session_state.checkbox_states = {}
-                # Limpa também os widgets de treino ao zerar
-                keys_to_delete = [k for k in st.session_state if k.startswith(('done_', 'kg_', 'reps_', 'min_'))]
-                for key in keys_to_delete:
-                    del st.session_state[key]
-                st.rerun()
+@st.fragment
+def _render_sessao_treino(username: str, user_data: Dict[str, Any], catalogo, indice_desempenho: dict):
+    """
+    Cartões dos exercícios da sessão, resumo e botão de salvar. É um fragmento:
+    marcar séries, editar kg/reps e reorganizar exercícios reexecutam apenas
+    este painel. Salvar o treino grava os arquivos e reexecuta o app inteiro.
+    """
+    if 'todays_workout_df' in st.session_state and not st.session_state.todays_workout_df.empty:
+        exercicios_df = st.session_state.todays_workout_df.copy()
         
-        # Coluna 2: Selectbox do Plano
-        with col2:
-            st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Plano de Treino</p>", unsafe_allow_html=True)
-            selected_plan_name = st.selectbox(
-                "Plano de Treino Selecionado", 
-                options=all_plans, 
-                index=default_index, 
-                key="sb_plano_selecionado",
-                label_visibility="collapsed"
-            )
+        for index, exercicio in exercicios_df.iterrows():
+            with st.container(border=True):
+                main_col, controls_col = st.columns([0.9, 0.1])
+                with main_col:
+                    with st.popover(f"##### {exercicio['nome_exercicio']}"):
+                        exercise_details = catalogo.detalhes(exercicio['nome_exercicio'])
+                        image_paths = catalogo.imagens(exercicio['nome_exercicio'], largura=300)
 
-        # Coluna 3: Timer de Descanso
-        with col3:
-            if 'rest_timer_running' not in st.session_state: st.session_state.rest_timer_running = False
-            if 'rest_end_time' not in st.session_state: st.session_state.rest_end_time = None
-            if 'total_rest_seconds' not in st.session_state: st.session_state.total_rest_seconds = 0
-            if 'current_rest_duration' not in st.session_state: st.session_state.current_rest_duration = 0
-
-            rest_controls_col, rest_display_col = st.columns(2)
-            with rest_controls_col:
-                st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Timer de Descanso</p>", unsafe_allow_html=True)
-                default_rest_time = st.number_input("Segundos", min_value=10, max_value=300, value=60, step=5, label_visibility="collapsed")
-                if st.button("Iniciar Descanso", width='stretch', disabled=st.session_state.rest_timer_running):
-                    st.session_state.rest_timer_running = True
-                    st.session_state.rest_end_time = time.time() + default_rest_time
-                    st.session_state.current_rest_duration = default_rest_time
-                    st.rerun()
-            with rest_display_col:
-                total_rest_min, total_rest_sec = divmod(st.session_state.total_rest_seconds, 60)
-                total_rest_str = f"{total_rest_min:02d}:{total_rest_sec:02d}"
-                if st.session_state.rest_timer_running and st.session_state.rest_end_time:
-                    remaining_time = st.session_state.rest_end_time - time.time()
-                    if remaining_time > 0:
-                        minutes, seconds = divmod(int(remaining_time), 60)
-                        time_str_rest = f"{minutes:02}:{seconds:02}"
-                        color = "#FF4B4B" if remaining_time < 11 else "inherit"
-                        st.markdown(f"""
-                        <div style='display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100%;'>
-                            <p style='font-size: 3.5rem; color: {color}; font-weight: bold;'>{time_str_rest}</p>
-                            <p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7); margin-bottom: 10px;'>Descanso total: {total_rest_str}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.session_state.total_rest_seconds += st.session_state.current_rest_duration
-                        st.session_state.current_rest_duration = 0
-                        st.session_state.rest_timer_running = False
-                        st.rerun()
-                else:
-                    st.markdown(f"""
-                    <div style='display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100%;'>
-                        <p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Aguardando início</p>
-                        <p style='font-family: monospace; font-size: 2rem; margin-top: -10px; margin-bottom: 5px;'>-- : --</p>
-                        <p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Descanso total: {total_rest_str}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-    selection_changed = st.session_state.current_plan_name != selected_plan_name
-    
-    workout_in_progress = any(st.session_state.get(key, False) for key in st.session_state if key.startswith('done_'))
-            
-    if selection_changed and workout_in_progress:
-        st.warning("Você tem um treino em andamento. Trocar de plano irá descartar os dados não salvos. Deseja continuar?")
-        col1, col2, _ = st.columns([1,1,2])
-        if col1.button("Sim, descartar e trocar", key="confirm_discard"):
-            st.session_state.current_plan_name = selected_plan_name
-            for key in ['todays_workout_df', 'workout_sets', 'set_durations', 'checkbox_states']:
-                if key in st.session_state:
-                    del st.session_state[key]
-            st.rerun()
-        if col2.button("Não, continuar treino", key="cancel_discard"):
-            st.session_state.revert_plan_selection = True
-            st.rerun()
-
-    elif 'todays_workout_df' not in st.session_state or selection_changed:
-        df_to_load = pd.DataFrame()
-        if selected_plan_name != "Nenhum (Avulso)":
-            df_planos = user_data.get("df_planos_treino", pd.DataFrame())
-            df_exercicios = user_data.get("df_exercicios", pd.DataFrame())
-            
-            if not df_planos.empty and not df_exercicios.empty:
-                plano_info = df_planos[df_planos['nome_plano'] == selected_plan_name]
-                if not plano_info.empty:
-                    id_plano = plano_info['id_plano'].iloc[0]
-                    exercicios_do_plano = df_exercicios[df_exercicios['id_plano'] == id_plano].copy()
-                    if 'ordem' in exercicios_do_plano.columns:
-                        exercicios_do_plano = exercicios_do_plano.sort_values('ordem').reset_index(drop=True)
-                    df_to_load = exercicios_do_plano
-
-        st.session_state.todays_workout_df = df_to_load
-        st.session_state.current_plan_name = selected_plan_name
-        st.session_state.workout_sets = {idx: int(row.get('series_planejadas', 1)) for idx, row in df_to_load.iterrows()} if not df_to_load.empty else {}
-        st.session_state.adding_exercise = False
-        st.session_state.set_durations = {}
-        st.session_state.checkbox_states = {}
-
-        # --- CORREÇÃO DO BUG ---
-        # Limpeza completa do estado de widgets de treino anteriores para evitar "fantasmas"
-        keys_to_delete = [k for k in st.session_state if k.startswith(('done_', 'kg_', 'reps_', 'min_'))]
-        for key in keys_to_delete:
-            del st.session_state[key]
-        
-        st.rerun()
-
-    if 'last_check_time' not in st.session_state: st.session_state.last_check_time = None
-    with st.sidebar:
-        if st.session_state.timer_started or st.session_state.rest_timer_running:
-            st_autorefresh(interval=1000, key="global_timer_refresher")
-
-    if 'todays_workout_df' in st.session_state and not st.session_state.todays_workout_df.empty:
-        exercicios_df = st.session_state.todays_workout_df.copy()
-        
-        for index, exercicio in exercicios_df.iterrows():
-            with st.container(border=True):
-                main_col, controls_col = st.columns([0.9, 0.1])
-                with main_col:
-                    with st.popover(f"##### {exercicio['nome_exercicio']}"):
-                        nome_normalizado = utils.normalizar_texto(exercicio['nome_exercicio'])
-                        exercise_details = exercise_details_map.get(nome_normalizado)
-                        image_paths = exercise_image_map.get(nome_normalizado)
-
-                        if image_paths and len(image_paths) >= 2:
-                            image_path1, image_path2 = image_paths[0], image_paths[1]
-                            if image_path1.exists() and image_path2.exists():
-                                anim_html = utils.get_image_animation_html(image_path1, image_path2, width=300)
-                                st.markdown(anim_html, unsafe_allow_html=True)
-                        elif image_paths and image_paths[0].exists():
-                            st.image(str(image_paths[0]), use_column_width=True)
-                        
-                        if exercise_details:
-                            instructions = exercise_details.get("instructions", [])
-                            if instructions:
-                                with st.expander("Instruções"):
-                                    for inst in instructions: st.markdown(f"- {inst}")
+                        if image_paths and len(image_paths) >= 2:
+                            image_path1, image_path2 = image_paths[0], image_paths[1]
+                            if image_path1.exists() and image_path2.exists():
+                                anim_html = utils.get_image_animation_html(image_path1, image_path2, width=300)
+                                st.markdown(anim_html, unsafe_allow_html=True)
+                        elif image_paths and image_paths[0].exists():
+                            st.image(str(image_paths[0]), use_column_width=True)
+                        
+                        if exercise_details:
+                            instructions = exercise_details.get("instructions", [])
+                            if instructions:
+                                with st.expander("Instruções"):
+                                    for inst in instructions: st.markdown(f"- {inst}")
 
                     tipo_exercicio = exercicio.get('tipo_exercicio', 'Musculação')
-                    previous_perf_data = logic.get_previous_performance(df_log_exercicios, exercicio['nome_exercicio'])
+                    previous_perf_data = _ultimo_desempenho(username, indice_desempenho, exercicio['nome_exercicio'])
                     previous_performance_str = f"{previous_perf_data.get('minutos', 0)} min" if tipo_exercicio == 'Cardio' and previous_perf_data.get('minutos') else f"{previous_perf_data.get('kg', 0)} kg x {previous_perf_data.get('reps', 0)}" if previous_perf_data.get('kg') is not None else "N/A"
                     num_series = st.session_state.workout_sets.get(index, 1)
 
@@ -1798,7 +1674,7 @@ def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
                             if cols[0].button("🗑️", key=f"remove_set_{key_base}", help="Remover série"):
                                 if st.session_state.workout_sets[index] > 1:
                                     st.session_state.workout_sets[index] -= 1
-                                    st.rerun()
+                                    st.rerun(scope="fragment")
                             cols[1].markdown(f"**{i}**")
                             cols[2].markdown(f"`{previous_performance_str}`")
                             cols[3].markdown(f"`{exercicio['repeticoes_planejadas']}`")
@@ -1819,7 +1695,7 @@ def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
                             if cols[0].button("🗑️", key=f"remove_set_{key_base}", help="Remover série"):
                                 if st.session_state.workout_sets[index] > 1:
                                     st.session_state.workout_sets[index] -= 1
-                                    st.rerun()
+                                    st.rerun(scope="fragment")
                             cols[1].markdown(f"**{i}**")
                             cols[2].markdown(f"`{previous_performance_str}`")
                             cols[3].markdown(f"`{exercicio['repeticoes_planejadas']} reps`")
@@ -1841,32 +1717,32 @@ def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
                     
                     if st.button("Adicionar série", key=f"add_set_{index}"):
                         st.session_state.workout_sets[index] += 1
-                        st.rerun()
+                        st.rerun(scope="fragment")
                 
                 with controls_col:
                     if st.button("🗑️", key=f"remove_ex_{index}_main", help="Remover exercício da sessão", width='stretch'):
                         st.session_state.todays_workout_df.drop(index, inplace=True)
                         st.session_state.todays_workout_df.reset_index(drop=True, inplace=True)
                         st.session_state.workout_sets = {idx: int(row.get('series_planejadas', 1)) for idx, row in st.session_state.todays_workout_df.iterrows()}
-                        st.rerun()
+                        st.rerun(scope="fragment")
                     st.write("<div style='height: 60px;'></div>", unsafe_allow_html=True)
                     if st.button("🔼", key=f"up_{index}", help="Mover para cima", width='stretch', disabled=(index == 0)):
                         df = st.session_state.todays_workout_df
                         a, b = df.iloc[index-1].copy(), df.iloc[index].copy()
                         df.iloc[index-1], df.iloc[index] = b, a
                         st.session_state.todays_workout_df = df
-                        st.rerun()
+                        st.rerun(scope="fragment")
                     if st.button("🔽", key=f"down_{index}", help="Mover para baixo", width='stretch', disabled=(index == len(exercicios_df) - 1)):
                         df = st.session_state.todays_workout_df
                         a, b = df.iloc[index+1].copy(), df.iloc[index].copy()
                         df.iloc[index+1], df.iloc[index] = b, a
                         st.session_state.todays_workout_df = df
-                        st.rerun()
+                        st.rerun(scope="fragment")
 
         if st.session_state.get('adding_exercise', False):
             with st.form("new_exercise_form"):
                 st.subheader("Adicionar Novo Exercício")
-                new_ex_name = st.selectbox("Selecione o exercício", options=sorted(exercise_name_list))
+                new_ex_name = st.selectbox("Selecione o exercício", options=catalogo.nomes_ordenados)
                 c1, c2 = st.columns(2)
                 new_ex_sets = c1.number_input("Número de séries", min_value=1, value=3)
                 new_ex_reps = c2.text_input("Meta de Reps/Min", value="8-12 reps")
@@ -1876,14 +1752,14 @@ def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
                     new_index = len(st.session_state.todays_workout_df) - 1
                     st.session_state.workout_sets[new_index] = new_ex_sets
                     st.session_state.adding_exercise = False
-                    st.rerun()
+                    st.rerun(scope="fragment")
             if st.button("Cancelar"):
                 st.session_state.adding_exercise = False
-                st.rerun()
+                st.rerun(scope="fragment")
         else:
             if st.button("Adicionar exercício", width='stretch'):
                 st.session_state.adding_exercise = True
-                st.rerun()
+                st.rerun(scope="fragment")
 
         st.subheader("Resumo da Sessão")
         c1_sum, c2_sum, c3_sum = st.columns(3)
@@ -1924,42 +1800,244 @@ def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
             if not new_log_entries:
                 st.warning("Nenhuma série foi marcada como 'Feito'. O treino não foi salvo.")
             else:
-                utils.adicionar_registro_df(pd.DataFrame(new_log_entries), utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS))
+                path_log_exercicios, df_novas_series = utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS), pd.DataFrame(new_log_entries)
+                assinatura_antes = utils.assinatura_tabela(path_log_exercicios)
+                if not utils.adicionar_registro_df(df_novas_series, path_log_exercicios):
+                    # O erro já foi exibido; o treino em andamento fica na tela para nova tentativa.
+                    return
+                # Atualiza o índice de último desempenho só com as séries novas,
+                # se ele ainda correspondia ao log de antes deste salvamento.
+                assinatura_depois = utils.assinatura_tabela(path_log_exercicios)
+                salvo = st.session_state.get("indice_ultimo_desempenho")
+                if salvo is not None and salvo[:2] == (username, assinatura_antes) and assinatura_depois != assinatura_antes:
+                    logic.atualizar_indice_ultimo_desempenho(salvo[2], df_novas_series)
+                    st.session_state.indice_ultimo_desempenho = (username, assinatura_depois, salvo[2])
                 gasto_est_total = total_calorias_musculacao + total_calorias_cardio
                 novo_treino_simples = pd.DataFrame([{'Data': data_treino.strftime("%d/%m/%Y"), 'Plano Executado': st.session_state.current_plan_name, 'Tipo de Treino': "Misto" if total_calorias_cardio > 0 and total_calorias_musculacao > 0 else ("Cardio" if total_calorias_cardio > 0 else "Musculação"), 'Tempo (min)': duracao_min_total, 'Calorias Gastas': round(gasto_est_total, 2)}])
-                utils.adicionar_registro_df(novo_treino_simples, utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES))
+                path_treinos = utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES)
+                assinatura_antes = utils.assinatura_tabela(path_treinos)
+                if utils.adicionar_registro_df(novo_treino_simples, path_treinos):
+                    _atualizar_estatisticas_treinos(username, assinatura_antes, df_depois=novo_treino_simples)
+                    st.toast("Treino salvo com sucesso!", icon="💪")
+                else:
+                    # As séries já estão no log: o treino não é mantido na tela para
+                    # não duplicá-las numa nova tentativa; falta só o resumo.
+                    st.toast("As séries foram salvas, mas o resumo do treino (tempo e calorias) não. Registre-o como treino avulso.", icon="⚠️")
                 
                 for key in ['todays_workout_df', 'current_plan_name', 'workout_sets', 'adding_exercise', 'timer_started', 'start_time', 'elapsed_minutes', 'rest_timer_running', 'rest_end_time', 'current_rest_duration', 'last_check_time', 'set_durations', 'checkbox_states']:
                     if key in st.session_state: del st.session_state[key]
-                st.toast("Treino salvo com sucesso!", icon="💪")
                 st.rerun()
     else:
         st.info("Nenhum treino selecionado para hoje. Escolha um plano no menu acima ou adicione um exercício avulso.")
 
+def render_registro_sub_tab(username: str, user_data: Dict[str, Any]):
+    """
+    Renderiza a sub-aba para registrar treinos, com um painel de controle
+    customizado para corresponder fielmente ao layout do usuário.
+    """
+    if st.session_state.get("revert_plan_selection", False):
+        st.session_state.sb_plano_selecionado = st.session_state.current_plan_name
+        st.session_state.revert_plan_selection = False
+
+    # --- LÓGICA DE DADOS E TIMERS (INICIALIZAÇÃO) ---
+    scheduled_workout = logic.get_workout_for_day(user_data, date.today(), _get_calendario_periodizacao(username, user_data))
+    indice_desempenho = _get_indice_ultimo_desempenho(username)
+
+    # --- Carrega o banco de dados de exercícios ---
+    path_exercicios_db = config.ASSETS_DIR / "exercises" / "exercicios.json"
+    catalogo = utils.carregar_catalogo_exercicios(path_exercicios_db)
+
+    # --- GERENCIAMENTO DE ESTADO E SELEÇÃO DE PLANO ---
+    df_planos_treino = user_data.get("df_planos_treino", pd.DataFrame(columns=['nome_plano']))
+    all_plans = ["Nenhum (Avulso)"] + df_planos_treino['nome_plano'].unique().tolist()
+    
+    if 'current_plan_name' not in st.session_state:
+        st.session_state.current_plan_name = scheduled_workout['nome_plano'] if scheduled_workout else "Nenhum (Avulso)"
+    
+    try:
+        default_index = all_plans.index(st.session_state.current_plan_name)
+    except ValueError:
+        default_index = 0
+    
+    # --- PAINEL DE CONTROLE DO TREINO (COM SELECTBOX) ---
+    with st.container(border=True):
+        col1, col2, col3 = st.columns([2.5, 3, 3])
+        # Coluna 1: Timer
+        with col1:
+            if 'timer_started' not in st.session_state: st.session_state.timer_started = False
+            if 'start_time' not in st.session_state: st.session_state.start_time = None
+            if 'elapsed_minutes' not in st.session_state: st.session_state.elapsed_minutes = 0.0
+
+            timer_rodando = bool(st.session_state.timer_started and st.session_state.start_time)
+            segundos_timer = st.session_state.elapsed_minutes * 60
+            if timer_rodando:
+                segundos_timer += (datetime.now() - st.session_state.start_time).total_seconds()
+
+            st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Tempo Total</p>", unsafe_allow_html=True)
+            # O relógio avança no navegador; o servidor só é chamado pelos botões.
+            _relogio_no_navegador(segundos_timer, correndo=timer_rodando, estilo="font-size: 2.5rem;", altura=60)
+            
+            btn_c1, btn_c2, btn_c3 = st.columns(3)
+            if btn_c1.button("▶️ Iniciar", width='stretch', disabled=st.session_state.timer_started):
+                st.session_state.timer_started = True
+                st.session_state.start_time = datetime.now()
+                st.session_state.last_check_time = time.time()
+                st.rerun()
+            if btn_c2.button("⏸️ Parar", width='stretch', disabled=not st.session_state.timer_started):
+                if st.session_state.start_time:
+                    elapsed_time = datetime.now() - st.session_state.start_time
+                    st.session_state.elapsed_minutes += elapsed_time.total_seconds() / 60
+                    st.session_state.start_time = None
+                st.session_state.timer_started = False
+                st.session_state.last_check_time = None
+                st.rerun()
+            if btn_c3.button("🔄 Zerar", width='stretch'):
+                st.session_state.timer_started = False
+                st.session_state.start_time = None
+                st.session_state.elapsed_minutes = 0.0
+                st.session_state.total_rest_seconds = 0
+                st.session_state.current_rest_duration = 0
+                st.session_state.last_check_time = None
+                st.session_state.set_durations = {}
+                st.session_state.checkbox_states = {}
+                # Limpa também os widgets de treino ao zerar
+                keys_to_delete = [k for k in st.session_state if k.startswith(('done_', 'kg_', 'reps_', 'min_'))]
+                for key in keys_to_delete:
+                    del st.session_state[key]
+                st.rerun()
+        
+        # Coluna 2: Selectbox do Plano
+        with col2:
+            st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Plano de Treino</p>", unsafe_allow_html=True)
+            selected_plan_name = st.selectbox(
+                "Plano de Treino Selecionado", 
+                options=all_plans, 
+                index=default_index, 
+                key="sb_plano_selecionado",
+                label_visibility="collapsed"
+            )
+
+        # Coluna 3: Timer de Descanso
+        with col3:
+            if 'rest_timer_running' not in st.session_state: st.session_state.rest_timer_running = False
+            if 'rest_end_time' not in st.session_state: st.session_state.rest_end_time = None
+            if 'total_rest_seconds' not in st.session_state: st.session_state.total_rest_seconds = 0
+            if 'current_rest_duration' not in st.session_state: st.session_state.current_rest_duration = 0
+
+            rest_controls_col, rest_display_col = st.columns(2)
+            with rest_controls_col:
+                st.markdown("<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Timer de Descanso</p>", unsafe_allow_html=True)
+                default_rest_time = st.number_input("Segundos", min_value=10, max_value=300, value=60, step=5, label_visibility="collapsed")
+                if st.button("Iniciar Descanso", width='stretch', disabled=st.session_state.rest_timer_running):
+                    st.session_state.rest_timer_running = True
+                    st.session_state.rest_end_time = time.time() + default_rest_time
+                    st.session_state.current_rest_duration = default_rest_time
+                    st.rerun()
+            with rest_display_col:
+                total_rest_min, total_rest_sec = divmod(st.session_state.total_rest_seconds, 60)
+                total_rest_str = f"{total_rest_min:02d}:{total_rest_sec:02d}"
+                if st.session_state.rest_timer_running and st.session_state.rest_end_time:
+                    remaining_time = st.session_state.rest_end_time - time.time()
+                    if remaining_time > 0:
+                        _relogio_no_navegador(
+                            remaining_time, correndo=True, regressivo=True, estilo="font-size: 3.5rem;", altura=110,
+                            rodape=f"<p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Descanso total: {total_rest_str}</p>",
+                        )
+                        # Um único rerun, no fim do descanso, para contabilizá-lo.
+                        st_autorefresh(
+                            interval=int(remaining_time * 1000) + 250, limit=1,
+                            key=f"fim_descanso_{int(st.session_state.rest_end_time * 1000)}"
+                        )
+                    else:
+                        st.session_state.total_rest_seconds += st.session_state.current_rest_duration
+                        st.session_state.current_rest_duration = 0
+                        st.session_state.rest_timer_running = False
+                        st.rerun()
+                else:
+                    st.markdown(f"""
+                    <div style='display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100%;'>
+                        <p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Aguardando início</p>
+                        <p style='font-family: monospace; font-size: 2rem; margin-top: -10px; margin-bottom: 5px;'>-- : --</p>
+                        <p style='font-size: 0.9rem; color: rgba(250, 250, 250, 0.7);'>Descanso total: {total_rest_str}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+    selection_changed = st.session_state.current_plan_name != selected_plan_name
+    
+    workout_in_progress = any(st.session_state.get(key, False) for key in st.session_state if key.startswith('done_'))
+            
+    if selection_changed and workout_in_progress:
+        st.warning("Você tem um treino em andamento. Trocar de plano irá descartar os dados não salvos. Deseja continuar?")
+        col1, col2, _ = st.columns([1,1,2])
+        if col1.button("Sim, descartar e trocar", key="confirm_discard"):
+            st.session_state.current_plan_name = selected_plan_name
+            for key in ['todays_workout_df', 'workout_sets', 'set_durations', 'checkbox_states']:
+                if key in st.session_state:
+                    del st.session_state[key]
+            st.rerun()
+        if col2.button("Não, continuar treino", key="cancel_discard"):
+            st.session_state.revert_plan_selection = True
+            st.rerun()
+
+    elif 'todays_workout_df' not in st.session_state or selection_changed:
+        df_to_load = pd.DataFrame()
+        if selected_plan_name != "Nenhum (Avulso)":
+            df_planos = user_data.get("df_planos_treino", pd.DataFrame())
+            df_exercicios = user_data.get("df_exercicios", pd.DataFrame())
+            
+            if not df_planos.empty and not df_exercicios.empty:
+                plano_info = df_planos[df_planos['nome_plano'] == selected_plan_name]
+                if not plano_info.empty:
+                    id_plano = plano_info['id_plano'].iloc[0]
+                    exercicios_do_plano = df_exercicios[df_exercicios['id_plano'] == id_plano].copy()
+                    if 'ordem' in exercicios_do_plano.columns:
+                        exercicios_do_plano = exercicios_do_plano.sort_values('ordem').reset_index(drop=True)
+                    df_to_load = exercicios_do_plano
+
+        st.session_state.todays_workout_df = df_to_load
+        st.session_state.current_plan_name = selected_plan_name
+        st.session_state.workout_sets = {idx: int(row.get('series_planejadas', 1)) for idx, row in df_to_load.iterrows()} if not df_to_load.empty else {}
+        st.session_state.adding_exercise = False
+        st.session_state.set_durations = {}
+        st.session_state.checkbox_states = {}
+
+        # --- CORREÇÃO DO BUG ---
+        # Limpeza completa do estado de widgets de treino anteriores para evitar "fantasmas"
+        keys_to_delete = [k for k in st.session_state if k.startswith(('done_', 'kg_', 'reps_', 'min_'))]
+        for key in keys_to_delete:
+            del st.session_state[key]
+        
+        st.rerun()
+
+    if 'last_check_time' not in st.session_state: st.session_state.last_check_time = None
+
+    _render_sessao_treino(username, user_data, catalogo, indice_desempenho)
+
     with st.expander('Registro Avulso', expanded=(not ('todays_workout_df' in st.session_state and not st.session_state.todays_workout_df.empty))):
         render_registro_avulso_form(username, user_data)
     
     with st.expander("Histórico de Treinos Realizados"):
         dft_simples = user_data.get("df_log_treinos", pd.DataFrame())
         if not dft_simples.empty:           
-            dft_simples_sorted = dft_simples.copy()
-            dft_simples_sorted[config.COL_DATA] = pd.to_datetime(dft_simples_sorted[config.COL_DATA], format="%d/%m/%Y")
-            dft_simples_sorted = dft_simples_sorted.sort_values(by=config.COL_DATA, ascending=False).reset_index(drop=True)
-            dft_editado = st.data_editor(dft_simples_sorted, num_rows="dynamic", width='stretch', key="editor_treinos_realizados", hide_index=True, column_config={"Calorias Gastas": st.column_config.NumberColumn("Calorias Gastas (kcal)", format="%.0f")})
+            dft_simples_sorted = dft_simples.sort_values(by=config.COL_DATA, ascending=False).reset_index(drop=True)
+            dft_editado = st.data_editor(dft_simples_sorted, num_rows="dynamic", width='stretch', key="editor_treinos_realizados", hide_index=True, column_config={config.COL_DATA: st.column_config.DateColumn("Data", format="DD/MM/YYYY"), "Calorias Gastas": st.column_config.NumberColumn("Calorias Gastas (kcal)", format="%.0f")})
             
             if st.button("💾 Salvar Alterações no Histórico", key="salvar_historico_treino"):
-                original_dates = set(pd.to_datetime(dft_simples[config.COL_DATA], format="%d/%m/%Y").dt.strftime('%d/%m/%Y'))
-                edited_dates = set(pd.to_datetime(dft_editado[config.COL_DATA]).dt.strftime('%d/%m/%Y'))
+                original_dates = set(dft_simples[config.COL_DATA].dropna())
+                edited_dates = set(pd.to_datetime(dft_editado[config.COL_DATA]).dropna())
                 deleted_dates = original_dates - edited_dates
                 if deleted_dates:
-                    path_log_exercicios, df_log_exercicios_completo = utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS), utils.carregar_df(path_log_exercicios)
+                    path_log_exercicios = utils.get_user_data_path(username, config.FILE_LOG_EXERCICIOS)
+                    df_log_exercicios_completo = utils.carregar_df(path_log_exercicios)
                     if not df_log_exercicios_completo.empty and 'Data' in df_log_exercicios_completo.columns:
                         df_log_exercicios_filtrado = df_log_exercicios_completo[~df_log_exercicios_completo['Data'].isin(deleted_dates)]
                         utils.salvar_df(df_log_exercicios_filtrado, path_log_exercicios)
-                dft_editado[config.COL_DATA] = pd.to_datetime(dft_editado[config.COL_DATA]).dt.strftime('%d/%m/%Y')
-                utils.salvar_df(dft_editado, utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES))
-                st.toast("Histórico de treinos atualizado!", icon="💾")
-                st.rerun()
+                path_treinos = utils.get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES)
+                assinatura_antes = utils.assinatura_tabela(path_treinos)
+                if utils.salvar_df(dft_editado, path_treinos):
+                    _atualizar_estatisticas_treinos(username, assinatura_antes, df_antes=dft_simples, df_depois=dft_editado)
+                    st.toast("Histórico de treinos atualizado!", icon="💾")
+                    st.rerun()
 
 def render_registro_avulso_form(username: str, user_data: Dict[str, Any]):
     """Renderiza o formulário simples para registrar um treino avulso."""
@@ -2005,9 +2083,11 @@ def render_registro_avulso_form(username: str, user_data: Dict[str, Any]):
             "Tempo (min)": duracao_min,
             "Calorias Gastas": round(gasto_est, 2)
         }])
-        utils.adicionar_registro_df(novo_treino, path_treinos)
-        st.toast("Treino avulso adicionado com sucesso!", icon="💪")
-        st.rerun()
+        assinatura_antes = utils.assinatura_tabela(path_treinos)
+        if utils.adicionar_registro_df(novo_treino, path_treinos):
+            _atualizar_estatisticas_treinos(username, assinatura_antes, df_depois=novo_treino)
+            st.toast("Treino avulso adicionado com sucesso!", icon="💪")
+            st.rerun()
 
 def render_gerenciar_exercicios_sub_tab():
     """
@@ -2015,7 +2095,7 @@ def render_gerenciar_exercicios_sub_tab():
     """
     st.subheader("Biblioteca de Exercícios")
     path_exercicios_db = config.ASSETS_DIR / "exercises" / "exercicios.json"
-    exercisedb_list = utils.carregar_banco_exercicios(path_exercicios_db)
+    catalogo = utils.carregar_catalogo_exercicios(path_exercicios_db)
 
     # --- Dicionários para Tradução (UI -> JSON) ---
     nivel_map = {"Iniciante": "beginner", "Intermediário": "intermediate", "Avançado": "expert"}
@@ -2043,15 +2123,7 @@ def render_gerenciar_exercicios_sub_tab():
             mecanica_pt = c6.selectbox("Mecânica", options=list(mecanica_map.keys()))
 
             st.markdown("##### Músculos")
-            if exercisedb_list:
-                all_muscles = set()
-                for ex in exercisedb_list:
-                    if isinstance(ex, dict):
-                        for muscle in ex.get("primaryMuscles", []): all_muscles.add(muscle)
-                        for muscle in ex.get("secondaryMuscles", []): all_muscles.add(muscle)
-                muscle_options = sorted(list(all_muscles))
-            else:
-                muscle_options = []
+            muscle_options = sorted(catalogo.musculos)
 
             m_c1, m_c2 = st.columns(2)
             musculos_primarios = m_c1.multiselect("Músculos Primários", options=muscle_options)
@@ -2075,9 +2147,7 @@ def render_gerenciar_exercicios_sub_tab():
                 else:
                     # --- NOVA LÓGICA DE ID ---
                     new_id_str = utils.sanitizar_nome_para_id(nome_exercicio)
-                    existing_ids = {ex.get('id', '') for ex in exercisedb_list}
-
-                    if new_id_str in existing_ids:
+                    if new_id_str in catalogo.ids:
                         st.error(f"Erro: Um exercício com o ID '{new_id_str}' (derivado do nome) já existe. Por favor, escolha um nome ligeiramente diferente.")
                     else:
                         # --- NOVA LÓGICA DE ARMAZENAMENTO DE IMAGENS ---
@@ -2106,7 +2176,7 @@ def render_gerenciar_exercicios_sub_tab():
                             "images": saved_image_paths # Caminhos relativos
                         }
                         
-                        exercisedb_list.append(novo_exercicio_dict)
+                        exercisedb_list = catalogo.registros() + [novo_exercicio_dict]
                         utils.salvar_banco_exercicios(exercisedb_list, path_exercicios_db)
                         
                         utils.carregar_banco_exercicios.clear()
@@ -2114,9 +2184,8 @@ def render_gerenciar_exercicios_sub_tab():
                         st.rerun()
 
     st.subheader("Tabela Completa de Exercícios")
-    if exercisedb_list:
-        df_exercicios_db = pd.DataFrame(exercisedb_list)
-        df_display = df_exercicios_db.copy()
+    if len(catalogo):
+        df_display = catalogo.como_dataframe()
 
         # Traduzir colunas para exibição de forma robusta, mantendo o valor original se a tradução falhar
         df_display['level'] = df_display['level'].apply(lambda x: nivel_map_rev.get(x, x))
@@ -2170,6 +2239,62 @@ def render_gerenciar_exercicios_sub_tab():
     else:
         st.info("Nenhum exercício na base de dados. Adicione o primeiro no formulário acima.")
 
+@st.fragment
+def _render_editor_evolucao(dfe_final: pd.DataFrame, path_evolucao: Path, username: str):
+    """
+    Editor do histórico de medições. Como fragmento, as edições na tabela não
+    reconstroem os gráficos da aba; só o salvamento reexecuta o app.
+    """
+    if not dfe_final.empty:
+        # CORREÇÃO 2: Adicionado .reset_index(drop=True) para remover a coluna de índice.
+        df_display = dfe_final.sort_values("semana", ascending=False).reset_index(drop=True)
+        dfe_editado = st.data_editor(
+            df_display,
+            num_rows="dynamic",
+            width='stretch',
+            hide_index=True,
+            key="editor_evolucao",
+            column_config={
+                "semana": st.column_config.NumberColumn("Semana", format="%d"),
+                "data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                "peso": st.column_config.NumberColumn("Peso (kg)", format="%.1f"),
+                "var": st.column_config.NumberColumn("Variação (kg)", format="%.1f"),
+                "gordura_corporal": st.column_config.NumberColumn("Gordura Corporal (%)", format="%.1f"),
+                "gordura_visceral": st.column_config.NumberColumn("Gordura Visceral (%)", format="%.1f"),
+                "musculos_esqueleticos": st.column_config.NumberColumn("Massa Muscular (%)", format="%.1f"),
+                "cintura": st.column_config.NumberColumn("Cintura (cm)", format="%.1f"),
+                "peito": st.column_config.NumberColumn("Peito (cm)", format="%.1f"),
+                "braco": st.column_config.NumberColumn("Braço (cm)", format="%.1f"),
+                "coxa": st.column_config.NumberColumn("Coxa (cm)", format="%.1f"),
+            }
+        )
+        if st.button("💾 Salvar Alterações no Histórico", key="salvar_historico_evolucao"):
+            df_para_salvar = dfe_editado.sort_values("semana", ascending=True)
+            utils.salvar_df(df_para_salvar, path_evolucao)
+
+            path_pessoais = utils.get_user_data_path(username, config.FILE_DADOS_PESSOAIS)
+            dfp = utils.carregar_df(path_pessoais)
+
+            if not dfp.empty and not df_para_salvar.empty:
+                ultima_medida = df_para_salvar.iloc[-1]
+
+                if pd.notna(ultima_medida.get(config.COL_PESO)) and float(ultima_medida.get(config.COL_PESO)) > 0:
+                    dfp.loc[0, config.COL_PESO] = float(ultima_medida.get(config.COL_PESO))
+                if pd.notna(ultima_medida.get('gordura_corporal')) and float(ultima_medida.get('gordura_corporal')) > 0:
+                    dfp.loc[0, 'gordura_corporal'] = float(ultima_medida.get('gordura_corporal'))
+                if pd.notna(ultima_medida.get('gordura_visceral')) and float(ultima_medida.get('gordura_visceral')) > 0:
+                    dfp.loc[0, 'gordura_visceral'] = float(ultima_medida.get('gordura_visceral'))
+                if pd.notna(ultima_medida.get('musculos_esqueleticos')) and float(ultima_medida.get('musculos_esqueleticos')) > 0:
+                    dfp.loc[0, 'massa_muscular'] = float(ultima_medida.get('musculos_esqueleticos'))
+
+                utils.salvar_df(dfp, path_pessoais)
+
+            st.toast("Histórico de evolução atualizado!", icon="✅")
+            _get_cached_evolution_charts.clear()
+            st.rerun()
+    else:
+        st.info("Adicione sua primeira medida para começar a ver o histórico.")
+
 def render_evolucao_tab(user_data: Dict[str, Any]):
     """
     Renderiza a aba de Evolução, agora com os gráficos de composição corporal e IMC.
@@ -2201,7 +2326,7 @@ def render_evolucao_tab(user_data: Dict[str, Any]):
             coxa = c9.number_input("Coxa (cm)", 0.0, step=0.1)
 
             if st.form_submit_button("Adicionar medida"):
-                var = float(peso_in - dfe_final[config.COL_PESO].iloc[-1]) if not dfe_final.empty else 0.0
+                var = round(float(peso_in - dfe_final[config.COL_PESO].iloc[-1]), 2) if not dfe_final.empty else 0.0
                 nova_medida = pd.DataFrame([{
                     "semana": len(dfe_final) + 1,
                     "data": data_med.strftime("%d/%m/%Y"),
@@ -2215,76 +2340,27 @@ def render_evolucao_tab(user_data: Dict[str, Any]):
                     "braco": braco,
                     "coxa": coxa
                 }])
-                utils.adicionar_registro_df(nova_medida, path_evolucao)
-
-                path_pessoais = utils.get_user_data_path(username, config.FILE_DADOS_PESSOAIS)
-                dfp = utils.carregar_df(path_pessoais)
-                if not dfp.empty:
-                    if float(peso_in) > 0:
-                        dfp.loc[0, config.COL_PESO] = float(peso_in)
-                    if float(gord_corp) > 0:
-                        dfp.loc[0, 'gordura_corporal'] = float(gord_corp)
-                    if float(gord_visc) > 0:
-                        dfp.loc[0, 'gordura_visceral'] = float(gord_visc)
-                    if float(musc_esq) > 0:
-                        dfp.loc[0, 'massa_muscular'] = float(musc_esq)
-                    utils.salvar_df(dfp, path_pessoais)
-
-                st.toast("Medida adicionada com sucesso!", icon="📏")
-                _get_cached_evolution_charts.clear()
-                st.rerun()
+                if utils.adicionar_registro_df(nova_medida, path_evolucao):
+                    path_pessoais = utils.get_user_data_path(username, config.FILE_DADOS_PESSOAIS)
+                    dfp = utils.carregar_df(path_pessoais)
+                    if not dfp.empty:
+                        if float(peso_in) > 0:
+                            dfp.loc[0, config.COL_PESO] = float(peso_in)
+                        if float(gord_corp) > 0:
+                            dfp.loc[0, 'gordura_corporal'] = float(gord_corp)
+                        if float(gord_visc) > 0:
+                            dfp.loc[0, 'gordura_visceral'] = float(gord_visc)
+                        if float(musc_esq) > 0:
+                            dfp.loc[0, 'massa_muscular'] = float(musc_esq)
+                        utils.salvar_df(dfp, path_pessoais)
+
+                    st.toast("Medida adicionada com sucesso!", icon="📏")
+                    _get_cached_evolution_charts.clear()
+                    st.rerun()
 
     # CORREÇÃO 1: Movido o "Histórico de medições" para o topo da aba para melhor usabilidade.
     with st.expander("Histórico de medições", expanded=False):
-        if not dfe_final.empty:
-            # CORREÇÃO 2: Adicionado .reset_index(drop=True) para remover a coluna de índice.
-            df_display = dfe_final.sort_values("semana", ascending=False).reset_index(drop=True)
-            dfe_editado = st.data_editor(
-                df_display,
-                num_rows="dynamic",
-                width='stretch',
-                hide_index=True,
-                key="editor_evolucao",
-                column_config={
-                    "semana": st.column_config.NumberColumn("Semana", format="%d"),
-                    "data": st.column_config.TextColumn("Data"),
-                    "peso": st.column_config.NumberColumn("Peso (kg)", format="%.1f"),
-                    "var": st.column_config.NumberColumn("Variação (kg)", format="%.1f"),
-                    "gordura_corporal": st.column_config.NumberColumn("Gordura Corporal (%)", format="%.1f"),
-                    "gordura_visceral": st.column_config.NumberColumn("Gordura Visceral (%)", format="%.1f"),
-                    "musculos_esqueleticos": st.column_config.NumberColumn("Massa Muscular (%)", format="%.1f"),
-                    "cintura": st.column_config.NumberColumn("Cintura (cm)", format="%.1f"),
-                    "peito": st.column_config.NumberColumn("Peito (cm)", format="%.1f"),
-                    "braco": st.column_config.NumberColumn("Braço (cm)", format="%.1f"),
-                    "coxa": st.column_config.NumberColumn("Coxa (cm)", format="%.1f"),
-                }
-            )
-            if st.button("💾 Salvar Alterações no Histórico", key="salvar_historico_evolucao"):
-                df_para_salvar = dfe_editado.sort_values("semana", ascending=True)
-                utils.salvar_df(df_para_salvar, path_evolucao)
-
-                path_pessoais = utils.get_user_data_path(username, config.FILE_DADOS_PESSOAIS)
-                dfp = utils.carregar_df(path_pessoais)
-
-                if not dfp.empty and not df_para_salvar.empty:
-                    ultima_medida = df_para_salvar.iloc[-1]
-                    
-                    if pd.notna(ultima_medida.get(config.COL_PESO)) and float(ultima_medida.get(config.COL_PESO)) > 0:
-                        dfp.loc[0, config.COL_PESO] = float(ultima_medida.get(config.COL_PESO))
-                    if pd.notna(ultima_medida.get('gordura_corporal')) and float(ultima_medida.get('gordura_corporal')) > 0:
-                        dfp.loc[0, 'gordura_corporal'] = float(ultima_medida.get('gordura_corporal'))
-                    if pd.notna(ultima_medida.get('gordura_visceral')) and float(ultima_medida.get('gordura_visceral')) > 0:
-                        dfp.loc[0, 'gordura_visceral'] = float(ultima_medida.get('gordura_visceral'))
-                    if pd.notna(ultima_medida.get('musculos_esqueleticos')) and float(ultima_medida.get('musculos_esqueleticos')) > 0:
-                        dfp.loc[0, 'massa_muscular'] = float(ultima_medida.get('musculos_esqueleticos'))
-
-                    utils.salvar_df(dfp, path_pessoais)
-
-                st.toast("Histórico de evolução atualizado!", icon="✅")
-                _get_cached_evolution_charts.clear()
-                st.rerun()
-        else:
-            st.info("Adicione sua primeira medida para começar a ver o histórico.")
+        _render_editor_evolucao(dfe_final, path_evolucao, username)
 
 
     dados_atuais = logic.get_latest_metrics(dados_pessoais, dfe_final)
@@ -2347,3 +2423,31 @@ def render_evolucao_tab(user_data: Dict[str, Any]):
     else:
         # Se não houver histórico, a mensagem de "Adicione sua primeira medida" deve aparecer aqui.
         st.info("Adicione sua primeira medida para começar a ver a evolução.")
+
+# ==============================================================================
+# PAINEL DE DIAGNÓSTICO
+# ==============================================================================
+
+def render_painel_diagnostico():
+    """
+    Mostra na barra lateral as métricas dos locks de gravação por pasta de
+    usuário (aquisições, disputas, tempos limite e espera) e do cache de
+    imagens e SVGs codificados (acertos, faltas e ocupação).
+    """
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=False):
+        st.markdown("**Locks de gravação**")
+        metricas_locks = utils.LOCKS_USUARIO.metricas()
+        if metricas_locks:
+            df_locks = pd.DataFrame.from_dict(metricas_locks, orient="index")
+            df_locks.index = [Path(chave).name for chave in df_locks.index]
+            st.dataframe(df_locks.round(3), width="stretch")
+        else:
+            st.caption("Nenhuma gravação com lock neste processo.")
+
+        st.markdown("**Cache de imagens e SVGs**")
+        m = utils.metricas_cache_assets()
+        consultas = m["acertos"] + m["faltas"]
+        c1, c2 = st.columns(2)
+        c1.metric("Acertos", f"{m['acertos']}", f"{m['acertos'] / consultas:.0%}" if consultas else None, delta_color="off")
+        c2.metric("Faltas", f"{m['faltas']}")
+        st.caption(f"{m['itens']} itens • {m['bytes'] / (1024 * 1024):.1f} MB de {config.CACHE_ASSETS_MAX_MB} MB")
@@ -7,15 +7,45 @@
 # do código mais limpo e focado em suas tarefas específicas.
 # ==============================================================================
 
+import hashlib
+import io
+import logging
 import re
+import os
+import threading
+import time
 import unicodedata
+from bisect import bisect_left
+from contextlib import contextmanager
+from collections import OrderedDict
+from collections.abc import Mapping
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+import xml.etree.ElementTree as ET
 import json
+import numpy as np
 import pandas as pd
 import streamlit as st
 import config
+import storage
 import base64
 
+# Pillow vem com o Streamlit; só o comando que gera as imagens reduzidas precisa dele.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Locks de arquivo entre processos: fcntl no Linux/macOS, msvcrt no Windows.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
 def get_user_data_path(username: str, filename: str) -> Path:
     """
     Constrói o caminho completo para um arquivo de dados específico do usuário.
@@ -60,13 +90,369 @@ def normalizar_texto(txt: str) -> str:
     txt = re.sub(r"\s+", " ", txt)
     return txt
 
+class GerenciadorLocks:
+    """
+    Serializa as gravações nos arquivos de um mesmo usuário (a pasta do arquivo).
+    Combina um lock em memória, que ordena as threads das sessões do Streamlit
+    deste processo, com um lock consultivo no arquivo `config.FILE_LOCK` da
+    pasta, que ordena outros processos. O lock é reentrante na mesma thread.
+    Também registra métricas de disputa por pasta (ver `metricas`); os tempos
+    limite esgotados são avisados no log.
+    """
+
+    _INTERVALO_TENTATIVA_S = 0.05
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._estados = {}  # pasta -> {"lock", "profundidade", "arquivo"}
+        self._metricas = {}
+        self._lock_registro = threading.Lock()
+
+    def _estado(self, chave: str) -> dict:
+        with self._lock_registro:
+            if chave not in self._estados:
+                self._estados[chave] = {"lock": threading.RLock(), "profundidade": 0, "arquivo": None}
+                self._metricas[chave] = {
+                    "aquisicoes": 0, "disputas": 0, "timeouts": 0,
+                    "espera_total_s": 0.0, "espera_max_s": 0.0,
+                }
+            return self._estados[chave]
+
+    def _registrar(self, chave: str, espera: float, disputado: bool, timeout: bool = False):
+        with self._lock_registro:
+            m = self._metricas[chave]
+            if timeout:
+                m["timeouts"] += 1
+            else:
+                m["aquisicoes"] += 1
+            m["disputas"] += int(disputado)
+            m["espera_total_s"] += espera
+            m["espera_max_s"] = max(m["espera_max_s"], espera)
+        if timeout:
+            logger.warning("Tempo limite do lock esgotado em %s após %.2f s", chave, espera)
+
+    @staticmethod
+    def _travar_arquivo(arquivo) -> bool:
+        """Tenta obter o lock do arquivo sem bloquear."""
+        try:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _destravar_arquivo(arquivo):
+        try:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            arquivo.close()
+
+    @contextmanager
+    def bloquear(self, path: Path, timeout: float = None):
+        """
+        Mantém o lock da pasta de `path` durante o bloco `with`.
+
+        Raises:
+            TimeoutError: Se o lock não for obtido dentro do tempo limite.
+        """
+        pasta = path.parent
+        chave = str(pasta.resolve())
+        timeout = self.timeout if timeout is None else timeout
+        estado = self._estado(chave)
+        inicio = time.monotonic()
+
+        disputado = not estado["lock"].acquire(blocking=False)
+        if disputado and not estado["lock"].acquire(timeout=timeout):
+            self._registrar(chave, time.monotonic() - inicio, True, timeout=True)
+            raise TimeoutError(f"Os dados em '{pasta.name}' estão sendo gravados por outra sessão. Tente novamente.")
+        try:
+            if estado["profundidade"] == 0:
+                pasta.mkdir(parents=True, exist_ok=True)
+                arquivo = open(pasta / config.FILE_LOCK, "a+b")
+                while not self._travar_arquivo(arquivo):
+                    disputado = True
+                    if time.monotonic() - inicio >= timeout:
+                        arquivo.close()
+                        self._registrar(chave, time.monotonic() - inicio, True, timeout=True)
+                        raise TimeoutError(f"Os dados em '{pasta.name}' estão sendo gravados por outro processo. Tente novamente.")
+                    time.sleep(self._INTERVALO_TENTATIVA_S)
+                estado["arquivo"] = arquivo
+                self._registrar(chave, time.monotonic() - inicio, disputado)
+            estado["profundidade"] += 1
+            try:
+                yield
+            finally:
+                estado["profundidade"] -= 1
+                if estado["profundidade"] == 0:
+                    arquivo, estado["arquivo"] = estado["arquivo"], None
+                    self._destravar_arquivo(arquivo)
+        finally:
+            estado["lock"].release()
+
+    def metricas(self) -> dict:
+        """Retorna uma cópia das métricas de disputa, por pasta."""
+        with self._lock_registro:
+            return {chave: dict(m) for chave, m in self._metricas.items()}
+
+
+LOCKS_USUARIO = GerenciadorLocks(config.LOCK_TIMEOUT_S)
+
+class CacheTabelas:
+    """
+    Cache das tabelas lidas do disco, compartilhado por todas as sessões do
+    processo. Cada entrada guarda a assinatura (data de modificação + tamanho)
+    do arquivo físico: se o arquivo mudar fora da aplicação, a entrada deixa de
+    valer e a tabela é relida. As tabelas menos usadas são descartadas quando o
+    total ultrapassa `limite_bytes`.
+    """
+
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()  # caminho -> (assinatura, df, bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def obter(self, fisico: Path, assinatura: str = None):
+        """
+        Retorna a tabela em cache, ou None se ela estiver ausente ou
+        desatualizada. Tabelas que não são arquivos (ex: no SQLite) informam a
+        própria `assinatura` em vez da calculada pelo arquivo.
+
+        Os dados não são copiados: o resultado é uma cópia rasa e, com o
+        copy-on-write do pandas, só as colunas que quem chamou alterar são
+        duplicadas; a tabela em cache nunca é modificada.
+        """
+        chave = str(fisico)
+        assinatura = _assinatura_arquivo(fisico) if assinatura is None else assinatura
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] != assinatura:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[1].copy(deep=False)
+
+    def guardar(self, fisico: Path, df: pd.DataFrame, assinatura: str = None):
+        """Registra a tabela correspondente ao conteúdo atual do arquivo físico."""
+        chave = str(fisico)
+        assinatura = _assinatura_arquivo(fisico) if assinatura is None else assinatura
+        tamanho = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._descartar(chave)
+            if tamanho > self.limite_bytes:
+                return
+            self._entradas[chave] = (assinatura, df.copy(deep=False), tamanho)
+            self._total_bytes += tamanho
+            while self._total_bytes > self.limite_bytes:
+                self._descartar(next(iter(self._entradas)))
+
+    def anexar(self, fisico: Path, assinatura_anterior: str, df_linhas: pd.DataFrame, preparar=None):
+        """
+        Acrescenta linhas recém-anexadas ao arquivo à tabela em cache, desde que a
+        entrada ainda corresponda ao arquivo de antes do anexo; senão, descarta-a.
+        `preparar` é aplicado ao resultado (ex: para refazer categorias).
+        """
+        chave = str(fisico)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] != assinatura_anterior:
+                self._descartar(chave)
+                return
+            # infer_objects: colunas vazias nas linhas novas não devem deixar
+            # a coluna com um tipo diferente do que a leitura do arquivo daria.
+            df = pd.concat([entrada[1], df_linhas], ignore_index=True).infer_objects()
+        if preparar is not None:
+            df = preparar(df)
+        self.guardar(fisico, df)
+
+    def remover(self, fisico: Path):
+        with self._lock:
+            self._descartar(str(fisico))
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._total_bytes = 0
+
+    def _descartar(self, chave: str):
+        entrada = self._entradas.pop(chave, None)
+        if entrada is not None:
+            self._total_bytes -= entrada[2]
+
+
+_CACHE_TABELAS = CacheTabelas(config.CACHE_TABELAS_MAX_MB * 1024 * 1024)
+
+def _colunas_data(df: pd.DataFrame, path: Path) -> list:
+    return [col for col in config.COLUNAS_DATA.get(path.name, []) if col in df.columns]
+
+def _converter_datas(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """
+    Converte as colunas de data do arquivo (ver `config.COLUNAS_DATA`) para
+    datetime64. Valores fora do formato padrão ainda são interpretados com o
+    dia primeiro, para não serem perdidos na próxima gravação.
+    """
+    for col in _colunas_data(df, path):
+        if pd.api.types.is_datetime64_any_dtype(df[col]): continue
+        datas = pd.to_datetime(df[col], format=config.FORMATO_DATA, errors='coerce')
+        fora_do_formato = datas.isna() & df[col].notna()
+        if fora_do_formato.any():
+            datas[fora_do_formato] = pd.to_datetime(df.loc[fora_do_formato, col], format='mixed', dayfirst=True, errors='coerce')
+        df[col] = datas
+    return df
+
+def _converter_coluna(serie: pd.Series, tipo) -> pd.Series:
+    """
+    Converte uma coluna para o tipo declarado em `config.ESQUEMAS`.
+
+    Raises:
+        ValueError, TypeError: Se os valores não couberem no tipo.
+    """
+    if isinstance(tipo, list):
+        extras = [v for v in serie.dropna().unique() if v not in tipo]
+        return pd.Series(pd.Categorical(serie, categories=tipo + extras, ordered=True), index=serie.index, name=serie.name)
+    if tipo == "category":
+        return serie.astype("category")
+    if tipo == "str":
+        if pd.api.types.is_string_dtype(serie): return serie
+        return serie.astype(str).where(serie.notna())
+    numeros = pd.to_numeric(serie)
+    if tipo.startswith("int") and (numeros.isna().any() or (numeros % 1 != 0).any()):
+        raise ValueError("valores vazios ou não inteiros")
+    return numeros.astype(tipo)
+
+def _aplicar_esquema(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """
+    Garante as colunas e os tipos declarados para o arquivo em `config.ESQUEMAS`:
+    cria as colunas ausentes, preenche os valores vazios com o padrão e converte
+    cada coluna (datas para datetime64, textos repetitivos para categoria, números
+    para tipos compactos). Arquivos sem esquema são devolvidos como foram lidos.
+    """
+    esquema = config.ESQUEMAS.get(path.name)
+    if esquema is None: return df
+    if df.empty and len(df.columns) == 0:
+        df = pd.DataFrame(columns=list(esquema))
+    df = _converter_datas(df, path)
+    for col, (tipo, padrao) in esquema.items():
+        if col not in df.columns:
+            df[col] = padrao
+        elif padrao is not None and df[col].isna().any():
+            df[col] = df[col].fillna(padrao)
+        if tipo == "data": continue
+        try:
+            df[col] = _converter_coluna(df[col], tipo)
+        except (ValueError, TypeError):
+            pass  # Valores fora do tipo declarado: a coluna fica como foi lida.
+    return df
+
+def _formatar_datas(df: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """Converte as colunas de data de volta para o texto gravado em disco."""
+    colunas = _colunas_data(df, path)
+    if not colunas: return df
+    df = df.copy()
+    for col in colunas:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime(config.FORMATO_DATA)
+        else:
+            # Colunas editadas no `st.data_editor` podem misturar textos e datas.
+            df[col] = df[col].map(lambda v: v.strftime(config.FORMATO_DATA) if hasattr(v, "strftime") and pd.notna(v) else v)
+    return df
+
+def _normalizar_gravado(df_gravado: pd.DataFrame, path: Path) -> pd.DataFrame:
+    """
+    Dá à tabela recém-gravada (com as datas já em texto) os mesmos tipos de uma
+    leitura do disco, sem reler o conteúdo serializado. `df_gravado` não é alterado.
+    """
+    return _aplicar_esquema(df_gravado.reset_index(drop=True), path)
+
+def _gravar_e_atualizar_cache(df: pd.DataFrame, path: Path, fisico: Path, backend):
+    """
+    Grava a tabela e atualiza o cache com a mesma tabela, normalizada pelo
+    esquema. Arquivos sem esquema apenas saem do cache e são relidos depois.
+    """
+    df_gravado = _formatar_datas(df, path)
+    storage.gravar_bytes(backend.serializar(df_gravado), fisico)
+    if path.name in config.ESQUEMAS:
+        _CACHE_TABELAS.guardar(fisico, _normalizar_gravado(df_gravado, path))
+    else:
+        _CACHE_TABELAS.remover(fisico)
+
+def _anexar_e_atualizar_cache(df_novo: pd.DataFrame, path: Path, fisico: Path, backend, colunas: list):
+    """
+    Anexa ao final do arquivo apenas as linhas novas, sem reler nem regravar o
+    histórico, e estende a tabela em cache com as mesmas linhas.
+    """
+    assinatura_anterior = _assinatura_arquivo(fisico)
+    df_gravado = _formatar_datas(df_novo, path)
+    storage.anexar_bytes(backend.serializar_linhas(df_gravado, colunas), fisico)
+    if path.name not in config.ESQUEMAS:
+        _CACHE_TABELAS.remover(fisico)
+        return
+    df_linhas = _normalizar_gravado(df_gravado.reindex(columns=colunas), path)
+    _CACHE_TABELAS.anexar(fisico, assinatura_anterior, df_linhas, preparar=lambda df: _aplicar_esquema(df, path))
+
+def _migrar(path: Path, backend) -> Path:
+    """
+    Converte os arquivos de `path` para o formato do backend (ver
+    `storage.migrar_se_necessario`). O lock da pasta só é tomado quando há
+    de fato o que converter, já que a migração renomeia os arquivos de origem.
+    """
+    if storage.precisa_migrar(path, backend):
+        with LOCKS_USUARIO.bloquear(path):
+            return storage.migrar_se_necessario(path, backend)
+    return path if backend.banco else storage.caminho_fisico(path, backend)
+
+def _carregar_do_banco(path: Path, backend) -> pd.DataFrame:
+    """
+    Lê a tabela do usuário no banco, usando o cache enquanto a versão gravada
+    no banco não mudar.
+    """
+    _migrar(path, backend)
+    versao = backend.versao(path)
+    if versao is None: return _aplicar_esquema(pd.DataFrame(), path)
+    chave, assinatura = backend.chave(path), f"v{versao}"
+    df = _CACHE_TABELAS.obter(chave, assinatura)
+    if df is None:
+        df = _aplicar_esquema(backend.ler(path), path)
+        _CACHE_TABELAS.guardar(chave, df, assinatura)
+    return df
+
 def carregar_df(path: Path) -> pd.DataFrame:
     """
-    Carrega um arquivo CSV de forma segura.
+    Carrega uma tabela de forma segura. Os arquivos do usuário são lidos pelo
+    backend configurado em `config.STORAGE_BACKEND` (convertendo o CSV existente
+    no primeiro acesso); os demais arquivos são lidos como CSV. Anexos que
+    ficaram incompletos (ex: queda do processo) são concluídos antes da leitura
+    pelo journal da pasta (ver `storage.recuperar_pendentes`). A tabela já vem
+    com as colunas e os tipos de `config.ESQUEMAS` (inclusive quando o arquivo
+    ainda não existe). Enquanto o arquivo não muda, ela vem do cache
+    compartilhado `_CACHE_TABELAS`.
     """
-    if path is None or not path.exists(): return pd.DataFrame()
+    if path is None: return pd.DataFrame()
     try:
-        return pd.read_csv(path, encoding='utf-8')
+        backend = storage.backend_para(path)
+        if backend.banco:
+            return _carregar_do_banco(path, backend)
+        fisico = storage.caminho_fisico(path, backend)
+        # Migração e recuperação do journal gravam no disco, então só acontecem
+        # com o lock da pasta; a leitura comum (inclusive de um arquivo que
+        # ainda não existe) não precisa dele.
+        if storage.precisa_migrar(path, backend) or storage.caminho_journal(fisico).exists():
+            with LOCKS_USUARIO.bloquear(path):
+                fisico = storage.migrar_se_necessario(path, backend)
+                if fisico.exists(): storage.recuperar_pendentes(fisico)
+        if not fisico.exists(): return _aplicar_esquema(pd.DataFrame(), path)
+        df = _CACHE_TABELAS.obter(fisico)
+        if df is None:
+            df = _aplicar_esquema(backend.ler(fisico), path)
+            _CACHE_TABELAS.guardar(fisico, df)
+        return df
     except pd.errors.EmptyDataError:
         return pd.DataFrame()
     except Exception as e:
@@ -75,15 +461,30 @@ def carregar_df(path: Path) -> pd.DataFrame:
 
 def salvar_df(df: pd.DataFrame, path: Path):
     """
-    Salva um DataFrame em um arquivo CSV.
+    Salva um DataFrame usando o backend de armazenamento do arquivo. A gravação
+    é atômica: uma interrupção no meio mantém o arquivo anterior intacto. As
+    colunas de data são gravadas de volta como texto (`config.FORMATO_DATA`;
+    no banco, em ISO-8601). O lock da pasta cobre só a gravação: uma tabela
+    editada na tela a partir de uma leitura anterior substitui a tabela inteira
+    (a última gravação prevalece).
+
+    Returns:
+        bool: True se a tabela foi gravada. Em caso de erro (inclusive o tempo
+              limite do lock), a mensagem é exibida e o retorno é False.
     """
     if path is None:
         st.error("Erro interno: O caminho para salvar o arquivo é inválido (None).")
-        return
+        return False
     try:
         # Garante que o diretório pai exista antes de tentar salvar
         path.parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(path, index=False, encoding='utf-8')
+        backend = storage.backend_para(path)
+        if backend.banco:
+            backend.escrever(df, path)
+            return True
+        with LOCKS_USUARIO.bloquear(path):
+            _gravar_e_atualizar_cache(df, path, storage.caminho_fisico(path, backend), backend)
+        return True
     except Exception as e:
         st.error(f"""
         **Erro ao Salvar o Arquivo!**
@@ -94,31 +495,172 @@ def salvar_df(df: pd.DataFrame, path: Path):
 
         **Verifique as permissões de escrita na pasta.**
         """)
+        return False
 
 def adicionar_registro_df(df_novo: pd.DataFrame, path: Path):
     """
-    Adiciona um novo registro a um arquivo CSV existente.
+    Adiciona um novo registro a um arquivo existente. Em CSV, as linhas novas são
+    anexadas ao final do arquivo; ele só é regravado por inteiro quando o novo
+    registro traz colunas que o arquivo ainda não tem (ou em formatos colunares,
+    que não permitem anexar).
+
+    Returns:
+        bool: True se o registro foi gravado. Em caso de erro (inclusive o tempo
+              limite do lock), a mensagem é exibida e o retorno é False; quem
+              chama não deve tratar o registro como salvo.
     """
     if path is None:
         st.error("Erro interno: O caminho para adicionar registro é inválido (None).")
-        return
+        return False
     try:
         # Garante que o diretório pai exista antes de qualquer operação
         path.parent.mkdir(parents=True, exist_ok=True)
-        if path.exists() and path.stat().st_size > 0:
-            df_existente = pd.read_csv(path)
-            df_final = pd.concat([df_existente, df_novo], ignore_index=True)
-            df_final.to_csv(path, index=False)
-        else:
-            df_novo.to_csv(path, index=False)
+        backend = storage.backend_para(path)
+        if backend.banco:
+            _migrar(path, backend)
+            backend.adicionar(df_novo, path)
+            return True
+        # O ciclo leitura-modificação-gravação inteiro fica sob o lock da pasta,
+        # para que duas sessões do mesmo usuário não percam registros uma da outra.
+        with LOCKS_USUARIO.bloquear(path):
+            fisico = storage.migrar_se_necessario(path, backend)
+            storage.recuperar_pendentes(fisico)
+            if fisico.exists() and fisico.stat().st_size > 0:
+                if backend.suporta_anexo:
+                    colunas = backend.colunas(fisico)
+                    if colunas and set(df_novo.columns) <= set(colunas):
+                        _anexar_e_atualizar_cache(df_novo, path, fisico, backend, colunas)
+                        return True
+                # Colunas novas: o esquema é reconciliado regravando o arquivo com todas elas.
+                df_existente = _CACHE_TABELAS.obter(fisico)
+                if df_existente is None:
+                    df_existente = backend.ler(fisico)
+                df_final = pd.concat([_formatar_datas(df_existente, path), _formatar_datas(df_novo, path)], ignore_index=True)
+                _gravar_e_atualizar_cache(df_final, path, fisico, backend)
+            else:
+                _gravar_e_atualizar_cache(df_novo, path, fisico, backend)
+        return True
     except Exception as e:
         st.error(f"Erro ao adicionar registro em {path.name}: {e}")
+        return False
+
+def _valor_filtro(valor, coluna_data: bool):
+    """Converte o valor de um filtro de data (date, Timestamp ou texto) para Timestamp."""
+    if not coluna_data or valor is None: return valor
+    if isinstance(valor, str):
+        data = pd.to_datetime(valor, format=config.FORMATO_DATA, errors='coerce')
+        return data if pd.notna(data) else pd.to_datetime(valor, format=storage.FORMATO_DATA_BANCO, errors='coerce')
+    return pd.Timestamp(valor)
+
+def consultar_df(path: Path, filtros: dict) -> pd.DataFrame:
+    """
+    Retorna apenas as linhas da tabela que atendem a `filtros`. Cada filtro é um
+    valor exato (ex: `{'nome_exercicio': 'Supino'}`) ou uma tupla (início, fim)
+    de intervalo inclusivo, com None para deixar um lado aberto (ex:
+    `{'Data': (date(2024, 1, 1), None)}`). Datas podem vir como date, Timestamp
+    ou texto em `config.FORMATO_DATA`. No backend SQLite o filtro vira uma
+    consulta indexada; nos arquivos, é aplicado à tabela carregada.
+    """
+    if path is None: return pd.DataFrame()
+    backend = storage.backend_para(path)
+    if backend.banco:
+        try:
+            _migrar(path, backend)
+            return _aplicar_esquema(backend.ler(path, filtros), path)
+        except Exception as e:
+            st.error(f"Erro ao consultar o arquivo {path.name}: {e}")
+            return pd.DataFrame()
+
+    df = carregar_df(path)
+    colunas_data = config.COLUNAS_DATA.get(path.name, [])
+    mascara = pd.Series(True, index=df.index)
+    for coluna, valor in filtros.items():
+        if coluna not in df.columns: return df.iloc[0:0]
+        coluna_data = coluna in colunas_data
+        if isinstance(valor, tuple):
+            inicio, fim = (_valor_filtro(v, coluna_data) for v in valor)
+            if inicio is not None: mascara &= df[coluna] >= inicio
+            if fim is not None: mascara &= df[coluna] <= fim
+        else:
+            mascara &= df[coluna] == _valor_filtro(valor, coluna_data)
+    return df[mascara].reset_index(drop=True)
+
+def exportar_csv(path: Path, destino: Path = None) -> Path:
+    """
+    Exporta uma tabela do usuário para CSV, qualquer que seja o backend em uso.
+    Por padrão o arquivo vai para `data/<usuario>/exportacao/` (ver
+    `storage.exportar_csv`).
+    """
+    try:
+        with LOCKS_USUARIO.bloquear(path):
+            return storage.exportar_csv(path, destino)
+    except Exception as e:
+        st.error(f"Erro ao exportar {path.name} para CSV: {e}")
+        return None
+
+# Mapeamento das chaves de `user_data` para os arquivos do usuário.
+ARQUIVOS_DADOS_USUARIO = {
+    "dados_pessoais": config.FILE_DADOS_PESSOAIS,
+    "df_objetivo": config.FILE_OBJETIVO,
+    "df_evolucao": config.FILE_EVOLUCAO,
+    "df_log_treinos": config.FILE_LOG_TREINOS_SIMPLES,
+    "df_log_exercicios": config.FILE_LOG_EXERCICIOS,
+    "df_refeicoes": config.FILE_REFEICOES,
+    "df_planos_alimentares": config.FILE_PLANOS_ALIMENTARES,
+    "df_planos_treino": config.FILE_PLANOS_TREINO,
+    "df_exercicios": config.FILE_PLANOS_EXERCICIOS,
+    "df_macrociclos": config.FILE_MACROCICLOS,
+    "df_mesociclos": config.FILE_MESOCICLOS,
+    "df_plano_semanal": config.FILE_PLANO_SEMANAL,
+}
+
+class DadosUsuario(Mapping):
+    """
+    Dicionário somente leitura com os dados do usuário que carrega cada tabela
+    apenas no primeiro acesso e a memoriza até o fim da execução (rerun) atual.
+    Assim, cada aba só paga pela leitura dos arquivos que realmente utiliza.
+
+    A chave "dados_pessoais" retorna a primeira linha do arquivo como dicionário;
+    as demais retornam DataFrames.
+    """
+    def __init__(self, username: str):
+        self.username = username
+        self._carregados = {}
+
+    def __getitem__(self, chave: str):
+        if chave not in self._carregados:
+            if chave not in ARQUIVOS_DADOS_USUARIO:
+                raise KeyError(chave)
+            df = carregar_df(get_user_data_path(self.username, ARQUIVOS_DADOS_USUARIO[chave]))
+            if chave == "dados_pessoais":
+                df = df.iloc[0].to_dict() if not df.empty else {}
+            self._carregados[chave] = df
+        return self._carregados[chave]
+
+    def __contains__(self, chave) -> bool:
+        # Evita que `chave in user_data` dispare a leitura do arquivo.
+        return chave in ARQUIVOS_DADOS_USUARIO
+
+    def __iter__(self):
+        return iter(ARQUIVOS_DADOS_USUARIO)
+
+    def __len__(self) -> int:
+        return len(ARQUIVOS_DADOS_USUARIO)
 
 @st.cache_data(show_spinner="Carregando tabela de alimentos...")
 def carregar_tabela_alimentacao(path: Path) -> pd.DataFrame:
     """
     Carrega e pré-processa a tabela de alimentos.
     """
+    return _ler_tabela_alimentacao(path)
+
+def _ler_tabela_alimentacao(path: Path) -> pd.DataFrame:
+    """
+    Lê e pré-processa a tabela de alimentos direto do disco, sem cache. Usada
+    por quem já guarda o resultado pela assinatura do arquivo (ex: o índice de
+    busca), para não depender do cache de `carregar_tabela_alimentacao`, que
+    só é invalidado quando alguém chama `.clear()`.
+    """
     if not path.exists(): return pd.DataFrame()
     df = pd.read_csv(path, encoding="latin1", sep=";", on_bad_lines="skip")
     if config.COL_ALIMENTO in df.columns:
@@ -129,6 +671,199 @@ def carregar_tabela_alimentacao(path: Path) -> pd.DataFrame:
         if col in df.columns: df[col] = df[col].apply(limpar_valor_numerico)
     return df
 
+def _assinatura_arquivo(path: Path) -> str:
+    """
+    Gera uma assinatura (data de modificação + tamanho) que muda sempre que o arquivo é reescrito.
+    """
+    if path is None or not path.exists(): return ""
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def assinatura_tabela(path: Path) -> str:
+    """
+    Assinatura que muda sempre que a tabela do usuário é gravada, em qualquer
+    backend. Serve para invalidar dados derivados da tabela (ex: índices).
+    """
+    backend = storage.backend_para(path)
+    if backend.banco:
+        versao = backend.versao(path)
+        return "" if versao is None else f"v{versao}"
+    return _assinatura_arquivo(storage.caminho_fisico(path, backend))
+
+def carregar_aliases_alimentos(path_tabela: Path = config.PATH_TABELA_ALIM) -> dict:
+    """
+    Carrega a tabela de aliases (nome normalizado -> ID do alimento) salva em disco.
+    Retorna um dicionário vazio se o arquivo não existir ou se tiver sido gerado
+    para outra versão da tabela de alimentos.
+    """
+    path = config.PATH_ALIASES_ALIM
+    if not path.exists(): return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    if not isinstance(data, dict) or data.get("assinatura_tabela") != _assinatura_arquivo(path_tabela):
+        return {}
+    return data.get("aliases", {})
+
+def salvar_aliases_alimentos(aliases: dict, path_tabela: Path = config.PATH_TABELA_ALIM):
+    """
+    Salva a tabela de aliases junto com a assinatura da tabela de alimentos que a gerou.
+    """
+    path = config.PATH_ALIASES_ALIM
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "assinatura_tabela": _assinatura_arquivo(path_tabela),
+            # Converte tipos do numpy (ex: int64) para tipos nativos do JSON.
+            "aliases": {nome: (id_alim.item() if hasattr(id_alim, "item") else id_alim) for nome, id_alim in aliases.items()},
+        }
+        storage.gravar_bytes(json.dumps(data, ensure_ascii=False).encode('utf-8'), path)
+    except Exception as e:
+        st.error(f"Erro ao salvar o cache de alimentos em {path.name}: {e}")
+
+def registrar_aliases_alimentos(novos: dict, path_tabela: Path = config.PATH_TABELA_ALIM):
+    """
+    Acrescenta aliases recém-resolvidos à tabela em disco, gravando apenas se
+    algum deles ainda não estiver salvo.
+    """
+    aliases = carregar_aliases_alimentos(path_tabela)
+    if all(aliases.get(nome) == id_alim for nome, id_alim in novos.items()):
+        return
+    aliases.update(novos)
+    salvar_aliases_alimentos(aliases, path_tabela)
+
+def carregar_estatisticas_treinos(username: str, assinatura_log: str = None) -> dict:
+    """
+    Carrega os agregados do log de treinos salvos para o usuário (ver
+    `logic.EstatisticasTreinos`). Retorna um dicionário vazio se não existirem
+    ou se tiverem sido gerados para outra versão do log; por padrão, a versão
+    atual de `treinos.csv`.
+    """
+    path = get_user_data_path(username, config.FILE_ESTATISTICAS_TREINOS)
+    if path is None or not path.exists(): return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    if assinatura_log is None:
+        assinatura_log = assinatura_tabela(get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES))
+    if not isinstance(data, dict) or data.get("assinatura_log") != assinatura_log:
+        return {}
+    return data.get("estatisticas", {})
+
+def salvar_estatisticas_treinos(username: str, estatisticas: dict):
+    """
+    Salva os agregados do log de treinos junto com a assinatura atual de
+    `treinos.csv`, que deve ser a versão do log que eles descrevem.
+    """
+    path = get_user_data_path(username, config.FILE_ESTATISTICAS_TREINOS)
+    if path is None: return
+    try:
+        data = {
+            "assinatura_log": assinatura_tabela(get_user_data_path(username, config.FILE_LOG_TREINOS_SIMPLES)),
+            "estatisticas": estatisticas,
+        }
+        storage.gravar_bytes(json.dumps(data, ensure_ascii=False).encode('utf-8'), path)
+    except Exception as e:
+        st.error(f"Erro ao salvar as estatísticas de treino em {path.name}: {e}")
+
+def invalidar_aliases_alimentos(path_tabela: Path = config.PATH_TABELA_ALIM):
+    """
+    Remove a tabela de aliases se ela não corresponder mais à tabela de alimentos
+    atual. Deve ser chamada por quem grava a tabela de alimentos (ex: upload de
+    uma nova tabela ou edição na aba de cadastro).
+    """
+    path = config.PATH_ALIASES_ALIM
+    if path.exists() and not carregar_aliases_alimentos(path_tabela):
+        path.unlink(missing_ok=True)
+
+def _tokenizar_alimento(txt: str) -> list:
+    """
+    Quebra um nome de alimento já normalizado em tokens de busca.
+    """
+    return [tok for tok in re.split(r"[\s/]+", txt) if tok]
+
+def construir_indice_alimentos(df: pd.DataFrame) -> dict:
+    """
+    Constrói um índice invertido (token -> posições das linhas) sobre a coluna
+    normalizada da tabela de alimentos. Os tokens ficam ordenados para que a
+    busca por prefixo seja feita com busca binária; os nomes e seus tamanhos
+    ficam em arrays para que a ordenação dos resultados seja vetorizada.
+    O índice guarda a própria tabela recebida, sem copiá-la.
+    """
+    postings = {}
+    nomes = df[config.COL_ALIMENTO_PROC].fillna("").astype(str).tolist() if config.COL_ALIMENTO_PROC in df.columns else []
+    for pos, nome in enumerate(nomes):
+        for tok in set(_tokenizar_alimento(nome)):
+            postings.setdefault(tok, []).append(pos)
+    tokens = sorted(postings)
+    return {
+        "tabela": df,
+        "tokens": tokens,
+        "postings": [np.array(postings[tok], dtype=np.int64) for tok in tokens],
+        "nomes": np.array(nomes, dtype=str),
+        "tamanhos": np.array([len(nome) for nome in nomes], dtype=np.int64),
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _construir_indice_busca_alimentos(path: Path, assinatura: str) -> dict:
+    return construir_indice_alimentos(_ler_tabela_alimentacao(path))
+
+def _posicoes_por_prefixo(indice: dict, prefixo: str) -> np.ndarray:
+    """
+    Retorna as posições das linhas que possuem algum token iniciado por `prefixo`.
+    """
+    tokens = indice["tokens"]
+    inicio = bisect_left(tokens, prefixo)
+    fim = bisect_left(tokens, prefixo + "\uffff", lo=inicio)
+    if inicio == fim:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(indice["postings"][inicio:fim]))
+
+def _posicoes_exatas(indice: dict, token: str) -> np.ndarray:
+    """Retorna as posições das linhas que possuem exatamente o token."""
+    pos = bisect_left(indice["tokens"], token)
+    if pos < len(indice["tokens"]) and indice["tokens"][pos] == token:
+        return indice["postings"][pos]
+    return np.empty(0, dtype=np.int64)
+
+def buscar_alimentos(termo: str, limite: int = 25, path: Path = config.PATH_TABELA_ALIM) -> pd.DataFrame:
+    """
+    Busca alimentos pelo nome usando o índice invertido da tabela, sem varrer
+    todas as linhas. Cada palavra do termo é tratada como prefixo de uma palavra
+    do alimento (ex: "arr integ" encontra "Arroz, integral, cozido"); uma
+    palavra que não inicia nenhuma outra é procurada no meio dos nomes (ex:
+    "rroz" ainda encontra "Arroz").
+
+    Os resultados são ordenados por relevância: nomes que começam pelo termo,
+    depois os que contêm mais palavras exatas do termo e, por fim, os nomes
+    mais curtos. O índice é montado uma vez por versão do arquivo da tabela.
+    Sem resultados, retorna uma tabela vazia com as colunas da tabela de alimentos.
+    """
+    termos = _tokenizar_alimento(normalizar_texto(termo))
+    indice = _construir_indice_busca_alimentos(path, _assinatura_arquivo(path))
+    tabela = indice["tabela"]
+    if not termos or tabela.empty:
+        return tabela.iloc[[]]
+
+    candidatos = None
+    for tok in termos:
+        posicoes = _posicoes_por_prefixo(indice, tok)
+        if posicoes.size == 0:
+            posicoes = np.flatnonzero(np.char.find(indice["nomes"], tok) >= 0)
+        candidatos = posicoes if candidatos is None else np.intersect1d(candidatos, posicoes, assume_unique=True)
+        if candidatos.size == 0:
+            return tabela.iloc[[]]
+
+    termo_proc = " ".join(termos)
+    comeca = np.char.startswith(indice["nomes"][candidatos], termo_proc)
+    exatos = sum(np.isin(candidatos, _posicoes_exatas(indice, tok)).astype(np.int64) for tok in set(termos))
+    ordem = np.lexsort((candidatos, indice["tamanhos"][candidatos], -exatos, ~comeca))[:limite]
+    return tabela.iloc[candidatos[ordem]]
+
 @st.cache_data(show_spinner="Carregando recomendações...")
 def carregar_recomendacao(path: Path) -> pd.DataFrame:
     """
@@ -144,6 +879,14 @@ def carregar_banco_exercicios(path: Path) -> list:
     """
     Carrega o banco de dados de exercícios de um arquivo JSON local.
     """
+    return _ler_banco_exercicios(path)
+
+def _ler_banco_exercicios(path: Path) -> list:
+    """
+    Lê o banco de exercícios direto do disco, sem cache. O catálogo, que já é
+    guardado pela assinatura do arquivo, usa esta função para não depender do
+    cache de `carregar_banco_exercicios`, que só é invalidado com `.clear()`.
+    """
     if not path.exists():
         st.error("Arquivo 'exercises.json' não encontrado na pasta 'data'.")
         return []
@@ -164,7 +907,415 @@ def carregar_banco_exercicios(path: Path) -> list:
     except Exception as e:
         st.error(f"Erro inesperado ao carregar 'exercises.json': {e}")
         return []
-    
+
+class CatalogoExercicios:
+    """
+    Índice colunar da biblioteca de exercícios, montado uma única vez por versão
+    do arquivo JSON. Guarda cada campo como uma coluna (tupla) e oferece os
+    índices que as abas consultam a cada rerun: nome normalizado -> posição,
+    caminhos das imagens (e das versões reduzidas, ver `gerar_derivados_imagens`)
+    e os conjuntos de músculos e equipamentos.
+
+    Também funciona como busca facetada: para cada valor dos campos em
+    `FACETAS` há um bitset (um int do Python, bit i = exercício na posição i),
+    de modo que filtros combinados se resolvem com operações de bits.
+
+    O objeto é compartilhado entre sessões (cache de recurso) e deve ser
+    tratado como somente leitura.
+    """
+
+    FACETAS = ("primaryMuscles", "secondaryMuscles", "equipment", "level", "category", "force", "mechanic")
+
+    def __init__(self, exercicios: list, base_imagens: Path, derivados: dict = None):
+        registros = [ex for ex in exercicios if isinstance(ex, dict) and ex.get("name")]
+        campos = list(dict.fromkeys(campo for ex in registros for campo in ex))
+        self.campos = tuple(campos)
+        self.colunas = {campo: tuple(_congelar_valor(ex.get(campo)) for ex in registros) for campo in campos}
+        # Campos que faltavam no registro original, para não inventar chaves ao remontá-lo.
+        self._ausentes = {
+            campo: frozenset(pos for pos, ex in enumerate(registros) if campo not in ex) for campo in campos
+        }
+        self.nomes = self.colunas.get("name", ())
+        self.nomes_ordenados = tuple(sorted(self.nomes))
+        self.nomes_normalizados = tuple(normalizar_texto(nome) for nome in self.nomes)
+        self.indice_nome = {nome: pos for pos, nome in enumerate(self.nomes_normalizados)}
+
+        self.imagens_por_posicao = tuple(
+            tuple(base_imagens / Path(img) for img in imagens or ())
+            for imagens in self.colunas.get("images", (None,) * len(self.nomes))
+        )
+        # {largura: caminho} das versões reduzidas de cada imagem, quando existem.
+        self.variantes_por_posicao = tuple(
+            tuple(_variantes_da_imagem(img, derivados or {}) for img in imagens)
+            for imagens in self.imagens_por_posicao
+        )
+
+        self.todos = (1 << len(self.nomes)) - 1
+        self.facetas = {campo: self._indexar_faceta(campo) for campo in self.FACETAS}
+        self.musculos_primarios = frozenset(self.facetas["primaryMuscles"])
+        self.musculos = self.musculos_primarios | frozenset(self.facetas["secondaryMuscles"])
+        self.equipamentos = frozenset(self.facetas["equipment"])
+        self.ids = frozenset(i for i in self.colunas.get("id", ()) if isinstance(i, str))
+
+    def __len__(self) -> int:
+        return len(self.nomes)
+
+    def _indexar_faceta(self, campo: str) -> dict:
+        """Monta {valor: bitset} para um campo; campos de lista marcam cada item."""
+        posicoes_por_valor = {}
+        for pos, valor in enumerate(self.colunas.get(campo, ())):
+            for item in valor if isinstance(valor, tuple) else (valor,):
+                if isinstance(item, str) and item:
+                    posicoes_por_valor.setdefault(item, []).append(pos)
+        return {valor: sum(1 << pos for pos in posicoes) for valor, posicoes in posicoes_por_valor.items()}
+
+    def filtrar(self, filtros: dict = None, termo: str = "") -> int:
+        """
+        Resolve uma busca facetada e retorna o bitset dos exercícios encontrados.
+
+        Args:
+            filtros (dict): {campo: valor ou lista de valores}. Valores de um mesmo
+                campo se combinam com OU; campos diferentes, com E. Campos com
+                None ou lista vazia não restringem a busca.
+            termo (str): Trecho do nome do exercício (sem diferenciar acentos).
+        """
+        bits = self.todos
+        for campo, valores in (filtros or {}).items():
+            if valores is None or valores == [] or valores == ():
+                continue
+            if isinstance(valores, str):
+                valores = (valores,)
+            indice = self.facetas[campo]
+            selecao = 0
+            for valor in valores:
+                selecao |= indice.get(valor, 0)
+            bits &= selecao
+        termo = normalizar_texto(termo)
+        if termo and bits:
+            bits &= sum(1 << pos for pos, nome in enumerate(self.nomes_normalizados) if termo in nome)
+        return bits
+
+    def contagens(self, campo: str, filtros: dict = None, termo: str = "") -> dict:
+        """
+        Quantos exercícios cada valor de `campo` teria, aplicando os demais
+        filtros (o filtro do próprio campo é ignorado, como em toda faceta).
+        """
+        outros = {c: v for c, v in (filtros or {}).items() if c != campo}
+        base = self.filtrar(outros, termo)
+        return {valor: (base & bits).bit_count() for valor, bits in self.facetas[campo].items()}
+
+    @staticmethod
+    def posicoes(bits: int) -> list:
+        """Posições (em ordem crescente) dos bits ligados em um bitset."""
+        posicoes = []
+        while bits:
+            menor = bits & -bits
+            posicoes.append(menor.bit_length() - 1)
+            bits ^= menor
+        return posicoes
+
+    def posicao(self, nome: str):
+        """Posição do exercício no catálogo, pelo nome normalizado (ou None)."""
+        return self.indice_nome.get(normalizar_texto(nome))
+
+    def registro(self, pos: int) -> dict:
+        """Remonta o dicionário original do exercício na posição informada."""
+        registro = {}
+        for campo in self.campos:
+            if pos in self._ausentes[campo]: continue
+            valor = self.colunas[campo][pos]
+            registro[campo] = list(valor) if isinstance(valor, tuple) else valor
+        return registro
+
+    def detalhes(self, nome: str):
+        """Dicionário do exercício com o nome informado (ou None)."""
+        pos = self.posicao(nome)
+        return None if pos is None else self.registro(pos)
+
+    def imagens(self, nome: str, largura: int = None) -> tuple:
+        """
+        Caminhos absolutos das imagens do exercício (tupla vazia se não houver).
+        Com `largura`, usa a menor versão reduzida que ainda a cobre.
+        """
+        pos = self.posicao(nome)
+        return () if pos is None else self.imagens_na_posicao(pos, largura)
+
+    def imagens_na_posicao(self, pos: int, largura: int = None) -> tuple:
+        imagens = self.imagens_por_posicao[pos]
+        if largura is None:
+            return imagens
+        return tuple(
+            next((caminho for w, caminho in variantes.items() if w >= largura), original)
+            for original, variantes in zip(imagens, self.variantes_por_posicao[pos])
+        )
+
+    def registros(self) -> list:
+        """Lista completa de exercícios no formato do JSON (cópias novas)."""
+        return [self.registro(pos) for pos in range(len(self))]
+
+    def como_dataframe(self) -> pd.DataFrame:
+        """Tabela com uma linha por exercício, para exibição e edição."""
+        return pd.DataFrame({
+            campo: [list(v) if isinstance(v, tuple) else v for v in coluna]
+            for campo, coluna in self.colunas.items()
+        })
+
+def _congelar_valor(valor):
+    """Listas viram tuplas, para que o catálogo compartilhado não seja alterado por engano."""
+    return tuple(valor) if isinstance(valor, list) else valor
+
+@st.cache_resource(show_spinner="Indexando a biblioteca de exercícios...", max_entries=4)
+def _construir_catalogo_exercicios(path: Path, assinatura: str, assinatura_derivados: str) -> CatalogoExercicios:
+    derivados = _ler_manifesto_derivados().get("imagens", {})
+    return CatalogoExercicios(_ler_banco_exercicios(path), path.parent, derivados)
+
+def carregar_catalogo_exercicios(path: Path) -> CatalogoExercicios:
+    """
+    Retorna o catálogo da biblioteca de exercícios, reconstruído apenas quando
+    o arquivo JSON ou o manifesto das imagens reduzidas mudam (as assinaturas
+    dos arquivos entram na chave do cache).
+    """
+    return _construir_catalogo_exercicios(
+        path, _assinatura_arquivo(path), _assinatura_arquivo(config.PATH_MANIFESTO_DERIVADOS)
+    )
+
+# ==============================================================================
+# IMAGENS REDUZIDAS DOS EXERCÍCIOS
+# ==============================================================================
+# As fotos originais (750px) são exibidas com 300-500px. O comando
+# `python src/manutencao.py gerar-derivados` grava versões WebP nessas larguras em
+# config.PATH_DERIVADOS e as registra no manifesto; o catálogo lê o manifesto
+# e as telas pedem a imagem pela largura em que vão exibi-la.
+
+def _ler_manifesto_derivados() -> dict:
+    """Manifesto das imagens reduzidas (vazio se o comando nunca foi executado)."""
+    try:
+        with open(config.PATH_MANIFESTO_DERIVADOS, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _variantes_da_imagem(path: Path, derivados: dict) -> dict:
+    """
+    {largura: caminho} das versões reduzidas de `path`, em ordem crescente.
+    Vazio se a imagem mudou depois da geração (as versões estariam desatualizadas).
+    """
+    try:
+        entrada = derivados.get(path.relative_to(config.ASSETS_DIR).as_posix())
+    except ValueError:
+        return {}
+    if not entrada or entrada.get("assinatura") != _assinatura_arquivo(path):
+        return {}
+    return {
+        int(largura): config.PATH_DERIVADOS / relativo
+        for largura, relativo in sorted(entrada["variantes"].items(), key=lambda item: int(item[0]))
+    }
+
+def _gerar_variantes_imagem(tarefa: tuple) -> tuple:
+    """
+    Gera as versões reduzidas de uma imagem (executada nos processos auxiliares).
+    Se o conteúdo não mudou desde a última geração, só confirma os arquivos.
+
+    Returns:
+        tuple: (relativo, entrada do manifesto, se a imagem foi recodificada).
+    """
+    relativo, larguras, qualidade, anterior = tarefa
+    origem = config.ASSETS_DIR / relativo
+    conteudo = origem.read_bytes()
+    hash_conteudo = hashlib.sha1(conteudo).hexdigest()
+    assinatura = _assinatura_arquivo(origem)
+    if anterior and anterior.get("hash") == hash_conteudo and all(
+        (config.PATH_DERIVADOS / v).exists() for v in anterior["variantes"].values()
+    ):
+        return relativo, {**anterior, "assinatura": assinatura}, False
+
+    variantes = {}
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        imagem = imagem.convert("RGB")
+        for largura in larguras:
+            # Larguras maiores que a original não ganham nada: fica a original.
+            if largura >= imagem.width:
+                continue
+            altura = max(1, round(imagem.height * largura / imagem.width))
+            destino_relativo = Path(relativo).with_name(f"{Path(relativo).stem}_{largura}.webp").as_posix()
+            destino = config.PATH_DERIVADOS / destino_relativo
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            saida = io.BytesIO()
+            imagem.resize((largura, altura), Image.LANCZOS).save(saida, "WEBP", quality=qualidade, method=6)
+            storage.gravar_bytes(saida.getvalue(), destino)
+            variantes[str(largura)] = destino_relativo
+    return relativo, {"assinatura": assinatura, "hash": hash_conteudo, "variantes": variantes}, True
+
+def gerar_derivados_imagens(pasta: Path = None, processos: int = None) -> dict:
+    """
+    Gera (ou atualiza) as versões reduzidas das imagens de `pasta` e grava o
+    manifesto. É incremental: imagens com a mesma assinatura da última execução
+    são puladas, e as que só mudaram de data (ex: após um git checkout) não são
+    recodificadas. O trabalho é dividido entre `processos` processos (padrão:
+    um por núcleo).
+
+    Returns:
+        dict: Contagem de imagens {"geradas", "inalteradas", "removidas"}.
+
+    Raises:
+        RuntimeError: Se o Pillow não estiver instalado.
+    """
+    if Image is None:
+        raise RuntimeError("O Pillow é necessário para gerar as imagens reduzidas (pip install pillow).")
+    pasta = pasta or config.ASSETS_DIR / "exercises"
+    larguras = sorted(config.LARGURAS_DERIVADOS)
+    manifesto = _ler_manifesto_derivados()
+    mesmos_parametros = manifesto.get("larguras") == larguras and manifesto.get("qualidade") == config.QUALIDADE_DERIVADOS
+    anteriores = manifesto.get("imagens", {}) if mesmos_parametros else {}
+
+    origens = sorted(
+        p.relative_to(config.ASSETS_DIR).as_posix()
+        for p in pasta.rglob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png")
+    )
+    imagens, tarefas = {}, []
+    for relativo in origens:
+        anterior = anteriores.get(relativo)
+        if anterior and anterior.get("assinatura") == _assinatura_arquivo(config.ASSETS_DIR / relativo):
+            imagens[relativo] = anterior
+        else:
+            tarefas.append((relativo, larguras, config.QUALIDADE_DERIVADOS, anterior))
+
+    geradas = 0
+    if tarefas:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            for relativo, entrada, recodificada in executor.map(_gerar_variantes_imagem, tarefas, chunksize=8):
+                imagens[relativo] = entrada
+                geradas += recodificada
+
+    removidas = set(anteriores) - set(imagens)
+    for relativo in removidas:
+        for variante in anteriores[relativo]["variantes"].values():
+            (config.PATH_DERIVADOS / variante).unlink(missing_ok=True)
+
+    manifesto = {"larguras": larguras, "qualidade": config.QUALIDADE_DERIVADOS, "imagens": imagens}
+    config.PATH_DERIVADOS.mkdir(parents=True, exist_ok=True)
+    storage.gravar_bytes(json.dumps(manifesto, indent=1, ensure_ascii=False).encode("utf-8"), config.PATH_MANIFESTO_DERIVADOS)
+    return {"geradas": geradas, "inalteradas": len(imagens) - geradas, "removidas": len(removidas)}
+
+class CacheAssets:
+    """
+    Cache das imagens e SVGs já convertidos em data URI (base64), compartilhado
+    por todas as sessões do processo. A chave é o caminho mais a assinatura do
+    arquivo (data de modificação + tamanho), então um arquivo substituído é
+    relido na próxima consulta. Os itens menos usados são descartados quando o
+    total ultrapassa `limite_bytes`. Conta acertos e faltas (ver `metricas`).
+    """
+
+    TIPOS_MIME = {
+        ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+        ".gif": "image/gif", ".webp": "image/webp", ".svg": "image/svg+xml",
+    }
+
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()  # (caminho, assinatura) -> data URI
+        self._total_bytes = 0
+        self._acertos = 0
+        self._faltas = 0
+        self._lock = threading.Lock()
+
+    def data_uri(self, path: Path):
+        """Retorna o arquivo como data URI, ou None se ele não existir."""
+        assinatura = _assinatura_arquivo(path)
+        if not assinatura:
+            return None
+        chave = (str(path), assinatura)
+        with self._lock:
+            uri = self._entradas.get(chave)
+            if uri is not None:
+                self._acertos += 1
+                self._entradas.move_to_end(chave)
+                return uri
+            self._faltas += 1
+
+        tipo = self.TIPOS_MIME.get(path.suffix.lower(), "application/octet-stream")
+        with open(path, "rb") as f:
+            uri = f"data:{tipo};base64,{base64.b64encode(f.read()).decode()}"
+
+        with self._lock:
+            if chave not in self._entradas and len(uri) <= self.limite_bytes:
+                self._entradas[chave] = uri
+                self._total_bytes += len(uri)
+                while self._total_bytes > self.limite_bytes:
+                    _, antigo = self._entradas.popitem(last=False)
+                    self._total_bytes -= len(antigo)
+        return uri
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._total_bytes = 0
+
+    def metricas(self) -> dict:
+        """Acertos, faltas, itens e bytes ocupados pelo cache."""
+        with self._lock:
+            return {
+                "acertos": self._acertos, "faltas": self._faltas,
+                "itens": len(self._entradas), "bytes": self._total_bytes,
+            }
+
+
+_CACHE_ASSETS = CacheAssets(config.CACHE_ASSETS_MAX_MB * 1024 * 1024)
+
+# Serializa as cópias para a pasta estática entre as sessões deste processo.
+_LOCK_ASSETS_PUBLICADOS = threading.Lock()
+
+def _servir_assets_estaticos() -> bool:
+    """O modo "static" só vale se o Streamlit estiver servindo a pasta estática."""
+    if config.MODO_ASSETS != "static":
+        return False
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+def _publicar_asset(path: Path, relativo: Path, assinatura: str) -> str:
+    """
+    Copia o asset para `config.STATIC_DIR` (se a cópia estiver ausente ou
+    desatualizada) e retorna sua URL. A assinatura vai na URL para que o
+    navegador possa guardar o arquivo em cache e ainda assim ver as alterações.
+    A própria pasta estática diz o que já foi publicado: a cópia atualizada tem
+    a mesma assinatura da origem, então nada é guardado em memória.
+    """
+    destino = config.STATIC_DIR / "assets" / relativo
+    url = f"{config.URL_STATIC}/assets/{quote(relativo.as_posix())}?v={assinatura}"
+    if _assinatura_arquivo(destino) == assinatura:
+        return url
+    with _LOCK_ASSETS_PUBLICADOS:
+        if _assinatura_arquivo(destino) != assinatura:
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            storage.gravar_bytes(path.read_bytes(), destino)
+            # Mantém a data de modificação da origem: a assinatura da cópia
+            # passa a ser igual à do original enquanto ele não mudar.
+            origem = path.stat()
+            os.utime(destino, ns=(origem.st_atime_ns, origem.st_mtime_ns))
+    return url
+
+def fonte_asset(path: Path):
+    """
+    Valor para o `src` de uma <img> com um arquivo de `config.ASSETS_DIR`: URL
+    da cópia estática no modo "static" (ver `config.MODO_ASSETS`) ou data URI
+    em base64. Retorna None se o arquivo não existir.
+    """
+    if _servir_assets_estaticos():
+        try:
+            relativo = path.resolve().relative_to(config.ASSETS_DIR)
+        except ValueError:
+            relativo = None
+        if relativo is not None:
+            assinatura = _assinatura_arquivo(path)
+            return _publicar_asset(path, relativo, assinatura) if assinatura else None
+    return _CACHE_ASSETS.data_uri(path)
+
+def metricas_cache_assets() -> dict:
+    """Acertos, faltas e ocupação do cache de data URIs (ver `CacheAssets`)."""
+    return _CACHE_ASSETS.metricas()
+
 def get_image_animation_html(path1: Path, path2: Path, width: int) -> str:
     """
     Gera uma string HTML para exibir um efeito de GIF animado,
@@ -178,16 +1329,11 @@ def get_image_animation_html(path1: Path, path2: Path, width: int) -> str:
     Returns:
         str: Uma string HTML contendo a imagem animada com CSS.
     """
-    if not path1.exists() or not path2.exists():
+    img1_uri = fonte_asset(path1)
+    img2_uri = fonte_asset(path2)
+    if not img1_uri or not img2_uri:
         return "<p>Ficheiros de imagem não encontrados.</p>"
 
-    def encode_image(path):
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-
-    img1_b64 = encode_image(path1)
-    img2_b64 = encode_image(path2)
-
     # Cria um ID único para os elementos para evitar conflitos de estilo
     unique_id = f"anim_{hash(path1)}"
 
@@ -220,57 +1366,162 @@ def get_image_animation_html(path1: Path, path2: Path, width: int) -> str:
         }}
     </style>
     <div class="container_{unique_id}">
-        <img class="img_base" src="data:image/jpeg;base64,{img1_b64}">
-        <img class="img_base img_top" src="data:image/jpeg;base64,{img2_b64}">
+        <img class="img_base" src="{img1_uri}">
+        <img class="img_base img_top" src="{img2_uri}">
     </div>
     """
     return html
 
-def render_muscle_diagram(base_svg_path: Path, primary_muscles: list, secondary_muscles: list, width: int = 150) -> str:
+# Namespaces dos SVGs do diagrama (exportados pelo Inkscape). Registrá-los
+# evita prefixos "ns0:" ao serializar o SVG composto.
+_NS_SVG = "http://www.w3.org/2000/svg"
+_NS_EDITOR_SVG = ("http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd", "http://www.inkscape.org/namespaces/inkscape")
+ET.register_namespace("", _NS_SVG)
+ET.register_namespace("xlink", "http://www.w3.org/1999/xlink")
+
+# Casas decimais além da 2ª nas coordenadas: invisíveis em um desenho de 200
+# unidades exibido com ~150px, mas respondem por boa parte do tamanho do SVG.
+_DECIMAIS_EXCEDENTES_SVG = re.compile(r"(\d\.\d\d)\d+")
+
+# Diagramas já compostos neste processo, do menos para o mais usado:
+# (vista, camadas e assinaturas dos SVGs de origem) -> arquivo.
+_DIAGRAMAS_COMPOSTOS = OrderedDict()
+_LOCK_DIAGRAMAS = threading.Lock()
+
+def _camadas_musculares(primary_muscles, secondary_muscles) -> list:
+    """
+    Arquivos SVG (e opacidade) de cada músculo destacado, na ordem de
+    empilhamento: primeiro os primários, depois os secundários, mais claros.
+    """
+    camadas = []
+    for musculos, pasta, opacidade in (
+        (primary_muscles, config.PATH_GRAFICO_MUSCULOS_MAIN, "1"),
+        (secondary_muscles, config.PATH_GRAFICO_MUSCULOS_SECONDARY, "0.7"),
+    ):
+        for muscle in musculos:
+            muscle_filename = config.MUSCLE_SVG_MAP.get(muscle.lower())
+            if muscle_filename and (pasta / muscle_filename).exists():
+                camadas.append((pasta / muscle_filename, opacidade))
+    return camadas
+
+def _limpar_svg(raiz):
+    """Remove metadados e atributos do editor, que só aumentam o arquivo."""
+    for pai in list(raiz.iter()):
+        for filho in list(pai):
+            tag = filho.tag if isinstance(filho.tag, str) else ""
+            if tag == f"{{{_NS_SVG}}}metadata" or tag.startswith(tuple(f"{{{ns}}}" for ns in _NS_EDITOR_SVG)):
+                pai.remove(filho)
+    for elemento in raiz.iter():
+        for atributo in [a for a in elemento.attrib if a.startswith(tuple(f"{{{ns}}}" for ns in _NS_EDITOR_SVG))]:
+            del elemento.attrib[atributo]
+        for atributo in ("d", "transform", "points"):
+            if atributo in elemento.attrib:
+                elemento.set(atributo, _DECIMAIS_EXCEDENTES_SVG.sub(r"\1", elemento.get(atributo)))
+
+def _compor_svg(base_svg_path: Path, camadas: list) -> bytes:
+    """
+    Junta a base do corpo e as camadas dos músculos em um único documento SVG.
+    Todos os arquivos usam a mesma largura e nenhum tem viewBox, então as
+    coordenadas coincidem e cada camada entra como um grupo no topo da base,
+    como antes acontecia com as <img> sobrepostas.
+    """
+    raiz = ET.parse(base_svg_path).getroot()
+    _limpar_svg(raiz)
+    for caminho, opacidade in camadas:
+        try:
+            camada = ET.parse(caminho).getroot()
+        except ET.ParseError:
+            continue
+        _limpar_svg(camada)
+        grupo = ET.SubElement(raiz, f"{{{_NS_SVG}}}g")
+        if opacidade != "1":
+            grupo.set("opacity", opacidade)
+        for filho in list(camada):
+            # Os arquivos do Inkscape repetem os mesmos ids (svg2, layer1...).
+            for elemento in filho.iter():
+                elemento.attrib.pop("id", None)
+            grupo.append(filho)
+    return ET.tostring(raiz, encoding="utf-8", xml_declaration=True)
+
+def diagrama_muscular_composto(base_svg_path: Path, primary_muscles: list, secondary_muscles: list):
     """
-    Gera um HTML que sobrepõe SVGs de músculos sobre uma imagem base do corpo.
-    Usa CSS para posicionar as imagens umas sobre as outras.
+    Retorna o arquivo SVG com a vista `base_svg_path` e os músculos destacados,
+    gerando-o em `config.PATH_DIAGRAMAS_COMPOSTOS` na primeira vez. O nome do
+    arquivo é o hash do conteúdo das camadas, então uma alteração nos SVGs de
+    origem gera um arquivo novo. Retorna None se a imagem base não existir.
     """
-    def encode_svg_to_base64(svg_path: Path) -> str or None: # type: ignore
-        """Lê um arquivo SVG e o codifica em Base64 para embutir em HTML."""
-        if not svg_path.exists():
+    if not base_svg_path.exists():
+        return None
+    camadas = _camadas_musculares(
+        sorted({m.lower() for m in primary_muscles}), sorted({m.lower() for m in secondary_muscles})
+    )
+    # As assinaturas dos SVGs de origem entram na chave: um arquivo editado
+    # gera um novo diagrama sem reiniciar o app.
+    chave = (
+        str(base_svg_path), _assinatura_arquivo(base_svg_path),
+        tuple((str(arquivo), opacidade, _assinatura_arquivo(arquivo)) for arquivo, opacidade in camadas),
+    )
+    with _LOCK_DIAGRAMAS:
+        caminho = _DIAGRAMAS_COMPOSTOS.get(chave)
+        if caminho is not None:
+            _DIAGRAMAS_COMPOSTOS.move_to_end(chave)
+    if caminho is not None and caminho.exists():
+        return caminho
+
+    conteudo = hashlib.sha1(base_svg_path.read_bytes())
+    for arquivo, opacidade in camadas:
+        conteudo.update(opacidade.encode() + arquivo.read_bytes())
+    caminho = config.PATH_DIAGRAMAS_COMPOSTOS / f"{base_svg_path.stem}_{conteudo.hexdigest()[:16]}.svg"
+    if not caminho.exists():
+        try:
+            svg = _compor_svg(base_svg_path, camadas)
+        except ET.ParseError:
             return None
-        with open(svg_path, "rb") as f:
-            encoded_string = base64.b64encode(f.read()).decode()
-            return f"data:image/svg+xml;base64,{encoded_string}"
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        storage.gravar_bytes(svg, caminho)
+    with _LOCK_DIAGRAMAS:
+        _DIAGRAMAS_COMPOSTOS[chave] = caminho
+        _DIAGRAMAS_COMPOSTOS.move_to_end(chave)
+        while len(_DIAGRAMAS_COMPOSTOS) > config.MAX_DIAGRAMAS_COMPOSTOS:
+            _DIAGRAMAS_COMPOSTOS.popitem(last=False)
+    return caminho
 
-    base_encoded = encode_svg_to_base64(base_svg_path)
-    if not base_encoded:
+def render_muscle_diagram(base_svg_path: Path, primary_muscles: list, secondary_muscles: list, width: int = 150) -> str:
+    """
+    Gera o HTML do diagrama do corpo com os músculos destacados. A base e os
+    músculos chegam em um único SVG composto (ver `diagrama_muscular_composto`).
+    """
+    caminho = diagrama_muscular_composto(base_svg_path, primary_muscles, secondary_muscles)
+    fonte = fonte_asset(caminho) if caminho is not None else None
+    if not fonte:
         return f"<p>Imagem base não encontrada: {base_svg_path.name}</p>"
+    return (
+        f'<div style="width: 100%; max-width: {width}px; height: auto;">'
+        f'<img src="{fonte}" style="width: 100%; height: auto; display: block;">'
+        '</div>'
+    )
 
-    # O container 'div' usa 'position: relative' para que as imagens internas
-    # com 'position: absolute' se posicionem em relação a ele.
-    html_layers = [f'<div style="position: relative; width: 100%; max-width: {width}px; height: auto;">']
-    # A imagem base é a primeira camada.
-    html_layers.append(f'<img src="{base_encoded}" style="width: 100%; height: auto; display: block;">')
-
-    # Adiciona as camadas de músculos primários
-    for muscle in primary_muscles:
-        muscle_filename = config.MUSCLE_SVG_MAP.get(muscle.lower())
-        if muscle_filename:
-            muscle_path = config.PATH_GRAFICO_MUSCULOS_MAIN / muscle_filename
-            muscle_encoded = encode_svg_to_base64(muscle_path)
-            if muscle_encoded:
-                # Cada músculo é uma imagem posicionada exatamente sobre a base.
-                html_layers.append(f'<img src="{muscle_encoded}" style="position: absolute; top: 0; left: 0; width: 100%; height: auto;">')
-
-    # Adiciona as camadas de músculos secundários com uma opacidade menor
-    for muscle in secondary_muscles:
-        muscle_filename = config.MUSCLE_SVG_MAP.get(muscle.lower())
-        if muscle_filename:
-            muscle_path = config.PATH_GRAFICO_MUSCULOS_SECONDARY / muscle_filename
-            muscle_encoded = encode_svg_to_base64(muscle_path)
-            if muscle_encoded:
-                # O estilo 'opacity: 0.7' diferencia os músculos secundários.
-                html_layers.append(f'<img src="{muscle_encoded}" style="position: absolute; top: 0; left: 0; width: 100%; height: auto; opacity: 0.7;">')
-
-    html_layers.append('</div>')
-    return "".join(html_layers)
+def compor_diagramas_da_biblioteca(path_exercicios: Path) -> int:
+    """
+    Gera de antemão os diagramas (frente e costas) de todos os exercícios da
+    biblioteca, com a mesma divisão de músculos usada na tela de planejamento.
+    Retorna quantos arquivos diferentes existem ao final.
+    """
+    with open(path_exercicios, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    exercicios = dados.get("exercises", []) if isinstance(dados, dict) else dados
+    catalogo = CatalogoExercicios(exercicios, path_exercicios.parent)
+    gerados = set()
+    for pos in range(len(catalogo)):
+        ex = catalogo.registro(pos)
+        primary, secondary = ex.get("primaryMuscles") or [], ex.get("secondaryMuscles") or []
+        for base, vista in ((config.PATH_GRAFICO_MUSCULOS_FRONT, config.FRONT_MUSCLES), (config.PATH_GRAFICO_MUSCULOS_BACK, config.BACK_MUSCLES)):
+            caminho = diagrama_muscular_composto(
+                base, [m for m in primary if m.lower() in vista], [m for m in secondary if m.lower() in vista]
+            )
+            if caminho is not None:
+                gerados.add(caminho)
+    return len(gerados)
 
 
 def salvar_banco_exercicios(data: list, path: Path):
@@ -289,8 +1540,8 @@ def salvar_banco_exercicios(data: list, path: Path):
         else:
             data_to_save = data
             
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+        conteudo = json.dumps(data_to_save, indent=4, ensure_ascii=False)
+        storage.gravar_bytes(conteudo.encode('utf-8'), path)
             
     except Exception as e:
         st.error(f"""
@@ -313,4 +1564,4 @@ def sanitizar_nome_para_id(nome: str) -> str:
     s = s.replace(' ', '_') # Substitui espaços por underscores
     # Remove caracteres que não sejam letras, números, underscore ou hífen
     s = re.sub(r'[^\w-]', '', s)
-    return s
\ No newline at end of file
+    return s